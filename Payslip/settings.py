@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,10 +45,12 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'myapp.querybudget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myapp.profiling.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,6 +82,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Saves read before they write; a deferred transaction would fail with
+        # "database is locked" when it upgrades its lock under concurrent saves
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
 }
 
@@ -102,6 +108,19 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Username-or-email login with throttling of repeated failures
+AUTHENTICATION_BACKENDS = [
+    'myapp.backends.EmailOrUsernameBackend',
+]
+
+LOGIN_THROTTLE_LIMIT = 5  # failed attempts per client IP and account...
+LOGIN_THROTTLE_WINDOW = 300  # ...within this many seconds
+
+# Reverse proxies in front of the app that append to X-Forwarded-For (1 behind
+# a single load balancer or router). 0 trusts nothing and uses REMOTE_ADDR.
+LOGIN_TRUSTED_PROXY_COUNT = int(os.environ.get('LOGIN_TRUSTED_PROXY_COUNT', '0'))
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -122,11 +141,121 @@ STATICFILES_DIRS = [
     BASE_DIR / 'myapp' / 'static',
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# collectstatic writes content-hashed copies of every asset (e.g.
+# css/payslip_detail.3f2a9c.css) plus gzip and, with the Brotli package
+# installed, .br versions. WhiteNoise serves the hashed names with a one-year
+# immutable Cache-Control, so pages only re-download assets that changed.
 
 # Media files (Uploaded files)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Payslip PDFs go through the 'payslips' storage. Set PAYSLIP_S3_BUCKET to
+# keep them in an S3-compatible object store shared by every app node (needs
+# django-storages[s3]); PAYSLIP_S3_ENDPOINT_URL points it at e.g. a local MinIO.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+    'payslips': {
+        'BACKEND': 'myapp.storage.ShardedFileSystemStorage',
+    },
+}
+
+if os.environ.get('PAYSLIP_S3_BUCKET'):
+    STORAGES['payslips'] = {
+        'BACKEND': 'myapp.storage.ShardedS3Storage',
+        'OPTIONS': {
+            'bucket_name': os.environ['PAYSLIP_S3_BUCKET'],
+            'endpoint_url': os.environ.get('PAYSLIP_S3_ENDPOINT_URL'),
+            'access_key': os.environ.get('PAYSLIP_S3_ACCESS_KEY'),
+            'secret_key': os.environ.get('PAYSLIP_S3_SECRET_KEY'),
+            'location': os.environ.get('PAYSLIP_S3_PREFIX', ''),
+            'file_overwrite': False,
+            'querystring_auth': True,
+        },
+    }
+
+# Data-version keyed caches (payroll report, employee prefill, rendered
+# pages). Local memory suits a single process; with several workers set
+# PAYSLIP_CACHE_DIR so they share one file-based cache and its version counter.
+if os.environ.get('PAYSLIP_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['PAYSLIP_CACHE_DIR'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# First month of the fiscal year used for year-to-date totals (April in India)
+FISCAL_YEAR_START_MONTH = 4
+
+# Where bulk-archived payslip PDFs and their ledgers are moved to
+PAYSLIP_ARCHIVE_ROOT = BASE_DIR / 'archive'
+
+# Snapshots of the database and PDF archive taken by `manage.py backup_payslips`
+# (see myapp/backup.py); point it at a different disk or a mounted volume
+PAYSLIP_BACKUP_ROOT = Path(os.environ.get('PAYSLIP_BACKUP_ROOT', BASE_DIR / 'backups'))
+
+# Outgoing email for payslip distribution. The console backend prints
+# messages instead of sending them; set EMAIL_BACKEND to
+# django.core.mail.backends.smtp.EmailBackend (and the EMAIL_HOST_* variables)
+# for real delivery, or to ...filebased.EmailBackend with EMAIL_FILE_PATH.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '') == '1'
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_emails'))
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'payroll@localhost')
+
+# Payslip emails sent per second across all distribution workers (0 = no limit)
+PAYSLIP_EMAIL_RATE_LIMIT = 5
+# Logs (and pid files) of the background email jobs started from View Payslips
+PAYSLIP_EMAIL_JOB_ROOT = BASE_DIR / 'email_jobs'
+
+# Superusers can profile a single request with ?_profile=1 (see
+# myapp/profiling.py); set PAYSLIP_PROFILING=0 to remove the middleware.
+PAYSLIP_PROFILING = os.environ.get('PAYSLIP_PROFILING', '1') == '1'
+PAYSLIP_PROFILE_ROOT = BASE_DIR / 'profiles'
+# Seconds between stack samples, and how many profiles are kept
+PAYSLIP_PROFILE_INTERVAL = 0.001
+PAYSLIP_PROFILE_KEEP = 50
+
+# Queries slower than this are logged with their SQL on 'myapp.queries'.
+# Views declare query budgets with myapp.querybudget.query_budget; going over
+# one is logged, or raises QueryBudgetExceeded with PAYSLIP_QUERY_BUDGET_ENFORCE
+# (set it in test settings so N+1 regressions fail the run).
+PAYSLIP_SLOW_QUERY_MS = float(os.environ.get('PAYSLIP_SLOW_QUERY_MS', '100'))
+PAYSLIP_QUERY_BUDGET_ENFORCE = os.environ.get('PAYSLIP_QUERY_BUDGET_ENFORCE', '') == '1'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'myapp.queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -24,5 +24,7 @@ urlpatterns = [
     path('', include('myapp.urls')),
 ]
 
-# Serve media files in production
+# Serve local media files while developing (static() is a no-op when DEBUG is
+# off); payslip PDFs themselves are served by the download view from whichever
+# storage backend is configured
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
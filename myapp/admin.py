@@ -1,9 +1,75 @@
 from django.contrib import admin
-from .models import Payslip
+from django.db import transaction
+
+from .models import Employee, Payslip, PayslipDelivery, PeriodSummary, EmployeeYearTotal
+from .summaries import add_payslip, remove_payslip, remove_payslips
+from .ytd import YTD_SNAPSHOT_FIELDS, fiscal_year_for, rebuild_ytd, remove_payslip_ytd
+
+# Payslip fields not shown on the PDF; an admin edit to any other field re-renders it
+UNPRINTED_FIELDS = {'employee_record', 'pdf_file', 'layout_version', 'pack_file', 'pack_offset', 'pack_length', 'created_by'}
+
+@admin.register(Employee)
+class EmployeeAdmin(admin.ModelAdmin):
+    list_display = ['employee_id', 'name', 'email', 'basic_salary', 'default_incentive', 'is_active', 'updated_at']
+    list_filter = ['is_active']
+    search_fields = ['employee_id', 'name', 'email']
+    readonly_fields = ['updated_at']
 
 @admin.register(Payslip)
 class PayslipAdmin(admin.ModelAdmin):
     list_display = ['employee_name', 'employee_id', 'pay_period', 'net_payable', 'created_at']
     list_filter = ['created_at', 'payment_date']
     search_fields = ['employee_name', 'employee_id']
-    readonly_fields = ['created_at']
+    # Year-to-date figures are derived from the employee's other payslips (see ytd.py)
+    readonly_fields = ['created_at', 'pdf_sha256', 'pdf_size'] + YTD_SNAPSHOT_FIELDS
+    raw_id_fields = ['employee_record']
+
+    # Edits and deletes here keep PeriodSummary and the YTD figures in step, like the views do
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            if change:
+                old = Payslip.objects.select_for_update().get(pk=obj.pk)
+                remove_payslip(old)
+                if set(form.changed_data) - UNPRINTED_FIELDS:
+                    obj.layout_version = 0
+            obj.fiscal_year = fiscal_year_for(obj.payment_date)
+            super().save_model(request, obj, form, change)
+            add_payslip(obj)
+            # One window query re-derives the snapshots of every payslip the edit moved
+            rebuild_ytd({obj.employee_id, old.employee_id} if change else {obj.employee_id})
+            obj.refresh_from_db(fields=YTD_SNAPSHOT_FIELDS + ['layout_version'])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            remove_payslip(obj)
+            remove_payslip_ytd(obj)
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            payslips = list(queryset.select_for_update())
+            remove_payslips(payslips)
+            super().delete_queryset(request, queryset)
+            rebuild_ytd({payslip.employee_id for payslip in payslips})
+
+@admin.register(PeriodSummary)
+class PeriodSummaryAdmin(admin.ModelAdmin):
+    list_display = ['pay_period', 'headcount', 'gross_earnings', 'total_deduction', 'net_payable', 'updated_at']
+    search_fields = ['pay_period']
+    readonly_fields = ['updated_at']
+
+@admin.register(EmployeeYearTotal)
+class EmployeeYearTotalAdmin(admin.ModelAdmin):
+    list_display = ['employee_id', 'fiscal_year', 'payslip_count', 'gross_earnings', 'income_tax', 'net_payable', 'updated_at']
+    list_filter = ['fiscal_year']
+    search_fields = ['employee_id']
+    readonly_fields = ['updated_at']
+
+@admin.register(PayslipDelivery)
+class PayslipDeliveryAdmin(admin.ModelAdmin):
+    list_display = ['payslip', 'email', 'status', 'attempted_at', 'sent_at']
+    list_filter = ['status', 'attempted_at']
+    search_fields = ['email', 'payslip__employee_id', 'payslip__employee_name']
+    raw_id_fields = ['payslip']
+    readonly_fields = ['attempted_at', 'sent_at']
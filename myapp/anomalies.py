@@ -0,0 +1,274 @@
+"""
+Anomaly check for a payroll run before it is committed.
+
+``check_payroll_run`` takes the rows of a run (one dict of payslip fields
+per employee) and flags what looks wrong, for the whole batch at once:
+
+- rule checks: no negative amounts, gross = basic + incentive, total
+  deduction covers income tax and net = gross - total deduction, net is not
+  above gross, and paid days + loss of pay days = days in the pay period;
+- trend checks against each employee's last ``ANOMALY_HISTORY_PERIODS``
+  payslips: month-over-month change above ``ANOMALY_MAX_CHANGE`` and
+  z-scores above ``ANOMALY_Z_THRESHOLD``, which catch a mistyped salary or
+  an extra zero in an incentive.
+
+History is read with one query per ``ANOMALY_CHUNK_SIZE`` employees of the
+run, limited to a date window. The batch and its history are held
+as columns (amounts in paise for the exact rule checks, an employees x
+periods matrix of floats for the trends), so every check is one pass over
+arrays instead of per-row queries. With ``numpy`` (in requirements.txt)
+the passes are vectorised; without it the same columns are walked in Python
+and the flags are identical.
+"""
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from .models import Payslip
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+AMOUNT_FIELDS = ['basic_salary', 'incentive', 'gross_earnings', 'income_tax', 'total_deduction', 'net_payable']
+TREND_FIELDS = ['basic_salary', 'incentive', 'gross_earnings', 'net_payable']
+
+ANOMALY_MAX_ROWS = 10000
+# Decompressed JSON accepted by the check API
+ANOMALY_MAX_BODY_BYTES = 8 * 1024 * 1024
+ANOMALY_HISTORY_PERIODS = 6
+# Employees per history query
+ANOMALY_CHUNK_SIZE = 500
+# Payslips of history needed before z-scores are trusted
+ANOMALY_MIN_HISTORY = 3
+ANOMALY_Z_THRESHOLD = 3.5
+# A z-score alone also flags tiny changes to an amount that never moves;
+# it must be at least this far from the mean as well
+ANOMALY_MIN_DEVIATION = 0.25
+# Month-over-month change (0.5 = 50% up or down)
+ANOMALY_MAX_CHANGE = 0.5
+
+RULE_MESSAGES = {
+    'negative_amount': 'an amount is negative',
+    'gross_mismatch': 'gross earnings are not basic + incentive',
+    'deduction_mismatch': 'total deduction is less than income tax',
+    'net_mismatch': 'net payable is not gross earnings - total deduction',
+    'net_exceeds_gross': 'net payable is more than gross earnings',
+    'days_mismatch': 'paid days + loss of pay days do not add up to the days in the pay period',
+}
+
+
+def _to_paise(value, field, index):
+    try:
+        cleaned = str(value if value is not None else '').strip().replace('₹', '').replace(',', '').replace(' ', '')
+        return int((Decimal(cleaned or '0') * 100).to_integral_value())
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'Row {index}: invalid {field.replace("_", " ")} value: {value}')
+
+
+def period_days(pay_period):
+    """Days in a pay period like "1-Oct-2025 to 31-Oct-2025", or None if it does not parse"""
+    try:
+        start, end = (datetime.strptime(part.strip(), '%d-%b-%Y').date() for part in pay_period.split(' to '))
+    except ValueError:
+        return None
+    return (end - start).days + 1 if end >= start else None
+
+
+def _columns(rows):
+    """The batch as columns; amounts in paise so the rule checks are exact"""
+    columns = {field: [] for field in ['employee_id', 'pay_period', 'paid_days', 'loss_of_pay_days',
+                                       'period_days', 'payment_date', *AMOUNT_FIELDS]}
+    days = {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict) or not row.get('employee_id') or not row.get('pay_period'):
+            raise ValueError(f'Row {index} needs employee_id and pay_period')
+        pay_period = str(row['pay_period'])
+        if pay_period not in days:
+            days[pay_period] = period_days(pay_period)
+        try:
+            paid_days = int(row.get('paid_days') or 0)
+            loss_of_pay_days = int(row.get('loss_of_pay_days') or 0)
+            payment_date = row.get('payment_date')
+            if not isinstance(payment_date, date):
+                payment_date = date.fromisoformat(str(payment_date))
+        except (TypeError, ValueError):
+            raise ValueError(f'Row {index}: paid days, loss of pay days and payment date must be valid')
+
+        columns['employee_id'].append(str(row['employee_id']))
+        columns['pay_period'].append(pay_period)
+        columns['paid_days'].append(paid_days)
+        columns['loss_of_pay_days'].append(loss_of_pay_days)
+        columns['period_days'].append(days[pay_period])
+        columns['payment_date'].append(payment_date)
+        for field in AMOUNT_FIELDS:
+            columns[field].append(_to_paise(row.get(field), field, index))
+    return columns
+
+
+def load_history(columns, periods=ANOMALY_HISTORY_PERIODS, chunk_size=ANOMALY_CHUNK_SIZE):
+    """
+    ``{field: matrix}`` of each batch row's last ``periods`` payslips, most
+    recent first, as rupee floats padded with None; one query per chunk of
+    the run's employees.
+    """
+    employees = list(dict.fromkeys(columns['employee_id']))
+    batch_periods = set(columns['pay_period'])
+    earliest = min(columns['payment_date'])
+    # Enough room for a missed month or two between runs
+    window_start = earliest - timedelta(days=31 * (periods + 2))
+
+    recent = defaultdict(list)
+    for start in range(0, len(employees), chunk_size):
+        rows = (
+            Payslip.objects.filter(
+                employee_id__in=employees[start:start + chunk_size],
+                payment_date__gte=window_start,
+                payment_date__lt=earliest,
+            )
+            .exclude(pay_period__in=batch_periods)
+            .order_by('-payment_date', '-id')
+            .values_list('employee_id', *TREND_FIELDS)
+        )
+        for employee_id, *amounts in rows:
+            if len(recent[employee_id]) < periods:
+                recent[employee_id].append([float(amount) for amount in amounts])
+
+    history = {}
+    for position, field in enumerate(TREND_FIELDS):
+        matrix = []
+        for employee_id in columns['employee_id']:
+            values = [amounts[position] for amounts in recent.get(employee_id, [])]
+            matrix.append(values + [None] * (periods - len(values)))
+        history[field] = matrix
+    return history
+
+
+def _rules_numpy(columns):
+    amount = {field: np.array(columns[field], dtype=np.int64) for field in AMOUNT_FIELDS}
+    days = np.array([-1 if value is None else value for value in columns['period_days']], dtype=np.int64)
+    worked = np.array(columns['paid_days'], dtype=np.int64) + np.array(columns['loss_of_pay_days'], dtype=np.int64)
+    return {
+        'negative_amount': np.any(np.stack(list(amount.values())) < 0, axis=0),
+        'gross_mismatch': amount['gross_earnings'] != amount['basic_salary'] + amount['incentive'],
+        'deduction_mismatch': amount['total_deduction'] < amount['income_tax'],
+        'net_mismatch': amount['net_payable'] != amount['gross_earnings'] - amount['total_deduction'],
+        'net_exceeds_gross': amount['net_payable'] > amount['gross_earnings'],
+        'days_mismatch': (days >= 0) & (worked != days),
+    }
+
+
+def _rules_python(columns):
+    rows = list(zip(*(columns[field] for field in AMOUNT_FIELDS)))
+    worked = [paid + lost for paid, lost in zip(columns['paid_days'], columns['loss_of_pay_days'])]
+    return {
+        'negative_amount': [min(row) < 0 for row in rows],
+        'gross_mismatch': [gross != basic + incentive for basic, incentive, gross, _, _, _ in rows],
+        'deduction_mismatch': [deduction < tax for _, _, _, tax, deduction, _ in rows],
+        'net_mismatch': [net != gross - deduction for _, _, gross, _, deduction, net in rows],
+        'net_exceeds_gross': [net > gross for _, _, gross, _, _, net in rows],
+        'days_mismatch': [days is not None and total != days for days, total in zip(columns['period_days'], worked)],
+    }
+
+
+def _trends_numpy(values, history):
+    """``(previous, mean, z, change_flag, z_flag)`` columns for one amount field"""
+    current = np.array(values, dtype=np.float64) / 100
+    matrix = np.array([[np.nan if value is None else value for value in row] for row in history], dtype=np.float64)
+    matrix = matrix.reshape(len(values), -1)
+    valid = ~np.isnan(matrix)
+    count = valid.sum(axis=1)
+    mean = np.where(valid, matrix, 0).sum(axis=1) / np.maximum(count, 1)
+    variance = np.where(valid, (matrix - mean[:, None]) ** 2, 0).sum(axis=1) / np.maximum(count - 1, 1)
+    std = np.sqrt(variance)
+    previous = matrix[:, 0] if matrix.shape[1] else np.full(len(values), np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(std > 0, (current - mean) / std, 0.0)
+        change = np.where(previous > 0, (current - previous) / previous, 0.0)
+    change_flag = np.abs(np.nan_to_num(change)) > ANOMALY_MAX_CHANGE
+    z_flag = ((count >= ANOMALY_MIN_HISTORY) & (np.abs(z) > ANOMALY_Z_THRESHOLD)
+              & (np.abs(current - mean) > ANOMALY_MIN_DEVIATION * np.abs(mean)))
+    return previous.tolist(), mean.tolist(), z.tolist(), change_flag.tolist(), z_flag.tolist()
+
+
+def _trends_python(values, history):
+    previous_column, mean_column, z_column, change_flags, z_flags = [], [], [], [], []
+    for value, row in zip(values, history):
+        current = value / 100
+        past = [amount for amount in row if amount is not None]
+        count = len(past)
+        mean = sum(past) / count if count else 0.0
+        std = (sum((amount - mean) ** 2 for amount in past) / max(count - 1, 1)) ** 0.5
+        previous = row[0] if row and row[0] is not None else float('nan')
+        z = (current - mean) / std if std > 0 else 0.0
+        change = (current - previous) / previous if previous > 0 else 0.0
+
+        previous_column.append(previous)
+        mean_column.append(mean)
+        z_column.append(z)
+        change_flags.append(abs(change) > ANOMALY_MAX_CHANGE)
+        z_flags.append(count >= ANOMALY_MIN_HISTORY and abs(z) > ANOMALY_Z_THRESHOLD
+                       and abs(current - mean) > ANOMALY_MIN_DEVIATION * abs(mean))
+    return previous_column, mean_column, z_column, change_flags, z_flags
+
+
+def check_payroll_run(rows, use_numpy=None):
+    """
+    Flag suspicious rows of a payroll run.
+
+    ``rows`` are dicts with the payslip form fields (amounts as numbers or
+    strings). Raises ValueError for rows that cannot be read. Returns a
+    report whose ``flagged`` list has one entry per row with issues, each
+    issue naming its ``check`` and, for trend checks, the ``field``.
+    """
+    started = time.perf_counter()
+    rows = list(rows)
+    if len(rows) > ANOMALY_MAX_ROWS:
+        raise ValueError(f'At most {ANOMALY_MAX_ROWS} rows per check')
+    use_numpy = np is not None if use_numpy is None else use_numpy and np is not None
+    report = {'checked': len(rows), 'flagged': [], 'engine': 'numpy' if use_numpy else 'python', 'seconds': 0.0}
+    if not rows:
+        return report
+
+    columns = _columns(rows)
+    history = load_history(columns)
+    issues = defaultdict(list)
+
+    rules = (_rules_numpy if use_numpy else _rules_python)(columns)
+    for check, flags in rules.items():
+        for index in (np.flatnonzero(flags).tolist() if use_numpy else
+                      [index for index, flag in enumerate(flags) if flag]):
+            issues[index].append({'check': check, 'message': RULE_MESSAGES[check]})
+
+    trends = _trends_numpy if use_numpy else _trends_python
+    for field in TREND_FIELDS:
+        previous, mean, z, change_flags, z_flags = trends(columns[field], history[field])
+        label = field.replace('_', ' ')
+        for index, (change_flag, z_flag) in enumerate(zip(change_flags, z_flags)):
+            if not change_flag and not z_flag:
+                continue
+            current = columns[field][index] / 100
+            issue = {'check': 'change' if change_flag else 'zscore', 'field': field, 'value': current,
+                     'previous': previous[index], 'mean': round(mean[index], 2), 'z': round(z[index], 2)}
+            if change_flag:
+                change = (current - previous[index]) / previous[index]
+                issue['message'] = f'{label} {current:.2f} is {change:+.0%} on the previous payslip ({previous[index]:.2f})'
+            else:
+                issue['message'] = f'{label} {current:.2f} is {z[index]:+.1f} standard deviations from the recent mean ({mean[index]:.2f})'
+            issues[index].append(issue)
+
+    report['flagged'] = [
+        {
+            'index': index,
+            'employee_id': columns['employee_id'][index],
+            'pay_period': columns['pay_period'][index],
+            'issues': issues[index],
+        }
+        for index in sorted(issues)
+    ]
+    report['seconds'] = time.perf_counter() - started
+    return report
@@ -0,0 +1,96 @@
+"""
+Authentication backend accepting either a username or an email address.
+
+The user is resolved with a single query on the indexed ``username`` and
+``email`` columns and the password is hashed exactly once per attempt,
+whether or not the account exists. Repeated failures from one client
+against one account are throttled before any hashing happens; the client
+address is taken from X-Forwarded-For only as far as
+``LOGIN_TRUSTED_PROXY_COUNT`` proxies vouch for it.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models import Q
+
+
+def _client_ip(request):
+    """
+    Address of the client, as seen by the outermost of the
+    LOGIN_TRUSTED_PROXY_COUNT proxies in front of the app.
+
+    Each proxy appends the address it received the request from to
+    X-Forwarded-For, so the entry that many places from the right is the
+    last one nobody but a trusted proxy could have written.
+    """
+    if request is None:
+        return 'unknown'
+    remote_addr = request.META.get('REMOTE_ADDR', 'unknown')
+    proxies = settings.LOGIN_TRUSTED_PROXY_COUNT
+    if proxies <= 0:
+        return remote_addr
+    forwarded = [
+        address.strip()
+        for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')
+        if address.strip()
+    ]
+    if len(forwarded) < proxies:
+        return remote_addr
+    return forwarded[-proxies]
+
+
+def _throttle_key(request, username):
+    # Per client and account: a shared proxy address can't lock everyone out,
+    # and nobody can lock an account out from somewhere else
+    return f'login_failures:{_client_ip(request)}:{(username or "").lower()}'
+
+
+def is_login_throttled(request, username):
+    """True once this client has hit LOGIN_THROTTLE_LIMIT recent failures against this account"""
+    return cache.get(_throttle_key(request, username), 0) >= settings.LOGIN_THROTTLE_LIMIT
+
+
+def record_login_failure(request, username):
+    key = _throttle_key(request, username)
+    # add() starts the window, incr() keeps its original expiry
+    cache.add(key, 0, settings.LOGIN_THROTTLE_WINDOW)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, settings.LOGIN_THROTTLE_WINDOW)
+
+
+def clear_login_failures(request, username):
+    cache.delete(_throttle_key(request, username))
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    """ModelBackend that matches ``username`` against username or email in one query"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        if is_login_throttled(request, username):
+            # Refuse before hashing so a burst of bad logins costs no CPU
+            return None
+
+        candidates = list(UserModel._default_manager.filter(Q(username=username) | Q(email=username)))
+        # An exact username match wins; an email shared by several accounts is ambiguous
+        user = next((candidate for candidate in candidates if candidate.username == username), None)
+        if user is None and len(candidates) == 1:
+            user = candidates[0]
+
+        if user is None:
+            # Hash once anyway so response time does not reveal whether the account exists
+            UserModel().set_password(password)
+        elif user.check_password(password) and self.user_can_authenticate(user):
+            clear_login_failures(request, username)
+            return user
+
+        record_login_failure(request, username)
+        return None
@@ -0,0 +1,447 @@
+"""
+Online, incremental backups of the database and the payslip PDF archive.
+
+A backup is a snapshot directory under ``PAYSLIP_BACKUP_ROOT``::
+
+    snapshots/20251031-020000/database.sqlite3   (or database.dump)
+    snapshots/20251031-020000/manifest.json
+    objects/3f/a2/3fa2...                         (one file per distinct content)
+
+The database is copied while the site keeps running: SQLite through its
+backup API (one step, so the copy is a single consistent read transaction)
+and PostgreSQL with ``pg_dump --format=custom``. It is taken before the PDFs
+are listed, so every file the copy references already exists.
+
+PDFs and packs go into a content-addressed object store shared by all
+snapshots. The manifest maps each stored name to its SHA-256, size and
+mtime; a file whose size and mtime match the previous snapshot is not read
+again, and content already in the store is not copied again, so a nightly
+backup costs in proportion to what changed, not to the archive size.
+
+A snapshot only becomes visible once its manifest is written, and
+``verify_snapshot`` re-hashes everything it points to before
+``restore_snapshot`` touches anything.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .integrity import HASH_CHUNK_SIZE
+from .models import Payslip
+from .packs import PACK_DIR
+from .purge import _walk
+from .storage import PAYSLIP_UPLOAD_DIR, get_payslip_storage, is_local_storage, mark_pdf_exists, open_pdf
+
+
+BACKUP_WORKERS = 8
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_FORMAT = 1
+DATABASE_FILES = {'sqlite': 'database.sqlite3', 'postgresql': 'database.dump'}
+
+
+class BackupError(Exception):
+    pass
+
+
+def backup_root():
+    return Path(settings.PAYSLIP_BACKUP_ROOT)
+
+
+def object_path(root, digest):
+    return root / 'objects' / digest[:2] / digest[2:4] / digest
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _snapshot_dirs(root):
+    """Complete snapshots, newest first"""
+    snapshots = root / 'snapshots'
+    if not snapshots.is_dir():
+        return []
+    # Snapshots still being written are hidden ``.<name>.partial`` directories
+    complete = [
+        path for path in snapshots.iterdir()
+        if not path.name.startswith('.') and (path / MANIFEST_NAME).is_file()
+    ]
+    return sorted(complete, key=lambda path: path.name, reverse=True)
+
+
+def load_manifest(snapshot_dir):
+    with open(snapshot_dir / MANIFEST_NAME, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def list_snapshots():
+    """Manifests of the complete snapshots, newest first"""
+    return [load_manifest(path) for path in _snapshot_dirs(backup_root())]
+
+
+def resolve_snapshot(name='latest'):
+    """Directory of the named snapshot (``latest`` for the newest)"""
+    root = backup_root()
+    if name == 'latest':
+        snapshots = _snapshot_dirs(root)
+        if not snapshots:
+            raise BackupError(f'No backups in {root}')
+        return snapshots[0]
+    path = root / 'snapshots' / name
+    if Path(name).name != name or not (path / MANIFEST_NAME).is_file():
+        raise BackupError(f'No complete snapshot named {name!r} in {root}')
+    return path
+
+
+def _pg_command(program, settings_dict, *args):
+    """Command line and environment for a PostgreSQL client program"""
+    if not shutil.which(program):
+        raise BackupError(f'{program} was not found on PATH')
+    command = [program]
+    for option, key in [('--host', 'HOST'), ('--port', 'PORT'), ('--username', 'USER')]:
+        if settings_dict.get(key):
+            command.append(f'{option}={settings_dict[key]}')
+    env = dict(os.environ)
+    if settings_dict.get('PASSWORD'):
+        env['PGPASSWORD'] = str(settings_dict['PASSWORD'])
+    return command + list(args), env
+
+
+def _run(command, env):
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise BackupError(f'{command[0]} failed: {result.stderr.strip()}')
+
+
+def _dump_database(snapshot_dir):
+    """Consistent copy of the default database into ``snapshot_dir``"""
+    vendor = connection.vendor
+    if vendor not in DATABASE_FILES:
+        raise BackupError(f'Backups support SQLite and PostgreSQL, not {vendor}')
+    path = snapshot_dir / DATABASE_FILES[vendor]
+
+    if vendor == 'sqlite':
+        if connection.in_atomic_block:
+            # SQLite's backup waits forever for this connection's own
+            # uncommitted writes
+            raise BackupError('Cannot back up a SQLite database from inside a transaction')
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            # pages=-1 copies everything in one step; stepping would restart
+            # the copy whenever the site writes in between
+            connection.connection.backup(target, pages=-1)
+        finally:
+            target.close()
+    else:
+        settings_dict = connection.settings_dict
+        command, env = _pg_command('pg_dump', settings_dict, '--format=custom', f'--file={path}',
+                                   settings_dict['NAME'])
+        _run(command, env)
+
+    digest, size = _file_digest(path)
+    return {'vendor': vendor, 'file': path.name, 'sha256': digest, 'size': size}
+
+
+def _stat(storage, local, name):
+    """``(size, mtime)`` of a stored file without reading it"""
+    if local:
+        stat = os.stat(storage.path(name))
+        return stat.st_size, stat.st_mtime_ns
+    return storage.size(name), int(storage.get_modified_time(name).timestamp() * 1e9)
+
+
+def _store_object(root, name):
+    """Copy a stored file into the object store while hashing it; returns ``(digest, bytes copied)``"""
+    digest = hashlib.sha256()
+    handle = tempfile.NamedTemporaryFile(dir=root / 'objects', prefix='.tmp-', delete=False)
+    try:
+        with handle, open_pdf(name) as source:
+            for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                handle.write(chunk)
+        path = object_path(root, digest.hexdigest())
+        if path.exists():
+            os.unlink(handle.name)
+            return digest.hexdigest(), 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(handle.name, path)
+        return digest.hexdigest(), path.stat().st_size
+    except BaseException:
+        if os.path.exists(handle.name):
+            os.unlink(handle.name)
+        raise
+
+
+def create_backup(workers=BACKUP_WORKERS, progress=None):
+    """
+    Take a snapshot of the database and every stored payslip PDF and pack.
+
+    Returns the new snapshot's manifest; its ``stats`` say how many files
+    were hashed and how many bytes were actually copied. ``progress`` is
+    called with the number of files done.
+    """
+    started = time.monotonic()
+    root = backup_root()
+    (root / 'objects').mkdir(parents=True, exist_ok=True)
+    previous_dirs = _snapshot_dirs(root)
+    previous = load_manifest(previous_dirs[0])['files'] if previous_dirs else {}
+
+    created = timezone.localtime()
+    snapshot_name = f'{created:%Y%m%d-%H%M%S}'
+    snapshot_dir = root / 'snapshots' / snapshot_name
+    if snapshot_dir.exists():
+        raise BackupError(f'Snapshot {snapshot_name} already exists')
+    partial_dir = root / 'snapshots' / f'.{snapshot_name}.partial'
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    partial_dir.mkdir(parents=True)
+
+    try:
+        database = _dump_database(partial_dir)
+
+        storage = get_payslip_storage()
+        local = is_local_storage(storage)
+        names = sorted(set(_walk(storage, PAYSLIP_UPLOAD_DIR)) | set(_walk(storage, PACK_DIR)))
+        stats = {'files': 0, 'bytes': 0, 'hashed': 0, 'copied': 0, 'copied_bytes': 0, 'vanished': 0}
+
+        def back_up(name):
+            try:
+                # Stat before reading: a change made during the copy shows up
+                # as a new mtime next time
+                size, mtime = _stat(storage, local, name)
+                entry = previous.get(name)
+                if entry and entry['size'] == size and entry['mtime'] == mtime \
+                        and object_path(root, entry['sha256']).exists():
+                    return name, entry, False, 0
+                digest, copied = _store_object(root, name)
+            except FileNotFoundError:
+                # Deleted since the listing (and after the database copy)
+                return name, None, False, 0
+            return name, {'sha256': digest, 'size': size, 'mtime': mtime}, True, copied
+
+        files = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for name, entry, hashed, copied in pool.map(back_up, names):
+                if entry is None:
+                    stats['vanished'] += 1
+                    continue
+                files[name] = entry
+                stats['files'] += 1
+                stats['bytes'] += entry['size']
+                stats['hashed'] += hashed
+                stats['copied'] += bool(copied)
+                stats['copied_bytes'] += copied
+                if progress:
+                    progress(stats['files'])
+
+        manifest = {
+            'format': MANIFEST_FORMAT,
+            'name': snapshot_name,
+            'created': created.isoformat(),
+            'seconds': round(time.monotonic() - started, 3),
+            'database': database,
+            'stats': stats,
+            'files': files,
+        }
+        with open(partial_dir / MANIFEST_NAME, 'w', encoding='utf-8') as handle:
+            json.dump(manifest, handle, indent=1, sort_keys=True)
+        os.replace(partial_dir, snapshot_dir)
+    except BaseException:
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        raise
+    return manifest
+
+
+def _referenced_names(database_path):
+    """PDF and pack names the payslip rows of a SQLite copy point to"""
+    table = Payslip._meta.db_table
+    source = sqlite3.connect(f'file:{database_path}?mode=ro', uri=True)
+    try:
+        rows = source.execute(f'SELECT pdf_file, pack_file FROM "{table}"').fetchall()
+    finally:
+        source.close()
+    return {pack_file or pdf_file for pdf_file, pack_file in rows if pack_file or pdf_file}
+
+
+def verify_snapshot(name='latest', workers=BACKUP_WORKERS):
+    """
+    Check a snapshot can be restored: the database copy is intact and every
+    object it lists is present with the recorded digest. Returns a report;
+    ``problems`` is empty when the snapshot is good.
+    """
+    root = backup_root()
+    snapshot_dir = resolve_snapshot(name)
+    manifest = load_manifest(snapshot_dir)
+    problems = []
+
+    database = manifest['database']
+    database_path = snapshot_dir / database['file']
+    if not database_path.is_file():
+        problems.append(f"database copy {database['file']} is missing")
+    elif _file_digest(database_path) != (database['sha256'], database['size']):
+        problems.append(f"database copy {database['file']} does not match its recorded digest")
+    elif database['vendor'] == 'sqlite':
+        check = sqlite3.connect(f'file:{database_path}?mode=ro', uri=True)
+        try:
+            result = check.execute('PRAGMA integrity_check').fetchone()[0]
+        finally:
+            check.close()
+        if result != 'ok':
+            problems.append(f'database copy failed integrity_check: {result}')
+        else:
+            unlisted = sorted(_referenced_names(database_path) - set(manifest['files']))
+            problems.extend(f'{missing} is referenced by the database but not in the backup' for missing in unlisted)
+    elif shutil.which('pg_restore'):
+        # Reading the table of contents checks the dump is complete
+        _run(['pg_restore', '--list', str(database_path)], dict(os.environ))
+
+    def check(item):
+        name, entry = item
+        path = object_path(root, entry['sha256'])
+        if not path.is_file():
+            return f'{name}: object {entry["sha256"]} is missing'
+        if _file_digest(path) != (entry['sha256'], entry['size']):
+            return f'{name}: object {entry["sha256"]} is corrupt'
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        problems.extend(problem for problem in pool.map(check, manifest['files'].items()) if problem)
+
+    return {'name': manifest['name'], 'files': len(manifest['files']), 'problems': problems}
+
+
+def _restore_database(snapshot_dir, database, target):
+    source_path = snapshot_dir / database['file']
+    if target is not None:
+        destination = target / ('db.sqlite3' if database['vendor'] == 'sqlite' else database['file'])
+        shutil.copyfile(source_path, destination)
+        return str(destination)
+
+    if database['vendor'] != connection.vendor:
+        raise BackupError(f"Snapshot holds a {database['vendor']} database but the site uses {connection.vendor}")
+    if database['vendor'] == 'sqlite':
+        connection.ensure_connection()
+        source = sqlite3.connect(f'file:{source_path}?mode=ro', uri=True)
+        try:
+            source.backup(connection.connection, pages=-1)
+        finally:
+            source.close()
+    else:
+        settings_dict = connection.settings_dict
+        command, env = _pg_command('pg_restore', settings_dict, '--clean', '--if-exists', '--no-owner',
+                                   '--exit-on-error', f"--dbname={settings_dict['NAME']}", str(source_path))
+        _run(command, env)
+    return connection.settings_dict['NAME']
+
+
+def _restore_file(root, storage, name, entry, target):
+    """Put one file back and re-read it; returns ``'restored'``, ``'unchanged'`` or an error"""
+    source = object_path(root, entry['sha256'])
+    expected = (entry['sha256'], entry['size'])
+
+    if target is not None:
+        destination = target / 'media' / name
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, destination)
+        return 'restored' if _file_digest(destination) == expected else f'{name}: restored copy does not match'
+
+    def stored_digest():
+        digest = hashlib.sha256()
+        size = 0
+        with open_pdf(name) as handle:
+            for chunk in iter(lambda: handle.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+    if storage.exists(name):
+        if storage.size(name) == entry['size'] and stored_digest() == expected:
+            return 'unchanged'
+        storage.delete(name)
+    with open(source, 'rb') as handle:
+        saved = storage.save(name, File(handle))
+    mark_pdf_exists(saved)
+    if saved != name:
+        return f'{name}: storage saved it as {saved}'
+    return 'restored' if stored_digest() == expected else f'{name}: restored file does not match'
+
+
+def restore_snapshot(name='latest', target=None, workers=BACKUP_WORKERS):
+    """
+    Verify a snapshot, then restore it.
+
+    With ``target`` the database copy and the PDFs (under ``media/``) are
+    written to that directory; without it they replace the configured
+    database and the files in the payslip storage, leaving files that are
+    already identical alone. Every restored file is read back and compared
+    with its digest. Returns a report.
+    """
+    verification = verify_snapshot(name, workers=workers)
+    if verification['problems']:
+        raise BackupError(f"Snapshot {verification['name']} failed verification: "
+                          + '; '.join(verification['problems'][:5]))
+
+    root = backup_root()
+    snapshot_dir = resolve_snapshot(name)
+    manifest = load_manifest(snapshot_dir)
+    if target is not None:
+        target = Path(target)
+        target.mkdir(parents=True, exist_ok=True)
+
+    report = {'name': manifest['name'], 'restored': 0, 'unchanged': 0, 'errors': []}
+    report['database'] = _restore_database(snapshot_dir, manifest['database'], target)
+
+    storage = get_payslip_storage()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(lambda item: _restore_file(root, storage, item[0], item[1], target),
+                           manifest['files'].items())
+        for result in results:
+            if result in ('restored', 'unchanged'):
+                report[result] += 1
+            else:
+                report['errors'].append(result)
+
+    if target is None:
+        # Cached pages and totals describe the data that was just replaced
+        bump_data_version()
+    return report
+
+
+def prune_backups(keep):
+    """Delete all but the newest ``keep`` snapshots and the objects only they used"""
+    root = backup_root()
+    snapshots = _snapshot_dirs(root)
+    removed = snapshots[keep:]
+    for snapshot_dir in removed:
+        shutil.rmtree(snapshot_dir)
+
+    referenced = set()
+    for snapshot_dir in snapshots[:keep]:
+        referenced.update(entry['sha256'] for entry in load_manifest(snapshot_dir)['files'].values())
+
+    objects_removed = 0
+    objects_dir = root / 'objects'
+    if objects_dir.is_dir():
+        for path in objects_dir.glob('*/*/*'):
+            if path.name not in referenced:
+                path.unlink()
+                objects_removed += 1
+    return {'snapshots_removed': [path.name for path in removed], 'objects_removed': objects_removed}
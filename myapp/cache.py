@@ -0,0 +1,126 @@
+"""
+Cache helpers shared by the read-heavy payslip views.
+
+Cached payslip data is keyed by a global "data version" counter instead of
+being deleted key by key. Any write to ``Payslip`` or ``Employee`` bumps the
+counter (see ``signals.py``), and so do the bulk paths that bypass model
+signals (``bump_data_version_on_commit``), which makes every older cache
+entry unreachable at once.
+
+``cached_page`` applies the same idea to whole rendered pages, per user.
+The counter lives in the default cache, so every process must share that
+cache for a write in one worker to reach the others: the local-memory
+backend is only right for a single process, the file-based backend (or any
+shared one) for several.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+
+DATA_VERSION_KEY = 'payslip_data_version'
+
+PAGE_CACHE_TIMEOUT = 60 * 60
+PAGE_STATS_KEY = 'page_cache_stats'
+# Names of the pages wrapped with cached_page, for hit ratio reports
+CACHED_PAGES = []
+
+
+def get_data_version():
+    """Return the current payslip data version"""
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a counter lost to eviction or a restart can
+        # never come back at a value that older entries were cached under
+        cache.add(DATA_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(DATA_VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """Invalidate everything cached against the current data version"""
+    try:
+        return cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        # Key missing - seeding it is already a new version
+        return get_data_version()
+
+
+def bump_data_version_on_commit():
+    """For bulk writes that send no model signals (``update``, ``bulk_update``, ...)"""
+    transaction.on_commit(bump_data_version)
+
+
+def versioned_key(prefix, *parts):
+    """Build a cache key that is only valid for the current data version"""
+    return ':'.join([prefix, str(get_data_version())] + [str(part) for part in parts])
+
+
+def _count(name, outcome):
+    key = f'{PAGE_STATS_KEY}:{name}:{outcome}'
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted between add and incr
+            cache.add(key, 1, timeout=None)
+
+
+def page_cache_stats():
+    """Hits, misses and hit ratio of every cached page since the counters were last cleared"""
+    stats = {}
+    for name in CACHED_PAGES:
+        hits = cache.get(f'{PAGE_STATS_KEY}:{name}:hit', 0)
+        misses = cache.get(f'{PAGE_STATS_KEY}:{name}:miss', 0)
+        total = hits + misses
+        stats[name] = {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else None}
+    return stats
+
+
+def _page_key(name, request):
+    # The page embeds a CSRF token, which is only valid with this CSRF cookie
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    digest = hashlib.sha1(f'{csrf_cookie}|{request.get_full_path()}'.encode('utf-8')).hexdigest()
+    return versioned_key('page', name, request.user.pk, digest)
+
+
+def cached_page(name, timeout=PAGE_CACHE_TIMEOUT):
+    """
+    Cache a view's rendered GET responses per user until the data version changes.
+
+    Only superusers' pages are cached (every cached page is superuser-only;
+    anyone else goes through the view's own permission check). Requests
+    without a CSRF cookie yet are rendered normally and not cached, since
+    the page's token would not match the cookie set with it.
+    """
+    CACHED_PAGES.append(name)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if (request.method != 'GET' or not request.user.is_superuser
+                    or settings.CSRF_COOKIE_NAME not in request.COOKIES):
+                return view_func(request, *args, **kwargs)
+
+            key = _page_key(name, request)
+            cached = cache.get(key)
+            if cached is not None:
+                _count(name, 'hit')
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            _count(name, 'miss')
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']), timeout)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
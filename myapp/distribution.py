@@ -0,0 +1,283 @@
+"""
+Emailing payslips to employees.
+
+Payslips are sent in batches: each batch runs on a worker thread that opens
+one connection from ``get_connection()`` and sends every message of the
+batch over it, so an SMTP session is set up once per batch rather than once
+per email. A shared limiter spaces sends across all workers to at most
+``PAYSLIP_EMAIL_RATE_LIMIT`` per second. Attachments are the stored PDFs (a
+pack slice or the loose file), never re-rendered.
+
+The outcome for each payslip is written to ``PayslipDelivery`` by the main
+thread after each batch. Any Django email backend works, so the console and
+file-based backends can stand in for SMTP.
+
+At the rate limit a large period takes minutes, longer than a web worker
+may spend on one request, so the site hands the send to the
+``email_payslips`` command in a background process (``start_email_job``,
+one job at a time) and progress is followed through ``PayslipDelivery``.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .layout import COMPANY_NAME
+from .models import Payslip, PayslipDelivery
+from .packs import read_packed_pdf
+from .storage import open_pdf
+
+
+DISTRIBUTION_BATCH_SIZE = 50
+DISTRIBUTION_WORKERS = 4
+
+DELIVERY_FIELDS = ['email', 'status', 'error', 'attempted_at', 'sent_at']
+
+
+class EmailJobRunning(Exception):
+    pass
+
+
+class RateLimiter:
+    """Spaces calls from any number of threads at least ``1 / rate`` seconds apart"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_at)
+            self.next_at = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def recipients(queryset, resend=False):
+    """Payslips of ``queryset`` to email (already-sent ones only with ``resend``)"""
+    queryset = queryset.select_related('employee_record').order_by('id')
+    if not resend:
+        queryset = queryset.exclude(delivery__status=PayslipDelivery.STATUS_SENT)
+    return queryset
+
+
+def recipient_email(payslip):
+    employee = payslip.employee_record
+    return employee.email if employee else ''
+
+
+def read_payslip_pdf(payslip):
+    """Stored PDF bytes of a payslip, from its pack or its loose file"""
+    if payslip.is_packed:
+        return read_packed_pdf(payslip)
+    with open_pdf(payslip.pdf_file.name) as handle:
+        return handle.read()
+
+
+def _message(payslip, email, pdf_bytes, connection):
+    message = EmailMessage(
+        subject=f'Payslip for {payslip.pay_period}',
+        body=(
+            f'Dear {payslip.employee_name},\n\n'
+            f'Please find attached your payslip for {payslip.pay_period}.\n\n'
+            f'{COMPANY_NAME}'
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email],
+        connection=connection,
+    )
+    message.attach(f'payslip_{payslip.employee_id}_{slugify(payslip.pay_period)}.pdf', pdf_bytes, 'application/pdf')
+    return message
+
+
+def _send_batch(payslips, limiter):
+    """Send one batch over a single connection; returns PayslipDelivery rows (unsaved)"""
+    deliveries = []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for payslip in payslips:
+            email = recipient_email(payslip)
+            delivery = PayslipDelivery(payslip=payslip, email=email, attempted_at=timezone.now())
+            if not email:
+                delivery.status = PayslipDelivery.STATUS_SKIPPED
+                delivery.error = 'No email address on the employee record'
+            else:
+                try:
+                    pdf_bytes = read_payslip_pdf(payslip)
+                    limiter.wait()
+                    _message(payslip, email, pdf_bytes, connection).send()
+                    delivery.status = PayslipDelivery.STATUS_SENT
+                    delivery.sent_at = timezone.now()
+                except Exception as e:
+                    delivery.status = PayslipDelivery.STATUS_FAILED
+                    delivery.error = str(e)
+            deliveries.append(delivery)
+    except Exception as e:
+        # The connection itself failed - everything not yet tried fails with it
+        done = {delivery.payslip_id for delivery in deliveries}
+        for payslip in payslips:
+            if payslip.id not in done:
+                deliveries.append(PayslipDelivery(
+                    payslip=payslip, email=recipient_email(payslip), attempted_at=timezone.now(),
+                    status=PayslipDelivery.STATUS_FAILED, error=str(e),
+                ))
+    finally:
+        connection.close()
+    return deliveries
+
+
+def _record(deliveries, report):
+    PayslipDelivery.objects.bulk_create(
+        deliveries, update_conflicts=True, unique_fields=['payslip'], update_fields=DELIVERY_FIELDS,
+    )
+    for delivery in deliveries:
+        report[delivery.status] += 1
+        if delivery.status == PayslipDelivery.STATUS_FAILED:
+            report['errors'].append(f'{delivery.payslip.employee_id} ({delivery.email}): {delivery.error}')
+
+
+def distribute_payslips(queryset, resend=False, dry_run=False, batch_size=DISTRIBUTION_BATCH_SIZE,
+                        workers=DISTRIBUTION_WORKERS, max_rate=None, progress=None):
+    """
+    Email every payslip in ``queryset`` to its employee; returns a report dict.
+
+    ``max_rate`` (emails per second, default ``PAYSLIP_EMAIL_RATE_LIMIT``) is
+    shared by all workers. ``progress`` is called with the running report
+    after each batch.
+    """
+    if max_rate is None:
+        max_rate = settings.PAYSLIP_EMAIL_RATE_LIMIT
+    report = {'dry_run': dry_run, 'sent': 0, 'failed': 0, 'skipped': 0, 'errors': []}
+    payslips = recipients(queryset, resend)
+
+    if dry_run:
+        for payslip in payslips.only('id', 'employee_record__email'):
+            report['sent' if recipient_email(payslip) else 'skipped'] += 1
+        return report
+
+    ids = list(payslips.values_list('id', flat=True))
+    limiter = RateLimiter(max_rate)
+    pending = set()
+
+    def collect(done):
+        for future in done:
+            _record(future.result(), report)
+            if progress:
+                progress(report)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(ids), batch_size):
+            batch = list(Payslip.objects.select_related('employee_record').filter(id__in=ids[start:start + batch_size]))
+            pending.add(pool.submit(_send_batch, batch, limiter))
+            # Keep a bounded number of batches in flight
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        done, _ = wait(pending)
+        collect(done)
+
+    return report
+
+
+EMAIL_JOB_LOCK = 'email_payslips.lock'
+# A lock with no pid yet belongs to a job being started, unless it is older than this
+EMAIL_JOB_START_TIMEOUT = 60
+
+
+def _pid_running(pid):
+    try:
+        # Reap the job if this process started it, or it would linger as a
+        # zombie and still look alive
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except ChildProcessError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def _running_job(lock_path):
+    """Period of the job holding the lock file, or None when it is free or left over"""
+    try:
+        pid, _, label = lock_path.read_text().partition('\n')
+        started = lock_path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    try:
+        running = _pid_running(int(pid))
+    except ValueError:
+        # Created, but the job has not been spawned yet
+        running = time.time() - started < EMAIL_JOB_START_TIMEOUT
+    return (label or 'another period') if running else None
+
+
+def _acquire_lock(lock_path):
+    """Create the lock file atomically; returns its descriptor or raises ``EmailJobRunning``"""
+    for _ in range(2):
+        try:
+            return os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            running = _running_job(lock_path)
+            if running is not None:
+                raise EmailJobRunning(f'Payslips for {running} are already being emailed')
+            # Left behind by a job that died without cleaning up
+            lock_path.unlink(missing_ok=True)
+    raise EmailJobRunning('Another email job is being started')
+
+
+def start_email_job(pay_period=None, period_contains=None, resend=False):
+    """
+    Run ``manage.py email_payslips`` for one period in a detached process;
+    returns the name of its log file under ``PAYSLIP_EMAIL_JOB_ROOT``.
+
+    One job runs at a time. The lock file is created with ``O_EXCL`` before
+    the job is spawned and removed by the job when it exits, so two clicks
+    (or two admins) cannot both start a send; the second gets
+    ``EmailJobRunning``.
+    """
+    root = Path(settings.PAYSLIP_EMAIL_JOB_ROOT)
+    root.mkdir(parents=True, exist_ok=True)
+    label = pay_period or period_contains
+    lock_path = root / EMAIL_JOB_LOCK
+    fd = _acquire_lock(lock_path)
+
+    try:
+        command = [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), 'email_payslips',
+                   '--lock-file', str(lock_path)]
+        if pay_period:
+            command += ['--pay-period', pay_period]
+        else:
+            command += ['--period-contains', period_contains]
+        if resend:
+            command.append('--resend')
+
+        log_name = f"{timezone.localtime():%Y%m%d-%H%M%S}-{slugify(label) or 'payslips'}.log"
+        with open(root / log_name, 'wb') as log:
+            # Own session, so the job outlives the web worker that started it
+            process = subprocess.Popen(
+                command, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                cwd=settings.BASE_DIR, start_new_session=True,
+            )
+        os.write(fd, f'{process.pid}\n{label}'.encode('utf-8'))
+    except BaseException:
+        os.close(fd)
+        lock_path.unlink(missing_ok=True)
+        raise
+    os.close(fd)
+    return log_name
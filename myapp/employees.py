@@ -0,0 +1,60 @@
+"""
+Employee master data.
+
+``Employee`` holds each person's standing pay details. Saving a payslip
+records what was entered against the master row, so next month the
+dashboard form is prefilled from one cached request instead of being typed
+from scratch, and searches match against the small master table and follow
+the indexed foreign key instead of scanning every payslip's text columns.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .cache import versioned_key
+from .models import Employee
+
+
+PREFILL_CACHE_TIMEOUT = 60 * 60
+
+
+def remember_employee(employee_id, name, basic_salary, incentive):
+    """Create or refresh the master row for ``employee_id``; returns the Employee"""
+    standing = {
+        'name': name,
+        'basic_salary': Decimal(str(basic_salary)),
+        'default_incentive': Decimal(str(incentive)),
+    }
+    employee, created = Employee.objects.get_or_create(employee_id=employee_id, defaults=standing)
+    if not created and any(getattr(employee, field) != value for field, value in standing.items()):
+        for field, value in standing.items():
+            setattr(employee, field, value)
+        employee.is_active = True
+        employee.save(update_fields=list(standing) + ['is_active', 'updated_at'])
+    return employee
+
+
+def matching_employees(search):
+    """Employees whose name or ID contains ``search``"""
+    return Employee.objects.filter(Q(name__icontains=search) | Q(employee_id__icontains=search))
+
+
+def employee_prefill():
+    """Active employees' standing data for the dashboard form (cached until the next write)"""
+    key = versioned_key('employee_prefill')
+    employees = cache.get(key)
+    if employees is None:
+        employees = [
+            {
+                'employee_id': row['employee_id'],
+                'name': row['name'],
+                'basic_salary': str(row['basic_salary']),
+                'default_incentive': str(row['default_incentive']),
+            }
+            for row in Employee.objects.filter(is_active=True).values(
+                'employee_id', 'name', 'basic_salary', 'default_incentive'
+            )
+        ]
+        cache.set(key, employees, PREFILL_CACHE_TIMEOUT)
+    return employees
@@ -0,0 +1,75 @@
+"""
+Ledger export of payslip records (CSV or XLSX).
+
+Rows are read with ``values_list().iterator(chunk_size=...)`` so no Payslip
+instances are built and memory stays flat however many rows are exported.
+CSV is produced lazily line by line for ``StreamingHttpResponse``.
+"""
+import csv
+import tempfile
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (field name, column header)
+LEDGER_COLUMNS = [
+    ('id', 'Payslip ID'),
+    ('employee_id', 'Employee ID'),
+    ('employee_name', 'Employee Name'),
+    ('pay_period', 'Pay Period'),
+    ('paid_days', 'Paid Days'),
+    ('loss_of_pay_days', 'Loss of Pay Days'),
+    ('payment_date', 'Payment Date'),
+    ('basic_salary', 'Basic'),
+    ('incentive', 'Incentive'),
+    ('gross_earnings', 'Gross Earnings'),
+    ('income_tax', 'Income Tax'),
+    ('total_deduction', 'Total Deduction'),
+    ('net_payable', 'Net Payable'),
+    ('created_at', 'Generated At'),
+]
+
+
+class _Echo:
+    """File-like object whose write() just hands the line back to csv.writer's caller"""
+
+    def write(self, value):
+        return value
+
+
+def ledger_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield raw value tuples for the ledger columns"""
+    fields = [field for field, _ in LEDGER_COLUMNS]
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def iter_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the CSV export one encoded line at a time"""
+    writer = csv.writer(_Echo())
+    # BOM so Excel detects the file as UTF-8
+    yield '\ufeff' + writer.writerow([header for _, header in LEDGER_COLUMNS])
+    for row in ledger_rows(queryset, chunk_size):
+        yield writer.writerow(row)
+
+
+def write_xlsx(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Write the export to a temporary .xlsx file and return it, rewound.
+
+    Needs ``openpyxl`` (in requirements.txt); raises ImportError without it.
+    A write-only workbook spools rows to disk, so memory stays flat here too.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Payslips')
+    sheet.append([header for _, header in LEDGER_COLUMNS])
+    for row in ledger_rows(queryset, chunk_size):
+        # Excel has no timezone support
+        sheet.append([value.replace(tzinfo=None) if hasattr(value, 'tzinfo') and value.tzinfo else value
+                      for value in row])
+
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    workbook.save(output)
+    output.seek(0)
+    return output
@@ -0,0 +1,203 @@
+"""
+HTML rendering of the payslip body from ``layout.PAYSLIP_LAYOUT``.
+
+The layout is turned into Django template source and compiled once per
+process; the preview and detail pages both embed the result, so neither
+carries its own copy of the payslip markup. A saved payslip's rendered body
+is cached under its id and ``updated_at``, which makes repeat detail views a
+single cache read.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.template import engines
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .layout import (
+    PAYSLIP_LAYOUT, COMPANY_NAME, COMPANY_ADDRESS_LINES, COMPANY_LOGO, CURRENCY_SYMBOL,
+    amount_table_height,
+)
+from .pdf import context_from_payslip
+
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _value(key):
+    return f'{{{{ payslip_data.{key} }}}}'
+
+
+def _money(key):
+    return f'{CURRENCY_SYMBOL} {_value(key)}'
+
+
+def _company_html():
+    address = '<br>\n'.join(escape(line) for line in COMPANY_ADDRESS_LINES)
+    return f'''<div class="company-info-section">
+    <div class="company-header">
+        <img src="{{% static '{COMPANY_LOGO}' %}}" alt="Company Logo" class="company-logo">
+        <div class="company-info">
+            <h3 class="company-title mt-2 fs-6">{escape(COMPANY_NAME)},</h3>
+            <p class="company-address fw-light">
+                {address}
+            </p>
+        </div>
+    </div>
+</div>'''
+
+
+def _statement_html():
+    statement = PAYSLIP_LAYOUT['statement']
+    fields = statement['fields']
+    rows = []
+    for start in range(0, len(fields), 2):
+        items = ''.join(
+            f'''
+        <div class="detail-item">
+            <span class="detail-label">{escape(label)}</span>
+            <span class="detail-value">: {_value(key)}</span>
+        </div>'''
+            for label, key in fields[start:start + 2]
+        )
+        rows.append(f'    <div class="detail-row">{items}\n    </div>')
+    body = '\n'.join(rows)
+    return f'''<div class="employee-statement-section">
+<div class="employee-statement-box">
+    <div class="statement-title">{escape(statement["title"])}</div>
+{body}
+</div>
+</div>'''
+
+
+def _table_row(label, amount):
+    return f'''
+        <div class="table-row">
+            <span>{label}</span>
+            <span>{amount}</span>
+        </div>'''
+
+
+def _amount_tables_html():
+    height = amount_table_height()
+    sections = []
+    for table in PAYSLIP_LAYOUT['amount_tables']:
+        rows = ''.join(_table_row(escape(label), _money(key)) for label, key in table['rows'])
+        rows += _table_row('&nbsp;', '&nbsp;') * (height - len(table['rows']))
+        total_label, total_key = table['total']
+        sections.append(f'''<div class="table-section">
+    <div class="table-header">
+        <span>{escape(table["title"])}</span>
+        <span>Amount</span>
+    </div>
+    <div class="table-body">{rows}
+    </div>
+    <div class="table-footer">
+        <span>{escape(total_label)}</span>
+        <span>{_money(total_key)}</span>
+    </div>
+</div>''')
+    return '<div class="earnings-deductions-container">\n' + '\n'.join(sections) + '\n</div>'
+
+
+def _net_payable_html():
+    net_payable = PAYSLIP_LAYOUT['net_payable']
+    return f'''<div class="net-payable-box">
+    <div class="net-payable-left">
+        <h5>{escape(net_payable["title"])}</h5>
+        <p>{escape(net_payable["subtitle"])}</p>
+    </div>
+    <div class="net-payable-amount">{_money(net_payable["key"])}</div>
+</div>'''
+
+
+def _year_to_date_html():
+    ytd = PAYSLIP_LAYOUT['year_to_date']
+    first_key = ytd['rows'][0][1]
+    label_key = ytd['label_key']
+    rows = ''.join(_table_row(escape(label), _money(key)) for label, key in ytd['rows'])
+    return f'''{{% if payslip_data.{first_key} is not None %}}
+<div class="table-section ytd-section">
+    <div class="table-header">
+        <span>{escape(ytd["title"])}{{% if payslip_data.{label_key} %}} (FY {_value(label_key)}){{% endif %}}</span>
+        <span>Amount</span>
+    </div>
+    <div class="table-body">{rows}
+    </div>
+</div>
+{{% endif %}}'''
+
+
+def _amount_in_words_html():
+    words = PAYSLIP_LAYOUT['amount_in_words']
+    return f'''<div class="amount-in-words">
+    <strong>{escape(words["label"])}:</strong> {_value(words["key"])}
+</div>'''
+
+
+def _signatures_html():
+    signatures = PAYSLIP_LAYOUT['signatures']
+    boxes = ''.join(
+        f'''
+    <div class="signature-box">
+        <div class="signature-line">
+            <div class="signature-name">{_value(key) if key else escape(name)}</div>
+            <div class="signature-role">{escape(role)}</div>
+        </div>
+    </div>'''
+        for key, name, role in signatures['parties']
+    )
+    return f'''<div class="signatures-section">
+<div class="signature-title">{escape(signatures["title"])}</div>
+<div class="signature-row">{boxes}
+</div>
+</div>'''
+
+
+@lru_cache(maxsize=None)
+def payslip_fragment_source():
+    """Django template source for the payslip body, generated from the layout"""
+    return '\n'.join([
+        '{% load static %}',
+        '<div class="company-row">',
+        _company_html(),
+        _statement_html(),
+        '</div>',
+        _amount_tables_html(),
+        _net_payable_html(),
+        _year_to_date_html(),
+        _amount_in_words_html(),
+        _signatures_html(),
+    ])
+
+
+@lru_cache(maxsize=None)
+def payslip_fragment_template():
+    """The compiled fragment template, built once per process"""
+    return engines['django'].from_string(payslip_fragment_source())
+
+
+@lru_cache(maxsize=None)
+def _source_digest():
+    # Part of every cache key, so a layout change never serves old markup
+    return hashlib.sha1(payslip_fragment_source().encode('utf-8')).hexdigest()[:12]
+
+
+def render_payslip_fragment(payslip_data):
+    """Render the payslip body for a context dict (e.g. the unsaved preview)"""
+    return mark_safe(payslip_fragment_template().render({'payslip_data': payslip_data}))
+
+
+def payslip_fragment_key(payslip):
+    return f'payslip_fragment:{_source_digest()}:{payslip.id}:{payslip.updated_at.timestamp()}'
+
+
+def cached_payslip_fragment(payslip):
+    """Rendered body of a saved payslip, cached until the row changes"""
+    key = payslip_fragment_key(payslip)
+    html = cache.get(key)
+    if html is None:
+        html = str(render_payslip_fragment(context_from_payslip(payslip)))
+        cache.set(key, html, FRAGMENT_CACHE_TIMEOUT)
+    return mark_safe(html)
@@ -0,0 +1,108 @@
+"""
+Idempotency keys for the payslip save and download endpoints.
+
+A client that retries a POST (a timed-out ``fetch`` followed by a second
+click) sends the same ``Idempotency-Key`` header again. The first request
+claims the key with an atomic ``cache.add`` and runs normally; its
+successful response is kept for ``IDEMPOTENCY_TTL`` seconds and replayed
+to any retry, so the PDF is rendered once. A retry that arrives while the
+first request is still running polls for that result instead of starting a
+second render. Requests without the header behave exactly as before.
+
+The claim and the stored results live in the default cache, so retries are
+only absorbed across processes when that cache is shared.
+"""
+import functools
+import hashlib
+import re
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IDEMPOTENCY_TTL = 60 * 10
+# Longest a request may hold a key; a crashed worker's claim expires after this
+IDEMPOTENCY_LOCK_TTL = 60 * 2
+# How long a retry waits for the in-flight request before giving up
+IDEMPOTENCY_WAIT = 30
+IDEMPOTENCY_POLL_INTERVAL = 0.1
+
+# Response headers replayed along with the body
+REPLAYED_HEADERS = ['Content-Type', 'Content-Disposition']
+
+_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]{1,100}$')
+
+
+def _cache_key(scope, request, key):
+    return f'idempotency:{scope}:{request.user.pk}:{key}'
+
+
+def _store(cache_key, fingerprint, response):
+    cache.set(f'{cache_key}:result', {
+        'fingerprint': fingerprint,
+        'status': response.status_code,
+        'content': response.content,
+        'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+    }, IDEMPOTENCY_TTL)
+
+
+def _replay(stored):
+    response = HttpResponse(stored['content'], status=stored['status'])
+    for name, value in stored['headers'].items():
+        response[name] = value
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """
+    View decorator honouring an ``Idempotency-Key`` header on POST requests.
+
+    Keys are per user and per ``scope``. Only 2xx responses are stored, so a
+    request that failed can be retried for real with the same key. Reusing a
+    key with a different request body is rejected.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.META.get(IDEMPOTENCY_HEADER, '').strip()
+            if request.method != 'POST' or not key:
+                return view(request, *args, **kwargs)
+            if not _KEY_PATTERN.match(key):
+                return JsonResponse({'success': False, 'message': 'Invalid idempotency key'}, status=400)
+
+            cache_key = _cache_key(scope, request, key)
+            fingerprint = hashlib.sha256(request.body).hexdigest()
+            deadline = time.monotonic() + IDEMPOTENCY_WAIT
+
+            while True:
+                stored = cache.get(f'{cache_key}:result')
+                if stored is not None:
+                    if stored['fingerprint'] != fingerprint:
+                        return JsonResponse({
+                            'success': False,
+                            'message': 'Idempotency key was already used for a different request'
+                        }, status=422)
+                    return _replay(stored)
+
+                if cache.add(f'{cache_key}:lock', fingerprint, IDEMPOTENCY_LOCK_TTL):
+                    try:
+                        response = view(request, *args, **kwargs)
+                        if 200 <= response.status_code < 300 and not response.streaming:
+                            _store(cache_key, fingerprint, response)
+                    finally:
+                        cache.delete(f'{cache_key}:lock')
+                    return response
+
+                if time.monotonic() >= deadline:
+                    return JsonResponse({
+                        'success': False,
+                        'message': 'A request with this idempotency key is still in progress'
+                    }, status=409)
+                # Another request holds the key - wait for its result
+                time.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+        return wrapper
+    return decorator
@@ -0,0 +1,192 @@
+"""
+Content digests for stored payslip PDFs and the audit that checks them.
+
+Every write of a payslip PDF records its SHA-256 and byte size on the row
+(``Payslip.pdf_sha256`` / ``pdf_size``). ``audit_payslips`` re-hashes what
+is actually stored and compares: loose files and pack slices are hashed on a
+thread pool straight from memory-mapped files (hashlib releases the GIL on
+large buffers, and mapping avoids copying each PDF into Python bytes).
+Packed rows are grouped so each pack is mapped once. Storages without local
+paths are read in chunks instead.
+"""
+import hashlib
+import mmap
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.db import transaction
+
+from .models import Payslip
+from .purge import find_orphans
+from .storage import get_payslip_storage, is_local_storage, open_pdf
+
+
+AUDIT_WORKERS = 16
+AUDIT_BATCH_SIZE = 2000
+# Loose files hashed per task; packs are always one task each
+AUDIT_FILES_PER_TASK = 64
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def pdf_digest(data):
+    """``(sha256 hex digest, size)`` of PDF bytes, as stored on the Payslip row"""
+    return hashlib.sha256(data).hexdigest(), len(data)
+
+
+def _hash_mapped(path, regions):
+    """Hash ``regions`` (payslip id, offset, length or None for the rest) of a local file"""
+    results = {}
+    with open(path, 'rb') as handle:
+        size = os.fstat(handle.fileno()).st_size
+        if size == 0:
+            # mmap cannot map an empty file
+            return {payslip_id: pdf_digest(b'') for payslip_id, _, _ in regions}
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for payslip_id, offset, length in regions:
+                    end = size if length is None else min(offset + length, size)
+                    region = view[offset:end]
+                    results[payslip_id] = (hashlib.sha256(region).hexdigest(), len(region))
+                    region.release()
+            finally:
+                view.release()
+    return results
+
+
+def _hash_streamed(name, regions):
+    """Same as ``_hash_mapped`` for storages without local paths"""
+    results = {}
+    with open_pdf(name) as handle:
+        for payslip_id, offset, length in regions:
+            handle.seek(offset)
+            digest = hashlib.sha256()
+            remaining = length
+            size = 0
+            while remaining is None or remaining > 0:
+                chunk = handle.read(HASH_CHUNK_SIZE if remaining is None else min(HASH_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+            results[payslip_id] = (digest.hexdigest(), size)
+    return results
+
+
+def _hash_files(storage, local, files):
+    """
+    Hash a list of ``(name, regions)``; returns ``(results, missing_ids)``.
+
+    ``results`` maps payslip id to the ``(digest, size)`` actually stored.
+    """
+    results = {}
+    missing = []
+    for name, regions in files:
+        try:
+            if local:
+                results.update(_hash_mapped(storage.path(name), regions))
+            else:
+                results.update(_hash_streamed(name, regions))
+        except FileNotFoundError:
+            missing.extend(payslip_id for payslip_id, _, _ in regions)
+    return results, missing
+
+
+def _tasks(rows):
+    """Group a batch of rows into hashing tasks: one per pack, a few loose files each"""
+    packs = defaultdict(list)
+    loose = []
+    for payslip_id, pdf_file, pack_file, pack_offset, pack_length in rows:
+        if pack_file:
+            packs[pack_file].append((payslip_id, pack_offset, pack_length))
+        elif pdf_file:
+            loose.append((pdf_file, [(payslip_id, 0, None)]))
+    tasks = [[(pack_file, regions)] for pack_file, regions in packs.items()]
+    for start in range(0, len(loose), AUDIT_FILES_PER_TASK):
+        tasks.append(loose[start:start + AUDIT_FILES_PER_TASK])
+    return tasks
+
+
+def audit_payslips(workers=AUDIT_WORKERS, record=False, orphans=True, batch_size=AUDIT_BATCH_SIZE, progress=None):
+    """
+    Re-hash every stored payslip PDF and compare it with the recorded digest.
+
+    Returns a report with the ids of ``mismatched`` rows (digest or size
+    differs) and ``missing`` rows (file or pack gone), the number of
+    ``unrecorded`` rows that have no digest yet (stored when ``record`` is
+    set), and, with ``orphans``, the stored files no row references.
+    """
+    started = time.monotonic()
+    storage = get_payslip_storage()
+    local = is_local_storage(storage)
+    report = {
+        'checked': 0, 'ok': 0, 'mismatched': [], 'missing': [], 'unrecorded': 0, 'recorded': 0,
+        'orphaned': [], 'seconds': 0.0,
+    }
+
+    expected = {}
+    to_record = []
+
+    def collect(done):
+        for future in done:
+            results, missing = future.result()
+            report['missing'].extend(missing)
+            for payslip_id, (digest, size) in results.items():
+                recorded_digest, recorded_size = expected.pop(payslip_id)
+                report['checked'] += 1
+                if not recorded_digest:
+                    report['unrecorded'] += 1
+                    to_record.append(Payslip(id=payslip_id, pdf_sha256=digest, pdf_size=size))
+                elif recorded_digest == digest and recorded_size == size:
+                    report['ok'] += 1
+                else:
+                    report['mismatched'].append(payslip_id)
+            if progress:
+                progress(report)
+
+    rows = Payslip.objects.order_by('id').values_list(
+        'id', 'pdf_file', 'pack_file', 'pack_offset', 'pack_length', 'pdf_sha256', 'pdf_size'
+    )
+    pending = set()
+    batch = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def submit(batch):
+            nonlocal pending
+            for task in _tasks([row[:5] for row in batch]):
+                pending.add(pool.submit(_hash_files, storage, local, task))
+                # Keep a bounded number of tasks in flight
+                if len(pending) >= workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+        for row in rows.iterator(chunk_size=batch_size):
+            if not row[1] and not row[2]:
+                # No file was ever stored for this row
+                report['missing'].append(row[0])
+                continue
+            expected[row[0]] = (row[5], row[6])
+            batch.append(row)
+            if len(batch) >= batch_size:
+                submit(batch)
+                batch = []
+        submit(batch)
+        done, _ = wait(pending)
+        collect(done)
+
+    report['missing'].sort()
+    report['mismatched'].sort()
+
+    if record and to_record:
+        with transaction.atomic():
+            Payslip.objects.bulk_update(to_record, ['pdf_sha256', 'pdf_size'], batch_size=batch_size)
+        report['recorded'] = len(to_record)
+
+    if orphans:
+        report['orphaned'], _ = find_orphans(batch_size=batch_size)
+
+    report['seconds'] = time.monotonic() - started
+    return report
@@ -0,0 +1,85 @@
+"""
+The payslip layout, described once.
+
+Both renderers are compiled from this description: ``fragments.py`` turns it
+into a Django template for the preview and detail pages, and ``pdf.py`` turns
+it into ReportLab flowables. Changing a label, a row or the company details
+here changes every view of a payslip; bump ``pdf.LAYOUT_VERSION`` so stored
+PDFs are re-rendered.
+
+Values are referenced by context key (the Payslip field names used by
+``pdf.context_from_payslip``). Like ``pdf.py`` this module has no Django
+dependency.
+"""
+
+COMPANY_NAME = 'VETRI IT SYSTEMS PVT LTD.'
+COMPANY_ADDRESS_LINES = [
+    'Shanthi complex, Second floor,',
+    'Surandai, Tenkasi - 627 859',
+    'India',
+]
+# Relative to the app's static directory
+COMPANY_LOGO = 'images/VIS LOGO.png'
+SIGNATORY_TITLE = 'Managing Director'
+
+CURRENCY_SYMBOL = '₹'
+
+PAYSLIP_LAYOUT = {
+    'statement': {
+        'title': 'Employee Statement',
+        # (label, key); the HTML lays these out two per row
+        'fields': [
+            ('Employee Name', 'employee_name'),
+            ('Employee ID', 'employee_id'),
+            ('Pay Period', 'pay_period'),
+            ('Paid Days', 'paid_days'),
+            ('Loss of Pay Days', 'loss_of_pay_days'),
+            ('Payment Date', 'payment_date'),
+        ],
+    },
+    # Side-by-side amount tables; shorter ones are padded with blank rows
+    'amount_tables': [
+        {
+            'title': 'Earnings',
+            'rows': [('Basic', 'basic_salary'), ('Incentive', 'incentive')],
+            'total': ('Gross Earnings', 'gross_earnings'),
+        },
+        {
+            'title': 'Deduction',
+            'rows': [('Income Tax', 'income_tax')],
+            'total': ('Total Deduction', 'total_deduction'),
+        },
+    ],
+    'net_payable': {
+        'title': 'TOTAL NET PAYABLE',
+        'subtitle': 'Gross Earnings - Total Deduction',
+        'key': 'net_payable',
+    },
+    # Only shown when the context carries the YTD figures (see ytd.py)
+    'year_to_date': {
+        'title': 'Year to Date',
+        'label_key': 'fiscal_year_label',
+        'rows': [
+            ('Gross Earnings', 'ytd_gross_earnings'),
+            ('Income Tax', 'ytd_income_tax'),
+            ('Net Payable', 'ytd_net_payable'),
+        ],
+    },
+    'amount_in_words': {
+        'label': 'Amount in words',
+        'key': 'amount_in_words',
+    },
+    'signatures': {
+        'title': 'ACKNOWLEDGED BY,',
+        # (name key or None for a fixed name, fixed name, role)
+        'parties': [
+            ('employee_name', None, f'Employee, {COMPANY_NAME}'),
+            (None, 'AUTHORISED NAME', f'{SIGNATORY_TITLE}, {COMPANY_NAME}'),
+        ],
+    },
+}
+
+
+def amount_table_height():
+    """Body rows every amount table is padded to"""
+    return max(len(table['rows']) for table in PAYSLIP_LAYOUT['amount_tables'])
@@ -0,0 +1,339 @@
+"""
+Month-end load test: N superusers generating, saving and downloading payslips at once.
+
+Each simulated user logs in once and then repeats the payroll-day flow
+
+    generate_payslip -> payslip_preview -> generate_pdf_download
+    -> save_payslip_to_database -> view_payslips -> download_payslip
+
+on its own thread and session. Requests go either through Django's test
+``Client`` in this process (``ClientDriver``, exercising the views, ORM and
+configured database without a server) or over HTTP to a running server such
+as a local gunicorn (``HttpDriver``), which adds the worker model and
+network stack to the measurement.
+
+Every request's latency is recorded per endpoint; ``LoadStats.summary()``
+reports throughput, p50/p95/p99 latency and the error rate of each. Payslips
+created by a run share one pay period (``Load test <run id>``) and are
+removed through the bulk delete endpoint afterwards, so the running totals
+stay correct.
+"""
+import http.cookiejar
+import json
+import math
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import date
+
+from django.db import connection
+from django.test import Client
+
+
+LOADTEST_USERS = 10
+LOADTEST_ITERATIONS = 5
+# Error messages kept per endpoint for the report
+ERROR_SAMPLES = 3
+
+# Report order
+ENDPOINTS = [
+    'login', 'generate_payslip', 'payslip_preview', 'generate_pdf_download',
+    'save_payslip_to_database', 'view_payslips', 'download_payslip',
+]
+
+
+class Response:
+    def __init__(self, status, body, headers):
+        self.status = status
+        self.body = body
+        self.headers = headers
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class ClientDriver:
+    """Runs requests in this process through Django's test Client"""
+
+    def __init__(self):
+        self.client = Client()
+
+    def get(self, path):
+        return self._wrap(self.client.get(path))
+
+    def post_form(self, path, data):
+        return self._wrap(self.client.post(path, data))
+
+    def post_json(self, path, payload):
+        return self._wrap(self.client.post(path, json.dumps(payload), content_type='application/json'))
+
+    def _wrap(self, response):
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return Response(response.status_code, body, response.headers)
+
+    def close(self):
+        # Each simulated user is a thread with its own database connection
+        connection.close()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpDriver:
+    """Sends requests to a running server, keeping cookies and the CSRF token like a browser"""
+
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def _send(self, path, body=None, content_type=None):
+        request = urllib.request.Request(self.base_url + path, data=body)
+        if body is not None:
+            request.add_header('Content-Type', content_type)
+            request.add_header('X-CSRFToken', self._csrf_token())
+            # CSRF origin checks on HTTPS want a same-site referer
+            request.add_header('Referer', self.base_url + '/')
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return Response(response.status, response.read(), response.headers)
+        except urllib.error.HTTPError as e:
+            return Response(e.code, e.read(), e.headers)
+
+    def get(self, path):
+        return self._send(path)
+
+    def post_form(self, path, data):
+        data = {**data, 'csrfmiddlewaretoken': self._csrf_token()}
+        return self._send(path, urllib.parse.urlencode(data).encode(), 'application/x-www-form-urlencoded')
+
+    def post_json(self, path, payload):
+        return self._send(path, json.dumps(payload).encode(), 'application/json')
+
+    def close(self):
+        pass
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class LoadStats:
+    """Latencies and errors per endpoint, shared by all simulated users"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = defaultdict(list)
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, endpoint, seconds, error=None):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if error:
+                self.errors[endpoint] += 1
+                if len(self.error_samples[endpoint]) < ERROR_SAMPLES:
+                    self.error_samples[endpoint].append(error)
+
+    def _row(self, endpoint, latencies, errors, elapsed):
+        ordered = sorted(latencies)
+        return {
+            'endpoint': endpoint,
+            'requests': len(ordered),
+            'errors': errors,
+            'error_rate': errors / len(ordered) if ordered else 0.0,
+            'throughput': len(ordered) / elapsed if elapsed else 0.0,
+            'mean_ms': sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+            'p50_ms': percentile(ordered, 0.50) * 1000,
+            'p95_ms': percentile(ordered, 0.95) * 1000,
+            'p99_ms': percentile(ordered, 0.99) * 1000,
+            'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+        }
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        rows = [
+            self._row(endpoint, self.latencies[endpoint], self.errors[endpoint], elapsed)
+            for endpoint in ENDPOINTS if endpoint in self.latencies
+        ]
+        everything = [seconds for latencies in self.latencies.values() for seconds in latencies]
+        return {
+            'seconds': elapsed,
+            'endpoints': rows,
+            'total': self._row('total', everything, sum(self.errors.values()), elapsed),
+            'error_samples': dict(self.error_samples),
+        }
+
+
+def payslip_form(employee_id, pay_period, payment_date):
+    """Field values the dashboard form would submit for one payslip"""
+    return {
+        'employee_name': f'Load Test {employee_id}',
+        'employee_id': employee_id,
+        'pay_period': pay_period,
+        'paid_days': '30',
+        'loss_of_pay_days': '0',
+        'payment_date': payment_date,
+        'basic_salary': '25000.00',
+        'incentive': '1500.00',
+        'gross_earnings': '26500.00',
+        'income_tax': '1200.00',
+        'total_deduction': '1200.00',
+        'net_payable': '25300.00',
+        'amount_in_words': 'Twenty Five Thousand Three Hundred Rupees Only',
+    }
+
+
+class SimulatedUser:
+    def __init__(self, driver, stats, number, run_id, pay_period):
+        self.driver = driver
+        self.stats = stats
+        self.number = number
+        self.run_id = run_id
+        self.pay_period = pay_period
+
+    def _call(self, endpoint, send, check):
+        """Time one request; returns the response, or None if it failed"""
+        started = time.perf_counter()
+        try:
+            response = send()
+            error = check(response)
+        except Exception as e:
+            response, error = None, f'{type(e).__name__}: {e}'
+        self.stats.record(endpoint, time.perf_counter() - started, error)
+        return None if error else response
+
+    def login(self, username, password):
+        # Fetch the login page first for the CSRF cookie (not timed); if the
+        # server is unreachable the timed POST below records the error
+        try:
+            self.driver.get('/login/')
+        except Exception:
+            pass
+        return self._call(
+            'login',
+            lambda: self.driver.post_form('/login/', {'username': username, 'password': password}),
+            lambda r: None if r.status == 302 and 'login' not in r.headers.get('Location', '/login/')
+            else f'login failed (HTTP {r.status})',
+        )
+
+    def iteration(self, number):
+        employee_id = f'LT{self.run_id}-{self.number}-{number}'
+        form = payslip_form(employee_id, self.pay_period, date.today().isoformat())
+
+        steps = [
+            ('generate_payslip', lambda: self.driver.post_form('/generate-payslip/', form), _json_success),
+            ('payslip_preview', lambda: self.driver.get('/payslip-preview/'), _status_ok),
+            ('generate_pdf_download', lambda: self.driver.post_json('/generate-pdf-download/', form), _is_pdf),
+            ('save_payslip_to_database', lambda: self.driver.post_json('/save-payslip-to-database/', form),
+             _json_success),
+        ]
+        for endpoint, send, check in steps:
+            response = self._call(endpoint, send, check)
+            if response is None:
+                # Later steps depend on this one
+                return
+        payslip_id = response.json()['payslip_id']
+
+        self._call('view_payslips', lambda: self.driver.get('/view-payslips/'), _status_ok)
+        self._call('download_payslip', lambda: self.driver.get(f'/payslip/{payslip_id}/download/'), _is_pdf)
+
+
+def _status_ok(response):
+    return None if response.status == 200 else f'HTTP {response.status}'
+
+
+def _json_success(response):
+    if response.status != 200:
+        return f'HTTP {response.status}: {response.body[:200].decode(errors="replace")}'
+    data = response.json()
+    return None if data.get('success') else data.get('message', 'success was false')
+
+
+def _is_pdf(response):
+    if response.status != 200:
+        return f'HTTP {response.status}'
+    return None if response.body.startswith(b'%PDF') else 'response is not a PDF'
+
+
+def run_load_test(username, password, users=LOADTEST_USERS, iterations=LOADTEST_ITERATIONS,
+                  base_url=None, cleanup=True, progress=None):
+    """
+    Run the month-end flow for ``users`` concurrent superusers; returns the
+    ``LoadStats`` summary plus the run's pay period and cleanup report.
+
+    ``base_url`` switches from the in-process driver to HTTP. ``progress``
+    is called with the user number after each finished iteration.
+    """
+    def make_driver():
+        return HttpDriver(base_url) if base_url else ClientDriver()
+
+    run_id = format(int(time.time()), 'x')
+    pay_period = f'Load test {run_id}'
+    stats = LoadStats()
+    # Everyone starts the flow together, after logging in
+    start_line = threading.Barrier(users)
+
+    def simulate(number):
+        driver = make_driver()
+        user = SimulatedUser(driver, stats, number, run_id, pay_period)
+        try:
+            try:
+                logged_in = user.login(username, password)
+            finally:
+                start_line.wait()
+            if logged_in is None:
+                return
+            for iteration in range(iterations):
+                user.iteration(iteration)
+                if progress:
+                    progress(number)
+        finally:
+            driver.close()
+
+    threads = [threading.Thread(target=simulate, args=(number,), name=f'loadtest-{number}') for number in range(users)]
+    stats.started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats.finished = time.perf_counter()
+
+    result = {'pay_period': pay_period, 'users': users, 'iterations': iterations, **stats.summary()}
+    if cleanup:
+        result['cleanup'] = _cleanup(make_driver(), username, password, pay_period, run_id)
+    return result
+
+
+def _cleanup(driver, username, password, pay_period, run_id):
+    """Delete the run's payslips through the bulk delete endpoint and its employee records"""
+    from .models import Employee
+
+    try:
+        driver.get('/login/')
+        driver.post_form('/login/', {'username': username, 'password': password})
+        response = driver.post_json('/bulk-delete-payslips/', {'pay_period': pay_period})
+        report = response.json().get('report', {})
+    finally:
+        driver.close()
+    # Only reaches the target's database when it shares this one (e.g. local gunicorn)
+    employees, _ = Employee.objects.filter(employee_id__startswith=f'LT{run_id}-').delete()
+    return {'payslips': report.get('rows', 0), 'employees': employees}
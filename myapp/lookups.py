@@ -0,0 +1,110 @@
+"""
+Batch existence checks for (employee_id, pay_period) pairs.
+
+The HR-side reconciliation asks about hundreds of employees at once;
+``lookup_payslips`` answers all of them with one query per
+``LOOKUP_CHUNK_SIZE`` pairs. Within a chunk the pairs are grouped by pay
+period, so the query is ``pay_period = p AND employee_id IN (...)`` per
+period, which the (employee_id, pay_period) index serves directly.
+
+Request limits (see ``views.lookup_payslips_api``): at most
+``LOOKUP_MAX_PAIRS`` pairs, and at most ``LOOKUP_MAX_BODY_BYTES`` of JSON
+after gzip decompression. The compressed body itself is bounded by Django's
+``DATA_UPLOAD_MAX_MEMORY_SIZE``.
+"""
+import zlib
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .models import Payslip
+
+
+LOOKUP_MAX_PAIRS = 5000
+LOOKUP_CHUNK_SIZE = 500
+LOOKUP_MAX_BODY_BYTES = 1024 * 1024
+
+
+class BatchLookupError(ValueError):
+    """A malformed or oversized batch request; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def decode_body(body, content_encoding='', max_bytes=LOOKUP_MAX_BODY_BYTES):
+    """Raw request body, gunzipped if sent with ``Content-Encoding: gzip``; at most ``max_bytes``"""
+    encoding = content_encoding.strip().lower()
+    if not encoding or encoding == 'identity':
+        if len(body) > max_bytes:
+            raise BatchLookupError(f'Request body is larger than {max_bytes} bytes', status=413)
+        return body
+    if encoding != 'gzip':
+        raise BatchLookupError(f'Unsupported Content-Encoding: {content_encoding}', status=415)
+
+    # Stop as soon as the output passes the limit, whatever the compressed size
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, max_bytes + 1)
+    except zlib.error:
+        raise BatchLookupError('Request body is not valid gzip')
+    if len(data) > max_bytes:
+        raise BatchLookupError(f'Decompressed request body is larger than {max_bytes} bytes', status=413)
+    if not decompressor.eof:
+        raise BatchLookupError('Request body is truncated gzip')
+    return data
+
+
+def parse_pairs(data):
+    """Validate ``{"pairs": [{"employee_id": ..., "pay_period": ...}, ...]}``; returns a list of tuples"""
+    pairs = data.get('pairs') if isinstance(data, dict) else None
+    if not isinstance(pairs, list):
+        raise BatchLookupError('Expected a JSON object with a "pairs" list')
+    if len(pairs) > LOOKUP_MAX_PAIRS:
+        raise BatchLookupError(f'At most {LOOKUP_MAX_PAIRS} pairs per request', status=413)
+
+    parsed = []
+    for index, pair in enumerate(pairs):
+        employee_id = pair.get('employee_id') if isinstance(pair, dict) else None
+        pay_period = pair.get('pay_period') if isinstance(pair, dict) else None
+        if not isinstance(employee_id, str) or not isinstance(pay_period, str) or not employee_id or not pay_period:
+            raise BatchLookupError(f'Pair {index} needs string employee_id and pay_period')
+        parsed.append((employee_id, pay_period))
+    return parsed
+
+
+def lookup_payslips(pairs, chunk_size=LOOKUP_CHUNK_SIZE):
+    """
+    Resolve ``(employee_id, pay_period)`` pairs to their payslips.
+
+    Returns one dict per pair, in order, with ``exists``, ``payslip_id`` and
+    ``net_payable`` (the lowest id wins if a pair has several payslips).
+    """
+    found = {}
+    unique = list(dict.fromkeys(pairs))
+    for start in range(0, len(unique), chunk_size):
+        by_period = defaultdict(list)
+        for employee_id, pay_period in unique[start:start + chunk_size]:
+            by_period[pay_period].append(employee_id)
+        condition = Q()
+        for pay_period, employee_ids in by_period.items():
+            condition |= Q(pay_period=pay_period, employee_id__in=employee_ids)
+        rows = Payslip.objects.filter(condition).order_by('-id').values_list(
+            'employee_id', 'pay_period', 'id', 'net_payable'
+        )
+        for employee_id, pay_period, payslip_id, net_payable in rows:
+            # Descending ids, so the lowest id is written last
+            found[(employee_id, pay_period)] = (payslip_id, net_payable)
+
+    results = []
+    for employee_id, pay_period in pairs:
+        payslip_id, net_payable = found.get((employee_id, pay_period), (None, None))
+        results.append({
+            'employee_id': employee_id,
+            'pay_period': pay_period,
+            'exists': payslip_id is not None,
+            'payslip_id': payslip_id,
+            'net_payable': net_payable,
+        })
+    return results
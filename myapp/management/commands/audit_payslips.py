@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from myapp.integrity import AUDIT_BATCH_SIZE, AUDIT_WORKERS, audit_payslips
+
+
+class Command(BaseCommand):
+    help = 'Re-hash stored payslip PDFs and report mismatched, missing and orphaned files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=AUDIT_WORKERS)
+        parser.add_argument('--batch-size', type=int, default=AUDIT_BATCH_SIZE)
+        parser.add_argument('--record', action='store_true',
+                            help='Store the digest of payslips that do not have one yet')
+        parser.add_argument('--skip-orphans', action='store_true',
+                            help='Do not list the storage looking for unreferenced files')
+
+    def handle(self, *args, **options):
+        report = audit_payslips(
+            workers=options['workers'],
+            record=options['record'],
+            orphans=not options['skip_orphans'],
+            batch_size=options['batch_size'],
+        )
+
+        rate = report['checked'] / report['seconds'] if report['seconds'] else 0.0
+        self.stdout.write(f"Checked {report['checked']} file(s) in {report['seconds']:.1f}s ({rate:.0f}/s)")
+        self.stdout.write(f"OK: {report['ok']}")
+        self.stdout.write(f"No recorded digest: {report['unrecorded']}"
+                          + (f" ({report['recorded']} recorded now)" if options['record'] else ''))
+
+        for label, key in [('Mismatched', 'mismatched'), ('Missing', 'missing')]:
+            ids = report[key]
+            style = self.style.ERROR if ids else self.style.SUCCESS
+            self.stdout.write(style(f'{label}: {len(ids)}'))
+            if ids:
+                self.stdout.write('  ids: ' + ', '.join(str(payslip_id) for payslip_id in ids))
+
+        if not options['skip_orphans']:
+            self.stdout.write(f"Orphaned files: {len(report['orphaned'])}")
+            for name in report['orphaned']:
+                self.stdout.write(f'  {name}')
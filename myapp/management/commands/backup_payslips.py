@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.backup import BACKUP_WORKERS, BackupError, backup_root, create_backup, list_snapshots, prune_backups
+
+
+class Command(BaseCommand):
+    help = 'Take an online snapshot of the database and an incremental copy of the payslip PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int,
+                            help='Afterwards delete all but the newest N snapshots and their unused objects')
+        parser.add_argument('--list', action='store_true', help='List the existing snapshots and exit')
+        parser.add_argument('--workers', type=int, default=BACKUP_WORKERS)
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for manifest in list_snapshots():
+                stats = manifest['stats']
+                self.stdout.write(f"{manifest['name']}  {stats['files']} file(s), {stats['bytes']} bytes, "
+                                  f"{stats['copied_bytes']} bytes copied")
+            return
+        if options['keep'] is not None and options['keep'] < 1:
+            raise CommandError('--keep must be at least 1')
+
+        try:
+            manifest = create_backup(workers=options['workers'])
+        except BackupError as e:
+            raise CommandError(str(e))
+
+        stats = manifest['stats']
+        database = manifest['database']
+        self.stdout.write(f"Snapshot {manifest['name']} in {backup_root()} ({manifest['seconds']:.1f}s)")
+        self.stdout.write(f"Database: {database['vendor']}, {database['size']} bytes")
+        self.stdout.write(f"Files: {stats['files']} ({stats['bytes']} bytes), {stats['hashed']} re-hashed, "
+                          f"{stats['copied']} new object(s), {stats['copied_bytes']} bytes copied")
+        if stats['vanished']:
+            self.stdout.write(f"Deleted while backing up: {stats['vanished']}")
+
+        if options['keep'] is not None:
+            report = prune_backups(options['keep'])
+            self.stdout.write(f"Pruned {len(report['snapshots_removed'])} snapshot(s), "
+                              f"{report['objects_removed']} object(s)")
+        self.stdout.write(self.style.SUCCESS('Backup complete'))
@@ -0,0 +1,39 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.anomalies import check_payroll_run
+from myapp.exports import LEDGER_COLUMNS
+from myapp.models import Payslip
+
+
+class Command(BaseCommand):
+    help = 'Flag payslips of a payroll run that break a rule or differ sharply from previous periods'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', help='Check the rows of this CSV (field names or ledger export headers)')
+        parser.add_argument('--pay-period', help='Check the saved payslips of this exact pay period')
+        parser.add_argument('--python', action='store_true', help='Use the pure Python engine even if numpy is installed')
+
+    def handle(self, *args, **options):
+        if options['csv']:
+            headers = {header: field for field, header in LEDGER_COLUMNS}
+            with open(options['csv'], newline='', encoding='utf-8-sig') as handle:
+                rows = [{headers.get(key, key): value for key, value in row.items()} for row in csv.DictReader(handle)]
+        elif options['pay_period']:
+            rows = list(Payslip.objects.filter(pay_period=options['pay_period']).values())
+        else:
+            raise CommandError('Give --csv or --pay-period')
+
+        try:
+            report = check_payroll_run(rows, use_numpy=False if options['python'] else None)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for row in report['flagged']:
+            self.stdout.write(f"{row['employee_id']} ({row['pay_period']}):")
+            for issue in row['issues']:
+                self.stdout.write(f"  {issue['message']}")
+        style = self.style.ERROR if report['flagged'] else self.style.SUCCESS
+        self.stdout.write(style(f"{len(report['flagged'])} of {report['checked']} payslip(s) flagged "
+                                f"({report['engine']}, {report['seconds'] * 1000:.0f} ms)"))
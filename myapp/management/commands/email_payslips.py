@@ -0,0 +1,65 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.distribution import DISTRIBUTION_BATCH_SIZE, DISTRIBUTION_WORKERS, distribute_payslips
+from myapp.purge import select_payslips
+
+
+class Command(BaseCommand):
+    help = 'Email payslips to their employees, recording a delivery status per payslip'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pay-period', help='Exact pay period, e.g. "1-Oct-2025 to 31-Oct-2025"')
+        parser.add_argument('--period-contains', help='Pay period fragment, e.g. "Oct-2025"')
+        parser.add_argument('--from', dest='date_from', help='First payment date to include (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last payment date to include (YYYY-MM-DD)')
+        parser.add_argument('--resend', action='store_true', help='Also send payslips that were already delivered')
+        parser.add_argument('--dry-run', action='store_true', help='Report who would be emailed without sending')
+        parser.add_argument('--batch-size', type=int, default=DISTRIBUTION_BATCH_SIZE,
+                            help='Emails sent over one connection')
+        parser.add_argument('--workers', type=int, default=DISTRIBUTION_WORKERS)
+        parser.add_argument('--max-rate', type=float, default=None,
+                            help='Emails per second across all workers (default PAYSLIP_EMAIL_RATE_LIMIT)')
+        parser.add_argument('--lock-file', help='Lock file to remove on exit (set by start_email_job)')
+
+    def handle(self, *args, **options):
+        try:
+            self.send(options)
+        finally:
+            if options['lock_file']:
+                Path(options['lock_file']).unlink(missing_ok=True)
+
+    def send(self, options):
+        filters = {
+            'pay_period': options['pay_period'],
+            'period_contains': options['period_contains'],
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+        }
+        if not any(filters.values()):
+            raise CommandError('Give --pay-period, --period-contains, --from or --to')
+
+        def progress(report):
+            self.stdout.write(f"  sent {report['sent']}, failed {report['failed']}, skipped {report['skipped']}")
+
+        report = distribute_payslips(
+            select_payslips(**filters),
+            resend=options['resend'],
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            max_rate=options['max_rate'],
+            progress=None if options['dry_run'] else progress,
+        )
+
+        if report['dry_run']:
+            self.stdout.write(
+                f"[dry run] would email {report['sent']} payslip(s); {report['skipped']} have no email address"
+            )
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {report['sent']}, failed {report['failed']}, skipped {report['skipped']} (no email address)"
+        ))
+        for error in report['errors']:
+            self.stderr.write(error)
@@ -0,0 +1,68 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.loadtest import LOADTEST_ITERATIONS, LOADTEST_USERS, run_load_test
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate concurrent superusers running the month-end payslip flow and report '
+        'per-endpoint throughput, latency percentiles and error rates. Without --url the '
+        'requests run in this process against the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='Superuser every simulated user logs in as')
+        parser.add_argument('--password', help='Its password (default: the LOADTEST_PASSWORD environment variable)')
+        parser.add_argument('--users', type=int, default=LOADTEST_USERS, help='Concurrent simulated users')
+        parser.add_argument('--iterations', type=int, default=LOADTEST_ITERATIONS,
+                            help='Payslips each user generates, saves and downloads')
+        parser.add_argument('--url', help='Base URL of a running server, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--keep', action='store_true', help='Keep the payslips the run created')
+
+    def handle(self, *args, **options):
+        password = options['password'] or os.environ.get('LOADTEST_PASSWORD')
+        if not password:
+            raise CommandError('Give --password or set LOADTEST_PASSWORD')
+        if options['users'] < 1 or options['iterations'] < 1:
+            raise CommandError('--users and --iterations must be at least 1')
+
+        target = options['url'] or 'in-process client'
+        self.stdout.write(
+            f"{options['users']} user(s) x {options['iterations']} iteration(s) against {target}"
+        )
+
+        result = run_load_test(
+            options['username'],
+            password,
+            users=options['users'],
+            iterations=options['iterations'],
+            base_url=options['url'],
+            cleanup=not options['keep'],
+        )
+
+        header = f"{'endpoint':<26}{'requests':>9}{'errors':>8}{'err %':>7}{'req/s':>8}" \
+                 f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in result['endpoints'] + [result['total']]:
+            self.stdout.write(
+                f"{row['endpoint']:<26}{row['requests']:>9}{row['errors']:>8}{row['error_rate'] * 100:>7.1f}"
+                f"{row['throughput']:>8.1f}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+                f"{row['max_ms']:>9.1f}"
+            )
+        self.stdout.write(f"Finished in {result['seconds']:.1f}s")
+
+        for endpoint, errors in result['error_samples'].items():
+            for error in errors:
+                self.stderr.write(f'{endpoint}: {error}')
+
+        if 'cleanup' in result:
+            cleanup = result['cleanup']
+            self.stdout.write(
+                f"Removed {cleanup['payslips']} payslip(s) and {cleanup['employees']} employee record(s) "
+                f"of \"{result['pay_period']}\""
+            )
+        else:
+            self.stdout.write(f"Kept the payslips of \"{result['pay_period']}\"")
@@ -0,0 +1,47 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from myapp.models import Payslip
+from myapp.packs import pack_period
+
+
+class Command(BaseCommand):
+    help = 'Pack the loose PDFs of closed pay periods into one append-only archive per period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pay-period', help='Pack this exact pay period')
+        parser.add_argument('--before', help='Pack every period whose last payment date is before YYYY-MM-DD')
+        parser.add_argument('--keep-loose', action='store_true', help='Leave the loose PDF files in place')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be packed')
+
+    def handle(self, *args, **options):
+        if options['pay_period']:
+            periods = [options['pay_period']]
+        elif options['before']:
+            periods = list(
+                Payslip.objects.filter(pack_file='')
+                .order_by()
+                .values('pay_period')
+                .annotate(last_payment=Max('payment_date'))
+                .filter(last_payment__lt=options['before'])
+                .values_list('pay_period', flat=True)
+            )
+        else:
+            raise CommandError('Give --pay-period or --before')
+
+        total = 0
+        for pay_period in periods:
+            try:
+                packed, missing = pack_period(
+                    pay_period,
+                    remove_loose=not options['keep_loose'],
+                    dry_run=options['dry_run'],
+                )
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+            total += packed
+            prefix = '[dry run] would pack' if options['dry_run'] else 'Packed'
+            self.stdout.write(f'{prefix} {packed} PDF(s) for {pay_period} ({missing} missing)')
+
+        self.stdout.write(self.style.SUCCESS(f'{total} PDF(s) across {len(periods)} period(s)'))
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.purge import (
+    PURGE_BATCH_SIZE, PURGE_WORKERS, select_payslips, purge_payslips, find_orphans, remove_orphans,
+)
+
+
+class Command(BaseCommand):
+    help = 'Bulk delete or archive payslips by pay period or payment date range, and clean up orphaned PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pay-period', help='Exact pay period, e.g. "1-Oct-2025 to 31-Oct-2025"')
+        parser.add_argument('--period-contains', help='Pay period fragment, e.g. "Oct-2025" or "2024"')
+        parser.add_argument('--from', dest='date_from', help='First payment date to include (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last payment date to include (YYYY-MM-DD)')
+        parser.add_argument('--archive', action='store_true',
+                            help='Move PDFs and a ledger.csv to PAYSLIP_ARCHIVE_ROOT instead of deleting them')
+        parser.add_argument('--orphans', action='store_true',
+                            help='Report files no payslip references and payslips whose file is missing')
+        parser.add_argument('--delete-orphans', action='store_true',
+                            help='With --orphans, also delete the unreferenced files')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would happen without changing anything')
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=PURGE_WORKERS)
+
+    def handle(self, *args, **options):
+        if options['orphans']:
+            self.handle_orphans(options)
+            return
+
+        filters = {
+            'pay_period': options['pay_period'],
+            'period_contains': options['period_contains'],
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+        }
+        if not any(filters.values()):
+            raise CommandError('Give --pay-period, --period-contains, --from or --to (or use --orphans)')
+
+        report = purge_payslips(
+            select_payslips(**filters),
+            archive=options['archive'],
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+        )
+
+        prefix = '[dry run] would ' if report['dry_run'] else ''
+        self.stdout.write(f"{prefix}{report['action']} {report['rows']} payslip(s)")
+        if not report['dry_run']:
+            self.stdout.write(f"Files removed: {report['files_removed']}, moved: {report['files_moved']}")
+        self.stdout.write(f"Files already missing: {report['files_missing']}")
+        if report['archive_path']:
+            self.stdout.write(f"Archive written to {report['archive_path']}")
+        for error in report['errors']:
+            self.stderr.write(error)
+
+    def handle_orphans(self, options):
+        orphan_files, missing_rows = find_orphans(batch_size=options['batch_size'])
+
+        self.stdout.write(f'Orphaned files: {len(orphan_files)}')
+        for name in orphan_files:
+            self.stdout.write(f'  {name}')
+        self.stdout.write(f'Payslips with a missing file: {len(missing_rows)}')
+        if missing_rows:
+            self.stdout.write('  ids: ' + ', '.join(str(payslip_id) for payslip_id in missing_rows))
+
+        if options['delete_orphans'] and orphan_files:
+            if options['dry_run']:
+                self.stdout.write(f'[dry run] would delete {len(orphan_files)} orphaned file(s)')
+                return
+            report = remove_orphans(orphan_files, workers=options['workers'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {report['files_removed']} orphaned file(s)"))
+            for error in report['errors']:
+                self.stderr.write(error)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp.summaries import rebuild_period_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-period payslip totals from the Payslip table'
+
+    def handle(self, *args, **options):
+        count = rebuild_period_summaries()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt summaries for {count} pay period(s)'))
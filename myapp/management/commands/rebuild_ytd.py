@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from myapp.ytd import rebuild_ytd
+
+
+class Command(BaseCommand):
+    help = 'Recompute year-to-date snapshots and running totals from the Payslip table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employee-id', action='append', dest='employee_ids',
+                            help='Only rebuild this employee (repeatable)')
+
+    def handle(self, *args, **options):
+        changed = rebuild_ytd(options['employee_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated year-to-date figures on {changed} payslip(s); '
+            'run rerender_payslips to refresh their PDFs'
+        ))
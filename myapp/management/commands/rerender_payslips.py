@@ -0,0 +1,44 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.pdf import LAYOUT_VERSION
+from myapp.rerender import RERENDER_BATCH_SIZE, rerender_stale, stale_payslips, load_checkpoint
+
+
+class Command(BaseCommand):
+    help = 'Re-render payslip PDFs whose layout_version is older than the current layout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Render processes (default: one per CPU)')
+        parser.add_argument('--batch-size', type=int, default=RERENDER_BATCH_SIZE)
+        parser.add_argument('--max-rate', type=float, default=None,
+                            help='Cap throughput at this many rows per second')
+        parser.add_argument('--checkpoint', default=os.path.join(settings.BASE_DIR, '.rerender_checkpoint.json'),
+                            help='Progress file used to resume an interrupted run')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the first row')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the stale payslips')
+
+    def handle(self, *args, **options):
+        after_id = 0 if options['restart'] else load_checkpoint(options['checkpoint'])
+        remaining = stale_payslips(after_id).count()
+        resume = f' (resuming after id {after_id})' if after_id else ''
+        self.stdout.write(f'{remaining} payslip(s) older than layout v{LAYOUT_VERSION}{resume}')
+        if options['dry_run'] or not remaining:
+            return
+
+        def progress(done, rate):
+            self.stdout.write(f'  {done}/{remaining} re-rendered, {rate:.1f} rows/s')
+
+        rows, seconds = rerender_stale(
+            options['checkpoint'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            max_rate=options['max_rate'],
+            restart=options['restart'],
+            progress=progress,
+        )
+        rate = rows / seconds if seconds else 0.0
+        self.stdout.write(self.style.SUCCESS(f'Re-rendered {rows} payslip(s) in {seconds:.1f}s ({rate:.1f} rows/s)'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.backup import BACKUP_WORKERS, BackupError, restore_snapshot, verify_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Verify a backup snapshot and restore the database and payslip PDFs from it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshot', nargs='?', default='latest', help='Snapshot name (default: latest)')
+        parser.add_argument('--target', help='Restore into this directory instead of over the live site')
+        parser.add_argument('--verify-only', action='store_true', help='Only check the snapshot is intact')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Do not ask before replacing the live database and files')
+        parser.add_argument('--workers', type=int, default=BACKUP_WORKERS)
+
+    def handle(self, *args, **options):
+        try:
+            if options['verify_only']:
+                self.handle_verify(options)
+                return
+
+            if not options['target'] and options['interactive']:
+                answer = input(f"This replaces the live database and payslip files with snapshot "
+                               f"{options['snapshot']}. Type 'yes' to continue: ")
+                if answer != 'yes':
+                    raise CommandError('Restore cancelled')
+
+            report = restore_snapshot(options['snapshot'], target=options['target'], workers=options['workers'])
+        except BackupError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Restored snapshot {report['name']}; database to {report['database']}")
+        self.stdout.write(f"Files restored: {report['restored']}, already identical: {report['unchanged']}")
+        for error in report['errors']:
+            self.stderr.write(error)
+        if report['errors']:
+            raise CommandError(f"{len(report['errors'])} file(s) did not verify after restoring")
+        self.stdout.write(self.style.SUCCESS('Restore verified'))
+
+    def handle_verify(self, options):
+        report = verify_snapshot(options['snapshot'], workers=options['workers'])
+        self.stdout.write(f"Snapshot {report['name']}: {report['files']} file(s) checked")
+        for problem in report['problems']:
+            self.stderr.write(problem)
+        if report['problems']:
+            raise CommandError(f"{len(report['problems'])} problem(s) found")
+        self.stdout.write(self.style.SUCCESS('Snapshot verified'))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payslip',
+            index=models.Index(fields=['employee_id', 'pay_period'], name='myapp_paysl_employe_361ce7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payslip',
+            index=models.Index(fields=['pay_period'], name='myapp_paysl_pay_per_d00ad0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payslip',
+            index=models.Index(fields=['payment_date'], name='myapp_paysl_payment_e6c92b_idx'),
+        ),
+    ]
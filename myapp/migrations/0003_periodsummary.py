@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:01
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_period_summaries(apps, schema_editor):
+    """Summarise the payslips that existed before PeriodSummary, as rebuild_period_summaries does"""
+    Payslip = apps.get_model('myapp', 'Payslip')
+    PeriodSummary = apps.get_model('myapp', 'PeriodSummary')
+    amount_fields = ['basic_salary', 'incentive', 'gross_earnings', 'income_tax', 'total_deduction', 'net_payable']
+
+    rows = (
+        Payslip.objects.order_by()
+        .values('pay_period')
+        .annotate(
+            headcount=Count('id'),
+            payment_date=Max('payment_date'),
+            **{field: Sum(field) for field in amount_fields}
+        )
+    )
+    PeriodSummary.objects.all().delete()
+    PeriodSummary.objects.bulk_create([PeriodSummary(**row) for row in rows], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0002_payslip_report_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pay_period', models.CharField(max_length=100, unique=True)),
+                ('headcount', models.IntegerField(default=0)),
+                ('basic_salary', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('incentive', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gross_earnings', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('income_tax', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_deduction', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('net_payable', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_date', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'period summaries',
+                'ordering': ['-payment_date', 'pay_period'],
+            },
+        ),
+        migrations.RunPython(backfill_period_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Index auth_user.email so EmailOrUsernameBackend resolves email logins without a table scan"""
+
+    dependencies = [
+        ('myapp', '0003_periodsummary'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS myapp_auth_user_email_idx ON auth_user (email);',
+            reverse_sql='DROP INDEX IF EXISTS myapp_auth_user_email_idx;',
+        ),
+    ]
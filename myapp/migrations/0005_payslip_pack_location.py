@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_auth_user_email_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payslip',
+            name='pack_file',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='pack_length',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='pack_offset',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:07
+
+import myapp.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_payslip_pack_location'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payslip',
+            name='pdf_file',
+            field=models.FileField(storage=myapp.storage.get_payslip_storage, upload_to='payslips/'),
+        ),
+    ]
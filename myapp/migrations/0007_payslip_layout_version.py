@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_payslip_pdf_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payslip',
+            name='layout_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum, Window
+
+
+def backfill_year_to_date(apps, schema_editor):
+    """
+    Fiscal year, YTD snapshots and running totals for existing payslips, as
+    ytd.rebuild_ytd computes them; otherwise new payslips would start their
+    year-to-date figures from zero.
+    """
+    Payslip = apps.get_model('myapp', 'Payslip')
+    EmployeeYearTotal = apps.get_model('myapp', 'EmployeeYearTotal')
+    ytd_fields = ['gross_earnings', 'income_tax', 'net_payable']
+    start_month = settings.FISCAL_YEAR_START_MONTH
+
+    missing = list(Payslip.objects.filter(fiscal_year__isnull=True).only('id', 'payment_date'))
+    for payslip in missing:
+        date = payslip.payment_date
+        payslip.fiscal_year = date.year if date.month >= start_month else date.year - 1
+    Payslip.objects.bulk_update(missing, ['fiscal_year'], batch_size=500)
+
+    amount_field = DecimalField(max_digits=14, decimal_places=2)
+    window = {'partition_by': [F('employee_id'), F('fiscal_year')], 'order_by': [F('payment_date'), F('id')]}
+    rows = Payslip.objects.order_by().annotate(
+        **{f'running_{field}': Window(Sum(field), output_field=amount_field, **window) for field in ytd_fields}
+    ).only('id', 'fiscal_year', 'layout_version', *[f'ytd_{field}' for field in ytd_fields])
+
+    changed = []
+    for payslip in rows.iterator(chunk_size=500):
+        for field in ytd_fields:
+            setattr(payslip, f'ytd_{field}', getattr(payslip, f'running_{field}'))
+        # The stored PDF has no (or wrong) YTD figures; rerender_payslips refreshes it
+        payslip.layout_version = 0
+        changed.append(payslip)
+    Payslip.objects.bulk_update(
+        changed, [f'ytd_{field}' for field in ytd_fields] + ['layout_version'], batch_size=500
+    )
+
+    grouped = (
+        Payslip.objects.order_by().values('employee_id', 'fiscal_year')
+        .annotate(payslip_count=Count('id'), **{field: Sum(field) for field in ytd_fields})
+    )
+    EmployeeYearTotal.objects.all().delete()
+    EmployeeYearTotal.objects.bulk_create([EmployeeYearTotal(**row) for row in grouped], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_payslip_layout_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeYearTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee_id', models.CharField(max_length=50)),
+                ('fiscal_year', models.IntegerField()),
+                ('payslip_count', models.IntegerField(default=0)),
+                ('gross_earnings', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('income_tax', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('net_payable', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-fiscal_year', 'employee_id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='fiscal_year',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='ytd_gross_earnings',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='ytd_income_tax',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='ytd_net_payable',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='payslip',
+            index=models.Index(fields=['employee_id', 'fiscal_year', 'payment_date'], name='myapp_paysl_employe_fd3aa1_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='employeeyeartotal',
+            constraint=models.UniqueConstraint(fields=('employee_id', 'fiscal_year'), name='unique_employee_fiscal_year'),
+        ),
+        migrations.RunPython(backfill_year_to_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_year_to_date_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Employee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee_id', models.CharField(max_length=50, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('basic_salary', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('default_incentive', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['employee_id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='employee_record',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payslips', to='myapp.employee'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def link_payslip_employees(apps, schema_editor):
+    """Create one Employee per employee ID from its latest payslip and link every row to it"""
+    Employee = apps.get_model('myapp', 'Employee')
+    Payslip = apps.get_model('myapp', 'Payslip')
+
+    latest = {}
+    rows = Payslip.objects.order_by('payment_date', 'id').values_list(
+        'employee_id', 'employee_name', 'basic_salary', 'incentive'
+    )
+    for employee_id, name, basic_salary, incentive in rows.iterator(chunk_size=2000):
+        latest[employee_id] = (name, basic_salary, incentive)
+
+    existing = set(Employee.objects.values_list('employee_id', flat=True))
+    Employee.objects.bulk_create([
+        Employee(employee_id=employee_id, name=name, basic_salary=basic_salary, default_incentive=incentive)
+        for employee_id, (name, basic_salary, incentive) in latest.items()
+        if employee_id not in existing
+    ], batch_size=500)
+
+    for employee in Employee.objects.filter(employee_id__in=list(latest)).only('id', 'employee_id'):
+        Payslip.objects.filter(employee_id=employee.employee_id, employee_record__isnull=True).update(
+            employee_record=employee.id
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_employee'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_payslip_employees, migrations.RunPython.noop),
+    ]
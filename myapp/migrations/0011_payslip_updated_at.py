@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_link_payslip_employees'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payslip',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
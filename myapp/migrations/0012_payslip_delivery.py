@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_payslip_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='email',
+            field=models.EmailField(blank=True, max_length=254),
+        ),
+        migrations.CreateModel(
+            name='PayslipDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('status', models.CharField(choices=[('sent', 'Sent'), ('failed', 'Failed'), ('skipped', 'Skipped')], max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('attempted_at', models.DateTimeField()),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('payslip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='delivery', to='myapp.payslip')),
+            ],
+            options={
+                'ordering': ['-attempted_at'],
+                'indexes': [models.Index(fields=['status'], name='myapp_paysl_status_db3e9e_idx')],
+            },
+        ),
+    ]
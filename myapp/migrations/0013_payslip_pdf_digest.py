@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_payslip_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payslip',
+            name='pdf_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='pdf_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,26 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from .storage import get_payslip_storage
+
+class Employee(models.Model):
+    """Standing pay details used to prefill the payslip form (see employees.py)"""
+    employee_id = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=100)
+    # Where payslips are emailed (see distribution.py)
+    email = models.EmailField(blank=True)
+    basic_salary = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    default_incentive = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['employee_id']
+
+    def __str__(self):
+        return f"{self.name} - {self.employee_id}"
+
+
 class Payslip(models.Model):
     employee_name = models.CharField(max_length=100)
     employee_id = models.CharField(max_length=50)
@@ -15,12 +35,116 @@ class Payslip(models.Model):
     total_deduction = models.DecimalField(max_digits=10, decimal_places=2)
     net_payable = models.DecimalField(max_digits=10, decimal_places=2)
     amount_in_words = models.TextField()
-    pdf_file = models.FileField(upload_to='payslips/')
+    # Master record; employee_name/employee_id above stay as printed on the payslip
+    employee_record = models.ForeignKey(
+        Employee, on_delete=models.SET_NULL, null=True, blank=True, related_name='payslips'
+    )
+    pdf_file = models.FileField(upload_to='payslips/', storage=get_payslip_storage)
+    # SHA-256 and size of the PDF as written, checked by the audit_payslips command
+    pdf_sha256 = models.CharField(max_length=64, blank=True, default='')
+    pdf_size = models.BigIntegerField(null=True, blank=True)
+    # Year-to-date figures as of this payslip (see ytd.py)
+    fiscal_year = models.IntegerField(null=True, blank=True)
+    ytd_gross_earnings = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    ytd_income_tax = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    ytd_net_payable = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    # pdf.LAYOUT_VERSION the stored PDF was rendered with (0 = needs re-rendering)
+    layout_version = models.PositiveIntegerField(default=1)
+    # Set once the PDF has been moved into a per-period pack (see packs.py)
+    pack_file = models.CharField(max_length=255, blank=True, default='')
+    pack_offset = models.BigIntegerField(null=True, blank=True)
+    pack_length = models.BigIntegerField(null=True, blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also set by the queryset updates in ytd.py; keys the cached HTML body (see fragments.py)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['employee_id', 'pay_period']),
+            models.Index(fields=['pay_period']),
+            models.Index(fields=['payment_date']),
+            models.Index(fields=['employee_id', 'fiscal_year', 'payment_date']),
+        ]
     
     def __str__(self):
         return f"{self.employee_name} - {self.employee_id} - {self.pay_period}"
+
+    @property
+    def is_packed(self):
+        return bool(self.pack_file)
+
+    @property
+    def fiscal_year_label(self):
+        from .ytd import fiscal_year_label
+        return fiscal_year_label(self.fiscal_year)
+
+
+class PeriodSummary(models.Model):
+    """Running totals per pay period, kept in step with Payslip writes (see summaries.py)"""
+    pay_period = models.CharField(max_length=100, unique=True)
+    headcount = models.IntegerField(default=0)
+    basic_salary = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    incentive = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gross_earnings = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    income_tax = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_deduction = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_payable = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-payment_date', 'pay_period']
+        verbose_name_plural = 'period summaries'
+
+    def __str__(self):
+        return f"{self.pay_period} - {self.headcount} payslips"
+
+
+class EmployeeYearTotal(models.Model):
+    """Running totals per employee and fiscal year, kept in step with Payslip writes (see ytd.py)"""
+    employee_id = models.CharField(max_length=50)
+    fiscal_year = models.IntegerField()
+    payslip_count = models.IntegerField(default=0)
+    gross_earnings = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    income_tax = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_payable = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-fiscal_year', 'employee_id']
+        constraints = [
+            models.UniqueConstraint(fields=['employee_id', 'fiscal_year'], name='unique_employee_fiscal_year'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} - FY {self.fiscal_year}"
+
+
+class PayslipDelivery(models.Model):
+    """Outcome of the latest attempt to email a payslip (see distribution.py)"""
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_CHOICES = [
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_SKIPPED, 'Skipped'),
+    ]
+
+    payslip = models.OneToOneField(Payslip, on_delete=models.CASCADE, related_name='delivery')
+    email = models.EmailField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    error = models.TextField(blank=True)
+    attempted_at = models.DateTimeField()
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-attempted_at']
+        indexes = [
+            models.Index(fields=['status']),
+        ]
+
+    def __str__(self):
+        return f"{self.payslip} - {self.status}"
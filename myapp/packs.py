@@ -0,0 +1,138 @@
+"""
+Per-period packing of payslip PDFs.
+
+A closed pay period's loose PDFs are appended to one uncompressed ZIP under
+``payslip_packs/`` in the payslip storage. Each Payslip row records the pack and the
+byte offset/length of its PDF data, so serving a single payslip is one seek
+and one bounded read - the archive is never unpacked. Packs are only ever
+appended to: adding members rewrites the central directory at the end of the
+file but never moves existing member data, so recorded offsets stay valid.
+The result is still a normal ZIP that any tool can open.
+"""
+import os
+import posixpath
+import struct
+import zipfile
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.text import slugify
+
+from .cache import bump_data_version_on_commit
+from .models import Payslip
+from .storage import (
+    get_payslip_storage, is_local_storage, open_pdf, delete_pdf, pdf_exists, mark_pdf_exists,
+)
+
+
+PACK_DIR = 'payslip_packs'
+
+# Local file header: signature, version, flags, method, time, date, crc,
+# compressed size, size, name length, extra length
+_LOCAL_HEADER = struct.Struct('<4sHHHHHLLLHH')
+
+
+def pack_name_for_period(pay_period):
+    return f'{PACK_DIR}/{slugify(pay_period) or "unknown"}.zip'
+
+
+def _data_offset(handle, info):
+    """Byte offset of a member's data, read from its local file header"""
+    handle.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(handle.read(_LOCAL_HEADER.size))
+    name_length, extra_length = header[9], header[10]
+    return info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+
+def pack_period(pay_period, remove_loose=True, dry_run=False):
+    """
+    Append every loose PDF of ``pay_period`` to the period's pack.
+
+    Returns ``(packed, missing)`` counts. Rows are updated in one transaction
+    after the pack has been written and closed; loose files are removed only
+    after that commit. The pack is built in place, so the payslip storage
+    must be a local filesystem one.
+    """
+    storage = get_payslip_storage()
+    if not is_local_storage(storage):
+        raise ImproperlyConfigured('Packing needs a payslip storage with local file paths')
+
+    payslips = list(
+        Payslip.objects.filter(pay_period=pay_period, pack_file='').only('id', 'pdf_file')
+    )
+    loose = []
+    missing = 0
+    for payslip in payslips:
+        if payslip.pdf_file and storage.exists(payslip.pdf_file.name):
+            loose.append(payslip)
+        else:
+            missing += 1
+
+    if dry_run or not loose:
+        return len(loose), missing
+
+    pack_name = pack_name_for_period(pay_period)
+    pack_path = storage.path(pack_name)
+    os.makedirs(os.path.dirname(pack_path), exist_ok=True)
+
+    members = {}
+    with zipfile.ZipFile(pack_path, mode='a', compression=zipfile.ZIP_STORED) as archive:
+        existing = set(archive.namelist())
+        for payslip in loose:
+            # Prefix with the id so two rows can never share a member name
+            member = f'{payslip.id}_{posixpath.basename(payslip.pdf_file.name)}'
+            if member not in existing:
+                with open_pdf(payslip.pdf_file.name) as source:
+                    archive.writestr(member, source.read())
+            members[payslip.id] = member
+
+    with zipfile.ZipFile(pack_path) as archive, open(pack_path, 'rb') as handle:
+        locations = {}
+        for payslip_id, member in members.items():
+            info = archive.getinfo(member)
+            locations[payslip_id] = (_data_offset(handle, info), info.file_size)
+
+    with transaction.atomic():
+        for payslip in loose:
+            payslip.pack_file = pack_name
+            payslip.pack_offset, payslip.pack_length = locations[payslip.id]
+        Payslip.objects.bulk_update(loose, ['pack_file', 'pack_offset', 'pack_length'])
+        bump_data_version_on_commit()
+    mark_pdf_exists(pack_name)
+
+    if remove_loose:
+        for payslip in loose:
+            try:
+                delete_pdf(payslip.pdf_file.name)
+            except OSError:
+                pass
+
+    return len(loose), missing
+
+
+def read_packed_pdf(payslip):
+    """Return a packed payslip's PDF bytes with one seek and one bounded read"""
+    with open_pdf(payslip.pack_file) as handle:
+        handle.seek(payslip.pack_offset)
+        return handle.read(payslip.pack_length)
+
+
+def payslip_pdf_available(payslip):
+    if payslip.is_packed:
+        return pdf_exists(payslip.pack_file)
+    return bool(payslip.pdf_file) and pdf_exists(payslip.pdf_file.name)
+
+
+def remove_unreferenced_packs(pack_names):
+    """Delete packs that no remaining row points into; returns the names removed"""
+    referenced = set(
+        Payslip.objects.filter(pack_file__in=pack_names).values_list('pack_file', flat=True).distinct()
+    )
+    removed = []
+    for pack_name in set(pack_names) - referenced:
+        try:
+            delete_pdf(pack_name)
+            removed.append(pack_name)
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,510 @@
+"""
+Payslip PDF rendering.
+
+This module has no dependency on the request cycle: it only needs a payslip
+context (the same dict the views build) and somewhere to write the bytes.
+Bulk jobs, exports, tests and benchmarks can import it directly instead of
+going through ``views.py`` or ``MEDIA_ROOT``. The page content comes from
+``layout.PAYSLIP_LAYOUT``, compiled once per process into section builders.
+
+    from myapp.pdf import render_payslip, render_payslip_bytes
+
+    render_payslip(context, open('out.pdf', 'wb'))      # any binary stream
+    render_payslip([ctx1, ctx2, ctx3], buffer)          # one page per context
+    pdf_bytes = render_payslip_bytes(context)           # convenience wrapper
+"""
+import io
+import os
+from collections.abc import Mapping
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import (
+    SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image,
+    PageTemplate, Frame, PageBreak,
+)
+
+from .layout import (
+    PAYSLIP_LAYOUT, COMPANY_NAME, COMPANY_ADDRESS_LINES, COMPANY_LOGO, CURRENCY_SYMBOL,
+    amount_table_height,
+)
+
+
+# Bump whenever layout.py or the styling here changes; stored on each
+# Payslip so the rerender_payslips command can refresh older PDFs
+LAYOUT_VERSION = 2
+
+# Keys every payslip context provides (all are Payslip field names)
+CONTEXT_FIELDS = [
+    'employee_name',
+    'employee_id',
+    'pay_period',
+    'paid_days',
+    'loss_of_pay_days',
+    'payment_date',
+    'basic_salary',
+    'incentive',
+    'gross_earnings',
+    'income_tax',
+    'total_deduction',
+    'net_payable',
+    'amount_in_words',
+]
+
+# Year-to-date keys; the YTD section is only drawn when these are present
+YTD_CONTEXT_FIELDS = [
+    'fiscal_year_label',
+    'ytd_gross_earnings',
+    'ytd_income_tax',
+    'ytd_net_payable',
+]
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+FONT_DIR = os.path.join(APP_DIR, 'static', 'fonts')
+LOGO_PATH = os.path.join(APP_DIR, 'static', *COMPANY_LOGO.split('/'))
+
+# Colours matching the HTML preview
+PRIMARY_COLOR = colors.HexColor('#5b4d9e')
+HEADER_BG_COLOR = colors.HexColor('#e8f5e9')
+BORDER_COLOR = colors.HexColor('#d0d0d0')
+NET_PAYABLE_BG_COLOR = colors.HexColor('#f9fdf7')
+NET_PAYABLE_BORDER_COLOR = colors.HexColor('#e0e0d0')
+MUTED_TEXT_COLOR = colors.HexColor('#666666')
+
+# Page geometry (A4 with a bordered frame)
+PAGE_SIZE = A4
+PAGE_MARGINS = {'leftMargin': 40, 'rightMargin': 10, 'topMargin': 40, 'bottomMargin': 40}
+FRAME_RECT = (20, 20, 555, 782)  # x, y, width, height
+FRAME_PADDING = 30
+LOGO_SIZE = 70
+
+RUPEE = CURRENCY_SYMBOL
+
+
+def _register_fonts():
+    """Register DejaVu Sans for Unicode support (rupee symbol) and return the font name to use"""
+    try:
+        font_path = os.path.join(FONT_DIR, 'DejaVuSans.ttf')
+        bold_font_path = os.path.join(FONT_DIR, 'DejaVuSans-Bold.ttf')
+        if os.path.exists(font_path):
+            pdfmetrics.registerFont(TTFont('DejaVuSans', font_path))
+            if os.path.exists(bold_font_path):
+                pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', bold_font_path))
+                return 'DejaVuSans-Bold'
+            return 'DejaVuSans'
+        # Fallback to Helvetica if DejaVu not available
+        return 'Helvetica-Bold'
+    except Exception:
+        # Ultimate fallback
+        return 'Helvetica-Bold'
+
+
+FONT_NAME = _register_fonts()
+
+
+@lru_cache(maxsize=None)
+def _styles():
+    """Paragraph styles are immutable once built, so build them once per process"""
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            textColor=PRIMARY_COLOR,
+            spaceAfter=10,
+            alignment=TA_LEFT
+        ),
+        'normal': ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontSize=10,
+            spaceAfter=5
+        ),
+        'employee_details': ParagraphStyle(
+            'EmployeeDetails',
+            parent=styles['Normal'],
+            fontSize=10,
+            leading=20,
+            spaceAfter=5,
+        ),
+        'net_payable_title': ParagraphStyle(
+            'NetPayableTitle',
+            parent=styles['Normal'],
+            fontSize=13,
+            fontName=FONT_NAME,
+            textColor=colors.black,
+            leading=16,
+        ),
+        'net_payable_subtitle': ParagraphStyle(
+            'NetPayableSubtitle',
+            parent=styles['Normal'],
+            fontSize=9,
+            fontName='Helvetica',
+            textColor=MUTED_TEXT_COLOR,
+            leading=12
+        ),
+        'amount_words': ParagraphStyle(
+            'AmountWords',
+            parent=styles['Normal'],
+            fontSize=9,
+            alignment=TA_CENTER,
+            spaceAfter=15
+        ),
+        'signature_title': ParagraphStyle(
+            'SignatureTitle',
+            parent=styles['Normal'],
+            fontSize=10,
+            alignment=TA_CENTER,
+            textColor=PRIMARY_COLOR,
+            spaceAfter=25
+        ),
+    }
+
+
+def _amount_table_style():
+    """Shared style for the side-by-side amount tables (header, body rows, total)"""
+    return TableStyle([
+        # Header row styling
+        ('BACKGROUND', (0, 0), (-1, 0), HEADER_BG_COLOR),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('FONTNAME', (0, 0), (-1, 0), FONT_NAME),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+
+        # Body rows styling - use FONT_NAME for rupee symbol support
+        ('BACKGROUND', (0, 1), (-1, -2), colors.white),
+        ('TEXTCOLOR', (0, 1), (-1, -2), colors.black),
+        ('FONTNAME', (0, 1), (-1, -2), FONT_NAME),
+        ('FONTSIZE', (0, 1), (-1, -2), 9),
+        ('ALIGN', (0, 1), (0, -2), 'LEFT'),
+        ('ALIGN', (1, 1), (1, -2), 'RIGHT'),
+
+        # Footer row styling (Gross Earnings / Total Deduction)
+        ('BACKGROUND', (0, -1), (-1, -1), PRIMARY_COLOR),
+        ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
+        ('FONTNAME', (0, -1), (-1, -1), FONT_NAME),
+        ('FONTSIZE', (0, -1), (-1, -1), 10),
+        ('ALIGN', (0, -1), (0, -1), 'LEFT'),
+        ('ALIGN', (1, -1), (1, -1), 'RIGHT'),
+
+        # Padding
+        ('TOPPADDING', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+        ('LEFTPADDING', (0, 0), (-1, -1), 12),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+
+        # Borders
+        ('BOX', (0, 0), (-1, -1), 1, BORDER_COLOR),
+        ('LINEBELOW', (0, 0), (-1, 0), 1, BORDER_COLOR),
+        ('LINEABOVE', (0, -1), (-1, -1), 1, BORDER_COLOR),
+        ('ROUNDEDCORNERS', [8, 8, 8, 8])
+    ])
+
+
+def _money(value):
+    return f'{RUPEE} {value}'
+
+
+def context_from_payslip(payslip):
+    """Build a render context from a saved Payslip (or any object with the same attributes)"""
+    return {field: getattr(payslip, field) for field in CONTEXT_FIELDS + YTD_CONTEXT_FIELDS}
+
+
+# Each _*_section() reads its part of PAYSLIP_LAYOUT once and returns a
+# builder that turns a context into that section's flowables
+
+def _header_section():
+    """Two-column header: Company info (left) + Employee Statement (right)"""
+    styles = _styles()
+    statement = PAYSLIP_LAYOUT['statement']
+    statement_title = f'<b>{statement["title"]}</b>'
+    fields = statement['fields']
+    company_title = f'<b>{COMPANY_NAME},</b>'
+    has_logo = os.path.exists(LOGO_PATH)
+
+    def build(context):
+        company_info = []
+        if has_logo:
+            logo = Image(LOGO_PATH, width=LOGO_SIZE, height=LOGO_SIZE)
+            logo.hAlign = 'LEFT'
+            company_info.append(logo)
+            company_info.append(Spacer(1, 6))
+
+        company_info.append(Paragraph(company_title, styles['title']))
+        for line in COMPANY_ADDRESS_LINES:
+            company_info.append(Paragraph(line, styles['normal']))
+
+        employee_text = '<br/>'.join(f'<b>{label}:</b> {context[key]}' for label, key in fields)
+        employee_info = [
+            Spacer(1, 15),
+            Paragraph(statement_title, styles['title']),
+            Paragraph(employee_text, styles['employee_details']),
+        ]
+
+        header_table = Table(
+            [[company_info, employee_info]],
+            colWidths=[250, 250]
+        )
+        header_table.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+        ]))
+        return [header_table, Spacer(1, 25)]
+
+    return build
+
+
+def _amount_tables_section():
+    """Earnings and Deductions tables (side-by-side)"""
+    tables = PAYSLIP_LAYOUT['amount_tables']
+    height = amount_table_height()
+    table_style = _amount_table_style()
+    col_widths = [240]
+    for _ in tables[1:]:
+        col_widths += [20, 240]
+
+    def build(context):
+        cells = []
+        for table in tables:
+            data = [[table['title'], 'Amount']]
+            data += [[label, _money(context[key])] for label, key in table['rows']]
+            data += [['', '']] * (height - len(table['rows']))
+            total_label, total_key = table['total']
+            data.append([total_label, _money(context[total_key])])
+
+            amount_table = Table(data, colWidths=[140, 100])
+            amount_table.setStyle(table_style)
+            if cells:
+                cells.append(Spacer(1, 20))
+            cells.append(amount_table)
+
+        combined_table = Table([cells], colWidths=col_widths)
+        combined_table.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ]))
+        return [combined_table, Spacer(1, 30)]
+
+    return build
+
+
+def _net_payable_section():
+    """Net Payable: title + subtitle on the left, amount on the right"""
+    styles = _styles()
+    net_payable = PAYSLIP_LAYOUT['net_payable']
+
+    def build(context):
+        left_cell = Table([
+            [Paragraph(net_payable['title'], styles['net_payable_title'])],
+            [Paragraph(net_payable['subtitle'], styles['net_payable_subtitle'])],
+        ], colWidths=[200])
+        left_cell.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+        ]))
+
+        net_payable_table = Table([[left_cell, _money(context[net_payable['key']])]], colWidths=[370, 130])
+        net_payable_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), NET_PAYABLE_BG_COLOR),
+            ('BACKGROUND', (1, 0), (1, 0), PRIMARY_COLOR),
+            ('TEXTCOLOR', (0, 0), (0, 0), colors.black),
+            ('TEXTCOLOR', (1, 0), (1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 0), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (1, 0), (1, 0), FONT_NAME),
+            ('FONTSIZE', (1, 0), (1, 0), 16),
+            ('TOPPADDING', (0, 0), (-1, -1), 15),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
+            ('LEFTPADDING', (0, 0), (0, 0), 15),
+            ('RIGHTPADDING', (1, 0), (1, 0), 20),
+            ('BOX', (0, 0), (-1, -1), 1, NET_PAYABLE_BORDER_COLOR),
+            ('ROUNDEDCORNERS', [8, 8, 8, 8])
+        ]))
+        return [net_payable_table, Spacer(1, 10)]
+
+    return build
+
+
+def _year_to_date_section():
+    """Year-to-date strip below the net payable box (skipped without YTD figures)"""
+    ytd = PAYSLIP_LAYOUT['year_to_date']
+    rows = ytd['rows']
+    value_width = 330 / len(rows)
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), HEADER_BG_COLOR),
+        ('SPAN', (0, 0), (0, 1)),
+        ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('FONTSIZE', (1, 1), (-1, 1), 10),
+        ('TEXTCOLOR', (0, 0), (0, 0), PRIMARY_COLOR),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 12),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+        ('BOX', (0, 0), (-1, -1), 1, BORDER_COLOR),
+        ('LINEBELOW', (1, 0), (-1, 0), 1, BORDER_COLOR),
+        ('ROUNDEDCORNERS', [8, 8, 8, 8])
+    ])
+
+    def build(context):
+        if context.get(rows[0][1]) is None:
+            return []
+        title = ytd['title']
+        if context.get(ytd['label_key']):
+            title = f'{title} (FY {context[ytd["label_key"]]})'
+        ytd_table = Table([
+            [title] + [label for label, _ in rows],
+            [''] + [_money(context[key]) for _, key in rows],
+        ], colWidths=[170] + [value_width] * len(rows))
+        ytd_table.setStyle(table_style)
+        return [ytd_table, Spacer(1, 10)]
+
+    return build
+
+
+def _amount_in_words_section():
+    styles = _styles()
+    words = PAYSLIP_LAYOUT['amount_in_words']
+
+    def build(context):
+        return [
+            Paragraph(f'<b>{words["label"]}:</b> {context[words["key"]]}', styles['amount_words']),
+            Spacer(1, 20),
+        ]
+
+    return build
+
+
+def _signatures_section():
+    styles = _styles()
+    signatures = PAYSLIP_LAYOUT['signatures']
+    title = f'<b>{signatures["title"]}</b>'
+    parties = signatures['parties']
+    signature_style = TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 1), (-1, 1), FONT_NAME),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('FONTSIZE', (0, 1), (-1, 1), 9),
+        ('FONTSIZE', (0, 2), (-1, 2), 8),
+        ('TEXTCOLOR', (0, 2), (-1, 2), PRIMARY_COLOR),
+        ('TOPPADDING', (0, 0), (-1, -1), 5),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+    ])
+
+    def build(context):
+        signature_data = [
+            ['_' * 25 for _ in parties],
+            [context[key] if key else name for key, name, _ in parties],
+            [role for _, _, role in parties],
+        ]
+        signature_table = Table(signature_data, colWidths=[240] * len(parties))
+        signature_table.setStyle(signature_style)
+        return [Paragraph(title, styles['signature_title']), signature_table]
+
+    return build
+
+
+@lru_cache(maxsize=None)
+def compile_layout():
+    """Compile PAYSLIP_LAYOUT into section builders, once per process"""
+    return (
+        _header_section(),
+        _amount_tables_section(),
+        _net_payable_section(),
+        _year_to_date_section(),
+        _amount_in_words_section(),
+        _signatures_section(),
+    )
+
+
+def build_payslip_story(context):
+    """Return the list of flowables for one payslip page"""
+    elements = []
+    for build_section in compile_layout():
+        elements.extend(build_section(context))
+    return elements
+
+
+def _page_template():
+    """Single-frame page template; showBoundary draws the page border"""
+    x, y, width, height = FRAME_RECT
+    main_frame = Frame(
+        x, y, width, height,
+        leftPadding=FRAME_PADDING,
+        bottomPadding=FRAME_PADDING,
+        rightPadding=FRAME_PADDING,
+        topPadding=FRAME_PADDING,
+        showBoundary=1,
+        id='main_frame'
+    )
+    return PageTemplate(id='payslip_template', frames=[main_frame])
+
+
+def render_payslip(contexts, stream):
+    """
+    Render one or more payslips into ``stream``.
+
+    ``contexts`` is a single payslip context dict, or an iterable of them; each
+    payslip gets its own page in the same document. ``stream`` is a filesystem
+    path or any object with a binary ``write`` method (an open file, a
+    ``BytesIO`` or ``socket.makefile('wb')``). The stream is not closed.
+    """
+    if isinstance(contexts, Mapping):
+        contexts = [contexts]
+
+    elements = []
+    for context in contexts:
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(build_payslip_story(context))
+
+    doc = SimpleDocTemplate(stream, pagesize=PAGE_SIZE, encoding='utf-8', **PAGE_MARGINS)
+    doc.addPageTemplates([_page_template()])
+    doc.build(elements)
+    return stream
+
+
+def render_payslip_into(buffer, contexts):
+    """
+    Render into a caller-owned ``BytesIO``, reusing it across calls.
+
+    The buffer is rewound and truncated first, so a bulk job can keep one
+    buffer per worker. Returns the number of bytes written.
+    """
+    buffer.seek(0)
+    buffer.truncate()
+    render_payslip(contexts, buffer)
+    return buffer.tell()
+
+
+def render_payslip_bytes(contexts):
+    """Render one or more payslips and return the PDF as bytes"""
+    buffer = io.BytesIO()
+    render_payslip(contexts, buffer)
+    return buffer.getvalue()
+
+
+def generate_payslip_pdf(filepath, context):
+    """Generate PDF payslip at ``filepath`` - matching HTML preview design"""
+    render_payslip(context, filepath)
@@ -0,0 +1,272 @@
+"""
+On-demand request profiling for superusers.
+
+Add ``?_profile=1`` to a URL (or send an ``X-Profile: 1`` header) while
+logged in as a superuser and ``ProfilerMiddleware`` profiles that one
+request: a sampling profiler records the request thread's stack every
+``PAYSLIP_PROFILE_INTERVAL`` seconds, and ``tracemalloc`` records memory
+allocated meanwhile. Each profile is written to ``PAYSLIP_PROFILE_ROOT`` as
+
+- ``<name>.collapsed``: collapsed stacks (``flamegraph.pl``, speedscope,
+  inferno all read these),
+- ``<name>.speedscope.json``: the same samples for https://www.speedscope.app,
+- ``<name>.json``: request, timings, peak memory and top allocation sites,
+
+and listed on the ``profiles/`` page. Every other request only pays for a
+dictionary lookup; with ``PAYSLIP_PROFILING`` off the middleware removes
+itself at startup.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+from django.utils.text import slugify
+
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_KINDS = {
+    'collapsed': ('.collapsed', 'text/plain'),
+    'speedscope': ('.speedscope.json', 'application/json'),
+    'meta': ('.json', 'application/json'),
+}
+# Frames kept per allocation traceback and allocation sites reported
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 15
+
+# tracemalloc is process-wide, so only one request is profiled at a time
+_profiling = threading.Lock()
+
+
+def profile_root():
+    return Path(settings.PAYSLIP_PROFILE_ROOT)
+
+
+def _frame_name(code):
+    # ';' separates frames in the collapsed format
+    return f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'.replace(';', ',')
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a background thread"""
+
+    def __init__(self, thread_id, interval, skip):
+        self.thread_id = thread_id
+        self.interval = interval
+        # Outer frames (the server and middleware above the profiler) to drop
+        self.skip = skip
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='payslip-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            stack = stack[self.skip:]
+            if stack:
+                self.stacks[';'.join(stack)] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _stack_depth():
+    depth = 0
+    frame = sys._getframe(1)
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+def _speedscope(name, stacks, interval, wall_ms):
+    frames = []
+    index = {}
+    samples = []
+    weights = []
+    for stack, count in stacks.most_common():
+        sample = []
+        for frame in stack.split(';'):
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({'name': frame})
+            sample.append(index[frame])
+        samples.append(sample)
+        weights.append(count * interval * 1000)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'payslip-profiler',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': max(wall_ms, sum(weights)),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
+
+
+def _top_allocations(snapshot, baseline):
+    ignore = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        # The sampler's own stacks
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ]
+    if baseline is not None:
+        stats = snapshot.filter_traces(ignore).compare_to(baseline.filter_traces(ignore), 'lineno')
+        stats = [stat for stat in stats if stat.size_diff > 0]
+        stats.sort(key=lambda stat: stat.size_diff, reverse=True)
+        return [
+            {'site': str(stat.traceback), 'size': stat.size_diff, 'count': stat.count_diff}
+            for stat in stats[:TOP_ALLOCATIONS]
+        ]
+    stats = snapshot.filter_traces(ignore).statistics('lineno')
+    return [{'site': str(stat.traceback), 'size': stat.size, 'count': stat.count} for stat in stats[:TOP_ALLOCATIONS]]
+
+
+def write_profile(request, response, sampler, memory, wall_ms, cpu_ms):
+    """Write the three files of one profile; returns its name"""
+    root = profile_root()
+    root.mkdir(parents=True, exist_ok=True)
+    started = timezone.localtime()
+    name = f"{started:%Y%m%d-%H%M%S}-{started.microsecond:06d}-{slugify(request.path) or 'root'}"[:120]
+
+    collapsed = ''.join(f'{stack} {count}\n' for stack, count in sampler.stacks.most_common())
+    (root / f'{name}.collapsed').write_text(collapsed, encoding='utf-8')
+    with open(root / f'{name}.speedscope.json', 'w', encoding='utf-8') as handle:
+        json.dump(_speedscope(f'{request.method} {request.path}', sampler.stacks, sampler.interval, wall_ms), handle)
+
+    meta = {
+        'name': name,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'user': request.user.get_username(),
+        'status': response.status_code,
+        'started': started.isoformat(),
+        'wall_ms': round(wall_ms, 2),
+        'cpu_ms': round(cpu_ms, 2),
+        'samples': sampler.samples,
+        'interval_ms': sampler.interval * 1000,
+        **memory,
+    }
+    with open(root / f'{name}.json', 'w', encoding='utf-8') as handle:
+        json.dump(meta, handle, indent=2)
+
+    _prune(root)
+    return name
+
+
+def _meta_files(root):
+    """Metadata files under ``root``, newest first"""
+    metas = [path for path in root.glob('*.json') if not path.name.endswith('.speedscope.json')]
+    return sorted(metas, key=os.path.getmtime, reverse=True)
+
+
+def _prune(root):
+    """Keep only the newest ``PAYSLIP_PROFILE_KEEP`` profiles"""
+    metas = _meta_files(root)
+    for meta in metas[settings.PAYSLIP_PROFILE_KEEP:]:
+        name = meta.name[:-len('.json')]
+        for suffix, _ in PROFILE_KINDS.values():
+            (root / f'{name}{suffix}').unlink(missing_ok=True)
+
+
+def recent_profiles(limit=None):
+    """Metadata of stored profiles, newest first"""
+    root = profile_root()
+    if not root.is_dir():
+        return []
+    profiles = []
+    for path in _meta_files(root)[:limit]:
+        try:
+            profiles.append(json.loads(path.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            # Pruned or half-written by a concurrent request
+            continue
+    return profiles
+
+
+def profile_path(name, kind):
+    """Path of one file of a stored profile, or None for unknown names/kinds"""
+    if kind not in PROFILE_KINDS or not name or Path(name).name != name:
+        return None
+    path = profile_root() / f'{name}{PROFILE_KINDS[kind][0]}'
+    return path if path.is_file() else None
+
+
+class ProfilerMiddleware:
+    """Profiles requests that ask for it; must come after AuthenticationMiddleware"""
+
+    def __init__(self, get_response):
+        if not settings.PAYSLIP_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PROFILE_PARAM not in request.GET and PROFILE_HEADER not in request.META:
+            return self.get_response(request)
+        if not request.user.is_superuser or not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request)
+        finally:
+            _profiling.release()
+
+    def _profile(self, request):
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        baseline = tracemalloc.take_snapshot() if tracing else None
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+
+        sampler = StackSampler(threading.get_ident(), settings.PAYSLIP_PROFILE_INTERVAL, _stack_depth())
+        sampler.start()
+        wall_started = time.perf_counter()
+        cpu_started = time.thread_time()
+        try:
+            response = self.get_response(request)
+        finally:
+            cpu_ms = (time.thread_time() - cpu_started) * 1000
+            wall_ms = (time.perf_counter() - wall_started) * 1000
+            sampler.stop()
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if not tracing:
+                tracemalloc.stop()
+
+        memory = {
+            'allocated_bytes': current - before,
+            'peak_bytes': peak - before,
+            'top_allocations': _top_allocations(snapshot, baseline),
+        }
+        name = write_profile(request, response, sampler, memory, wall_ms, cpu_ms)
+        response['X-Profile'] = name
+        return response
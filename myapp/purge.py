@@ -0,0 +1,213 @@
+"""
+Bulk delete / archive of payslips and clean-up of the PDF directory.
+
+Rows are deleted in batches, each in its own transaction together with the
+matching PeriodSummary update. PDF files are only touched after a batch has
+committed, and are removed from the payslip storage (or moved into a local
+archive directory) by a thread pool since the work is pure I/O.
+"""
+import csv
+import os
+import posixpath
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+
+from .exports import LEDGER_COLUMNS
+from .models import Payslip
+from .packs import PACK_DIR
+from .storage import PAYSLIP_UPLOAD_DIR, get_payslip_storage, open_pdf, delete_pdf, pdf_exists
+from .summaries import remove_payslips
+from .ytd import rebuild_ytd
+
+
+PURGE_BATCH_SIZE = 500
+PURGE_WORKERS = 8
+PAYSLIP_DIR = PAYSLIP_UPLOAD_DIR
+
+
+def select_payslips(pay_period=None, period_contains=None, date_from=None, date_to=None):
+    """Payslips matching the purge filters (payment date range is inclusive)"""
+    queryset = Payslip.objects.all()
+    if pay_period:
+        queryset = queryset.filter(pay_period=pay_period)
+    if period_contains:
+        queryset = queryset.filter(pay_period__icontains=period_contains)
+    if date_from:
+        queryset = queryset.filter(payment_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(payment_date__lte=date_to)
+    return queryset.order_by('id')
+
+
+def _new_report(action, dry_run):
+    return {
+        'action': action,
+        'dry_run': dry_run,
+        'rows': 0,
+        'files_removed': 0,
+        'files_moved': 0,
+        'files_missing': 0,
+        'errors': [],
+        'archive_path': None,
+    }
+
+
+def _remove_file(name):
+    try:
+        if not get_payslip_storage().exists(name):
+            return 'missing', name, None
+        delete_pdf(name)
+        return 'removed', name, None
+    except OSError as e:
+        return 'error', name, str(e)
+
+
+def _move_file(name, archive_dir):
+    target = os.path.join(archive_dir, name)
+    try:
+        if not get_payslip_storage().exists(name):
+            return 'missing', name, None
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open_pdf(name) as source, open(target, 'wb') as destination:
+            shutil.copyfileobj(source, destination)
+        delete_pdf(name)
+        return 'moved', name, None
+    except OSError as e:
+        return 'error', name, str(e)
+
+
+def _process_files(pool, names, archive_dir, report):
+    if archive_dir:
+        results = pool.map(lambda name: _move_file(name, archive_dir), names)
+    else:
+        results = pool.map(_remove_file, names)
+
+    for status, name, error in results:
+        if status == 'removed':
+            report['files_removed'] += 1
+        elif status == 'moved':
+            report['files_moved'] += 1
+        elif status == 'missing':
+            report['files_missing'] += 1
+        else:
+            report['errors'].append(f'{name}: {error}')
+
+
+def purge_payslips(queryset, archive=False, dry_run=False, batch_size=PURGE_BATCH_SIZE, workers=PURGE_WORKERS):
+    """
+    Delete every payslip in ``queryset`` and remove its PDF.
+
+    With ``archive=True`` the PDFs are moved under
+    ``PAYSLIP_ARCHIVE_ROOT/<timestamp>/`` together with a ``ledger.csv`` of the
+    deleted rows instead of being removed. With ``dry_run=True`` nothing is
+    changed and the report only counts what would be affected.
+    """
+    report = _new_report('archive' if archive else 'delete', dry_run)
+
+    if dry_run:
+        report['rows'] = queryset.count()
+        for name, pack_file in queryset.values_list('pdf_file', 'pack_file').iterator(chunk_size=batch_size):
+            name = pack_file or name
+            if name and not pdf_exists(name):
+                report['files_missing'] += 1
+        return report
+
+    archive_dir = None
+    ledger_file = None
+    ledger = None
+    if archive:
+        archive_dir = os.path.join(settings.PAYSLIP_ARCHIVE_ROOT, datetime.now().strftime('%Y%m%d_%H%M%S'))
+        os.makedirs(archive_dir, exist_ok=True)
+        report['archive_path'] = archive_dir
+        ledger_file = open(os.path.join(archive_dir, 'ledger.csv'), 'w', newline='', encoding='utf-8')
+        ledger = csv.writer(ledger_file)
+        ledger.writerow([header for _, header in LEDGER_COLUMNS])
+
+    ledger_fields = [field for field, _ in LEDGER_COLUMNS]
+    ids = list(queryset.values_list('id', flat=True))
+    packs = set()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, len(ids), batch_size):
+                batch_ids = ids[start:start + batch_size]
+                with transaction.atomic():
+                    batch = list(Payslip.objects.select_for_update().filter(id__in=batch_ids))
+                    if ledger:
+                        ledger.writerows(
+                            Payslip.objects.filter(id__in=batch_ids).order_by('id').values_list(*ledger_fields)
+                        )
+                    remove_payslips(batch)
+                    Payslip.objects.filter(id__in=batch_ids).delete()
+                    # One window query per batch re-derives the remaining rows' YTD figures
+                    rebuild_ytd({payslip.employee_id for payslip in batch})
+
+                report['rows'] += len(batch)
+                # Files are only touched once the rows are gone for good
+                names = [payslip.pdf_file.name for payslip in batch if payslip.pdf_file and not payslip.is_packed]
+                _process_files(pool, names, archive_dir, report)
+                packs.update(payslip.pack_file for payslip in batch if payslip.is_packed)
+
+            # A period pack goes once no remaining row points into it
+            referenced = set(
+                Payslip.objects.filter(pack_file__in=packs).values_list('pack_file', flat=True).distinct()
+            )
+            _process_files(pool, sorted(packs - referenced), archive_dir, report)
+    finally:
+        if ledger_file:
+            ledger_file.close()
+
+    return report
+
+
+def _walk(storage, top):
+    """Yield every file name below ``top`` in the storage"""
+    try:
+        directories, files = storage.listdir(top)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    for name in files:
+        yield posixpath.join(top, name)
+    for directory in directories:
+        yield from _walk(storage, posixpath.join(top, directory))
+
+
+def find_orphans(batch_size=PURGE_BATCH_SIZE):
+    """
+    Compare the payslip storage with the database.
+
+    Returns ``(orphan_files, missing_rows)``: file names under ``payslips/``
+    and ``payslip_packs/`` that no row references, and ids of rows whose file
+    (or pack) is not stored. One listing of the storage replaces an
+    existence check per row.
+    """
+    storage = get_payslip_storage()
+    stored = set(_walk(storage, PAYSLIP_DIR)) | set(_walk(storage, PACK_DIR))
+
+    referenced = set()
+    missing_rows = []
+    rows = Payslip.objects.order_by('id').values_list('id', 'pdf_file', 'pack_file').iterator(chunk_size=batch_size)
+    for payslip_id, name, pack_file in rows:
+        # Packed PDFs are not expected as loose files
+        name = pack_file or name
+        referenced.add(name)
+        if name in stored:
+            continue
+        # Names outside the listed directories need their own check
+        if name.startswith((f'{PAYSLIP_DIR}/', f'{PACK_DIR}/')) or not storage.exists(name):
+            missing_rows.append(payslip_id)
+
+    orphan_files = sorted(stored - referenced)
+    return orphan_files, missing_rows
+
+
+def remove_orphans(orphan_files, workers=PURGE_WORKERS):
+    """Delete unreferenced files found by ``find_orphans``; returns a report"""
+    report = _new_report('remove_orphans', False)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        _process_files(pool, orphan_files, None, report)
+    return report
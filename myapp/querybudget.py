@@ -0,0 +1,135 @@
+"""
+Query counts, database time and query budgets per view.
+
+``QueryBudgetMiddleware`` wraps every request in a database execute wrapper
+that counts queries and their time. Queries slower than
+``PAYSLIP_SLOW_QUERY_MS`` are logged with their SQL on the ``myapp.queries``
+logger, and so is any view that runs more queries than its budget.
+
+A view declares its budget with the ``query_budget`` decorator; the budget
+is the most queries one request may run, whatever the size of the tables, so
+an N+1 loop or a per-row lookup breaks it as soon as a test has more than a
+handful of rows. Counts cover the whole request, including the session and
+user lookups of the middleware after this one; queries run while a streaming
+response is consumed are not counted.
+
+With ``PAYSLIP_QUERY_BUDGET_ENFORCE`` on (tests), exceeding the budget
+raises ``QueryBudgetExceeded`` instead of logging;
+``QueryBudgetTestMixin.assertWithinQueryBudget`` checks a test client
+response explicitly.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('myapp.queries')
+
+# Queries kept per request for budget failure reports
+MAX_RECORDED_QUERIES = 100
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """Declare the most database queries one request to the view may run"""
+    def decorator(view_func):
+        # Outer decorators built with functools.wraps (login_required,
+        # idempotent) copy the attribute onto their wrapper
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class QueryStats:
+    """Database work of one request, recorded by ``QueryBudgetMiddleware``"""
+
+    def __init__(self, slow_ms):
+        self.slow_ms = slow_ms
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = []
+        self.slow = []
+        self.view = None
+        self.budget = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.queries) < MAX_RECORDED_QUERIES:
+                self.queries.append((sql, elapsed))
+            if elapsed * 1000 >= self.slow_ms:
+                self.slow.append((sql, params, elapsed))
+
+    @property
+    def milliseconds(self):
+        return self.seconds * 1000
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def describe(self):
+        lines = [f'{self.view}: {self.count} queries (budget {self.budget}), {self.milliseconds:.1f} ms']
+        lines += [f'  {elapsed * 1000:7.1f} ms  {sql}' for sql, elapsed in self.queries]
+        if self.count > len(self.queries):
+            lines.append(f'  ... {self.count - len(self.queries)} more')
+        return '\n'.join(lines)
+
+
+class QueryBudgetMiddleware:
+    """Counts queries per request, logs slow ones and checks the view's budget"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats(settings.PAYSLIP_SLOW_QUERY_MS)
+        request.query_stats = stats
+        wrappers = [connections[alias].execute_wrapper(stats) for alias in connections]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+
+        for sql, params, elapsed in stats.slow:
+            logger.warning('Slow query (%.1f ms) in %s %s: %s; params=%r',
+                           elapsed * 1000, request.method, request.path, sql, params)
+
+        if stats.over_budget:
+            if settings.PAYSLIP_QUERY_BUDGET_ENFORCE:
+                raise QueryBudgetExceeded(stats.describe())
+            logger.warning('Query budget exceeded: %s', stats.describe())
+
+        if settings.DEBUG:
+            response['Server-Timing'] = f'db;dur={stats.milliseconds:.1f};desc="{stats.count} queries"'
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = request.query_stats
+        stats.view = getattr(view_func, '__name__', repr(view_func))
+        stats.budget = getattr(view_func, 'query_budget', None)
+
+
+class QueryBudgetTestMixin:
+    """For ``TestCase`` classes: assert a test client response stayed within its view's budget"""
+
+    def assertWithinQueryBudget(self, response, max_queries=None):
+        stats = response.wsgi_request.query_stats
+        budget = stats.budget if max_queries is None else max_queries
+        if budget is None:
+            self.fail(f'{stats.view} declares no query budget')
+        if stats.count > budget:
+            self.fail(f'Query budget exceeded\n{stats.describe()}')
@@ -0,0 +1,135 @@
+"""
+Payroll analytics computed in the database.
+
+All totals are produced with ``aggregate``/``annotate`` over the Payslip
+DecimalFields, so only one row per group leaves the database. Results are
+cached against the payslip data version and are therefore dropped as soon
+as a payslip is saved or deleted.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Sum, Max, DecimalField, Value
+from django.db.models.functions import Coalesce
+
+from .cache import versioned_key
+from .models import Payslip, PeriodSummary
+
+
+AMOUNT_FIELDS = [
+    'basic_salary',
+    'incentive',
+    'gross_earnings',
+    'income_tax',
+    'total_deduction',
+    'net_payable',
+]
+
+REPORT_CACHE_TIMEOUT = 60 * 60
+
+
+def _amount_sums():
+    """Sum() expressions for every amount field, zero instead of NULL on empty groups"""
+    return {
+        field: Coalesce(
+            Sum(field),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+        for field in AMOUNT_FIELDS
+    }
+
+
+def filter_payslips(queryset=None, year=None, employee_id=None, pay_period=None):
+    """Apply the report filters shared by the view and the JSON API"""
+    if queryset is None:
+        queryset = Payslip.objects.all()
+    if year:
+        queryset = queryset.filter(payment_date__year=year)
+    if employee_id:
+        queryset = queryset.filter(employee_id=employee_id)
+    if pay_period:
+        queryset = queryset.filter(pay_period=pay_period)
+    return queryset
+
+
+def overall_totals(queryset):
+    """Grand totals and headcount for the whole queryset"""
+    return queryset.aggregate(
+        payslip_count=Count('id'),
+        employee_count=Count('employee_id', distinct=True),
+        **_amount_sums()
+    )
+
+
+def period_totals(queryset):
+    """One row per pay period, most recent payment date first"""
+    return list(
+        queryset.order_by()
+        .values('pay_period')
+        .annotate(
+            headcount=Count('id'),
+            payment_date=Max('payment_date'),
+            **_amount_sums()
+        )
+        .order_by('-payment_date', 'pay_period')
+    )
+
+
+def summary_period_totals():
+    """Unfiltered per-period totals, read straight from the PeriodSummary table"""
+    return list(
+        PeriodSummary.objects.values('pay_period', 'headcount', 'payment_date', *AMOUNT_FIELDS)
+    )
+
+
+def employee_totals(queryset):
+    """One row per employee across every period in the queryset"""
+    return list(
+        queryset.order_by()
+        .values('employee_id')
+        .annotate(
+            employee_name=Max('employee_name'),
+            periods=Count('id'),
+            last_payment_date=Max('payment_date'),
+            **_amount_sums()
+        )
+        .order_by('employee_id')
+    )
+
+
+def employee_trend(queryset, employee_id):
+    """Period-by-period figures for a single employee"""
+    return list(
+        queryset.filter(employee_id=employee_id)
+        .order_by()
+        .values('pay_period')
+        .annotate(
+            payment_date=Max('payment_date'),
+            **_amount_sums()
+        )
+        .order_by('payment_date', 'pay_period')
+    )
+
+
+def payroll_summary(year=None, employee_id=None, pay_period=None):
+    """
+    Build (or fetch from cache) the full report for the given filters.
+
+    The cache key carries the payslip data version, so there is nothing to
+    delete on writes - the next request after a save simply misses.
+    """
+    key = versioned_key('payroll_report', year or '', employee_id or '', pay_period or '')
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    queryset = filter_payslips(year=year, employee_id=employee_id, pay_period=pay_period)
+    summary = {
+        'totals': overall_totals(queryset),
+        'periods': summary_period_totals() if not (year or employee_id or pay_period) else period_totals(queryset),
+        'employees': employee_totals(queryset),
+        'trend': employee_trend(queryset, employee_id) if employee_id else [],
+    }
+    cache.set(key, summary, REPORT_CACHE_TIMEOUT)
+    return summary
@@ -0,0 +1,131 @@
+"""
+Bulk re-render of payslip PDFs rendered with an older ``pdf.LAYOUT_VERSION``.
+
+Rendering is CPU-bound ReportLab work, so it runs in a process pool; the
+parent process does all database and storage I/O. Progress is checkpointed
+to a small JSON file after every committed batch so an interrupted run
+resumes after the last finished row; a run that finishes removes it, so rows
+queued later (``layout_version = 0`` after an edit) are picked up again.
+An optional rows-per-second cap keeps the job from starving live traffic.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from .cache import bump_data_version_on_commit
+from .models import Payslip
+from .integrity import pdf_digest
+from .packs import remove_unreferenced_packs
+from .pdf import LAYOUT_VERSION, context_from_payslip, render_payslip_bytes
+from .storage import save_pdf, delete_pdf
+
+
+RERENDER_BATCH_SIZE = 50
+
+
+def load_checkpoint(path):
+    """Last finished payslip id for the current layout version (0 if none)"""
+    try:
+        with open(path) as handle:
+            checkpoint = json.load(handle)
+    except (OSError, ValueError):
+        return 0
+    if checkpoint.get('layout_version') != LAYOUT_VERSION:
+        return 0
+    return checkpoint.get('last_id', 0)
+
+
+def save_checkpoint(path, last_id, done):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump({'layout_version': LAYOUT_VERSION, 'last_id': last_id, 'done': done}, handle)
+    # Atomic replace so a crash never leaves a half-written checkpoint
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def stale_payslips(after_id=0):
+    return Payslip.objects.filter(layout_version__lt=LAYOUT_VERSION, id__gt=after_id).order_by('id')
+
+
+def _store_batch(payslips, rendered):
+    """Save the new PDFs, point the rows at them, then drop the old files"""
+    old_files = []
+    old_packs = []
+    for payslip, pdf_bytes in zip(payslips, rendered):
+        filename = f'payslip_{payslip.employee_id}_{payslip.id}_v{LAYOUT_VERSION}.pdf'
+        new_name = save_pdf(filename, ContentFile(pdf_bytes, name=filename))
+        if payslip.is_packed:
+            old_packs.append(payslip.pack_file)
+        elif payslip.pdf_file:
+            old_files.append(payslip.pdf_file.name)
+        payslip.pdf_file = new_name
+        payslip.pdf_sha256, payslip.pdf_size = pdf_digest(pdf_bytes)
+        payslip.layout_version = LAYOUT_VERSION
+        payslip.pack_file = ''
+        payslip.pack_offset = None
+        payslip.pack_length = None
+
+    with transaction.atomic():
+        Payslip.objects.bulk_update(
+            payslips, ['pdf_file', 'pdf_sha256', 'pdf_size', 'layout_version', 'pack_file', 'pack_offset', 'pack_length']
+        )
+        bump_data_version_on_commit()
+
+    for name in old_files:
+        try:
+            delete_pdf(name)
+        except OSError:
+            pass
+    if old_packs:
+        remove_unreferenced_packs(old_packs)
+
+
+def rerender_stale(checkpoint_path, workers=None, batch_size=RERENDER_BATCH_SIZE, max_rate=None,
+                   restart=False, progress=None):
+    """
+    Re-render every stale payslip; returns ``(rows, seconds)``.
+
+    ``max_rate`` caps throughput in rows per second. ``progress`` is called
+    after each batch with ``(rows_done, rows_per_second)``.
+    """
+    last_id = 0 if restart else load_checkpoint(checkpoint_path)
+    done = 0
+    started = time.monotonic()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            payslips = list(stale_payslips(last_id)[:batch_size])
+            if not payslips:
+                break
+
+            contexts = [context_from_payslip(payslip) for payslip in payslips]
+            rendered = list(pool.map(render_payslip_bytes, contexts))
+            _store_batch(payslips, rendered)
+
+            last_id = payslips[-1].id
+            done += len(payslips)
+            save_checkpoint(checkpoint_path, last_id, done)
+
+            elapsed = time.monotonic() - started
+            if max_rate:
+                # Sleep off any lead over the allowed rate
+                ahead = done / max_rate - elapsed
+                if ahead > 0:
+                    time.sleep(ahead)
+                    elapsed += ahead
+            if progress:
+                progress(done, done / elapsed if elapsed else 0.0)
+
+    clear_checkpoint(checkpoint_path)
+    return done, time.monotonic() - started
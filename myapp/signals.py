@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_data_version_on_commit
+from .models import Payslip, Employee
+
+
+@receiver(post_save, sender=Payslip)
+@receiver(post_delete, sender=Payslip)
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def invalidate_payslip_caches(sender, **kwargs):
+    """Bump the data version once the write is committed"""
+    bump_data_version_on_commit()
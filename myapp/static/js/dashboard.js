@@ -0,0 +1,305 @@
+// Modern month/year selector functionality
+document.addEventListener('DOMContentLoaded', function() {
+    const monthSelect = document.getElementById('payslipMonth');
+    const yearInput = document.getElementById('payslipYear');
+    const grossEarnings = document.getElementById('grossEarnings');
+    const totalDeduction = document.getElementById('totalDeduction');
+    const netPayableAmount = document.getElementById('netPayableAmount');
+
+    // Initialize calculations and amount in words
+    calculateTotals();
+    updateMonthDisplay();
+
+    // Auto-calculate totals
+    function calculateTotals() {
+        const basic = parseFloat(document.querySelector('.editable-income').value) || 0;
+        const incentive = parseFloat(document.querySelectorAll('.editable-income')[1].value) || 0;
+        const incomeTax = parseFloat(document.querySelector('.editable-deduction').value) || 0;
+
+        const grossTotal = basic + incentive;
+        const deductionTotal = incomeTax;
+        const netTotal = grossTotal - deductionTotal;
+
+        grossEarnings.value = grossTotal || '';
+        totalDeduction.value = deductionTotal || '';
+        netPayableAmount.textContent = netTotal || '0';
+
+        // Update amount in words
+        updateAmountInWords();
+    }
+
+    function updateMonthDisplay() {
+        const selectedMonth = monthSelect.options[monthSelect.selectedIndex].text;
+        const selectedYear = yearInput.value;
+
+        // Update the pay period field based on selected month/year
+        const payPeriodField = document.querySelector('.editable-field[placeholder*="Auto-filled from month selection"]');
+        if (payPeriodField) {
+            const monthNames = [
+                'January', 'February', 'March', 'April', 'May', 'June',
+                'July', 'August', 'September', 'October', 'November', 'December'
+            ];
+
+            const monthIndex = parseInt(monthSelect.value) - 1;
+            const monthName = monthNames[monthIndex];
+
+            // Calculate pay period (1-Oct-2025 to 30-Oct-2025 format)
+            const year = parseInt(selectedYear);
+            const lastDay = new Date(year, monthIndex + 1, 0).getDate();
+
+            // Use short month names
+            const shortMonthNames = [
+                'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'
+            ];
+
+            const shortMonthName = shortMonthNames[monthIndex];
+            payPeriodField.value = `1-${shortMonthName}-${year} to ${lastDay}-${shortMonthName}-${year}`;
+        }
+
+        // Recalculate totals after month change
+        calculateTotals();
+    }
+
+    // Add event listeners
+    monthSelect.addEventListener('change', updateMonthDisplay);
+    yearInput.addEventListener('input', updateMonthDisplay);
+
+    // Add listeners for income/deduction changes
+    const incomeFields = document.querySelectorAll('.editable-income, .editable-deduction');
+    incomeFields.forEach(field => {
+        field.addEventListener('input', calculateTotals);
+    });
+
+    // Number to words conversion function
+    function numberToWords(num) {
+        if (num === 0) return "Zero";
+
+        const ones = ["", "One", "Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine"];
+        const teens = ["Ten", "Eleven", "Twelve", "Thirteen", "Fourteen", "Fifteen", "Sixteen", "Seventeen", "Eighteen", "Nineteen"];
+        const tens = ["", "", "Twenty", "Thirty", "Forty", "Fifty", "Sixty", "Seventy", "Eighty", "Ninety"];
+        const thousands = ["", "Thousand", "Lakh", "Crore"];
+
+        function convertHundreds(n) {
+            let result = "";
+            if (n >= 100) {
+                result += ones[Math.floor(n / 100)] + " Hundred ";
+                n %= 100;
+            }
+            if (n >= 20) {
+                result += tens[Math.floor(n / 10)] + " ";
+                n %= 10;
+            }
+            if (n >= 10) {
+                result += teens[n - 10] + " ";
+                n = 0;
+            }
+            if (n > 0) {
+                result += ones[n] + " ";
+            }
+            return result.trim();
+        }
+
+        function convertToWords(n) {
+            if (n === 0) return "Zero";
+
+            let result = "";
+            let place = 0;
+
+            while (n > 0) {
+                const hundreds = n % 1000;
+                if (hundreds > 0) {
+                    const hundredWords = convertHundreds(hundreds);
+                    if (place > 0) {
+                        result = hundredWords + " " + thousands[place] + " " + result;
+                    } else {
+                        result = hundredWords + result;
+                    }
+                }
+                n = Math.floor(n / 1000);
+                place++;
+            }
+
+            return result.trim();
+        }
+
+        // Handle paise (cents)
+        const rupees = Math.floor(num);
+        const paise = Math.round((num - rupees) * 100);
+
+        let words = "";
+        if (rupees > 0) {
+            words = convertToWords(rupees) + " Rupee";
+            if (rupees > 1) words += "s";
+        }
+
+        if (paise > 0) {
+            if (words) words += " and ";
+            words += convertToWords(paise) + " Paisa";
+            if (paise > 1) words += "s";
+        }
+
+        return words || "Zero";
+    }
+
+    // Update amount in words
+    function updateAmountInWords() {
+        const netAmount = parseFloat(netPayableAmount.textContent.replace(/,/g, '')) || 0;
+        const amountInWordsElement = document.getElementById('amountInWords');
+
+        if (netAmount > 0) {
+            const words = numberToWords(netAmount);
+            amountInWordsElement.textContent = `Indian Rupee ${words} Only`;
+        } else {
+            amountInWordsElement.textContent = "Indian Rupee Zero Only";
+        }
+    }
+
+    // Prefill from the employee master: one cached request on load,
+    // then picking an employee ID fills in the standing pay details
+    const employeeIdInput = document.getElementById('employeeIdInput');
+    const employeeOptions = document.getElementById('employeeOptions');
+    const employeesById = {};
+
+    fetch(document.body.dataset.prefillUrl)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) return;
+            data.employees.forEach(employee => {
+                employeesById[employee.employee_id] = employee;
+                const option = document.createElement('option');
+                option.value = employee.employee_id;
+                option.label = employee.name;
+                employeeOptions.appendChild(option);
+            });
+        })
+        .catch(error => console.error('Error loading employees:', error));
+
+    employeeIdInput.addEventListener('change', function() {
+        const employee = employeesById[this.value.trim()];
+        if (!employee) return;
+
+        const incomeFields = document.querySelectorAll('.editable-income');
+        document.querySelectorAll('.editable-field')[0].value = employee.name;
+        incomeFields[0].value = employee.basic_salary;
+        incomeFields[1].value = employee.default_incentive;
+        calculateTotals();
+    });
+
+    // Add form validation
+    function validateForm() {
+        const requiredFields = document.querySelectorAll('input[required], select[required]');
+        let isValid = true;
+
+        requiredFields.forEach(field => {
+            if (!field.value.trim()) {
+                field.classList.add('is-invalid');
+                isValid = false;
+            } else {
+                field.classList.remove('is-invalid');
+                field.classList.add('is-valid');
+            }
+        });
+
+        return isValid;
+    }
+
+    // Add form submission handler
+    const generateButton = document.querySelector('.btn-generate-payslip');
+    if (generateButton) {
+        generateButton.addEventListener('click', function(e) {
+            e.preventDefault();
+            generatePayslip();
+        });
+    }
+
+    // Global function for payslip generation
+    window.generatePayslip = function() {
+        if (validateForm()) {
+            // Collect form data
+            const editableFields = document.querySelectorAll('.editable-field');
+            const formData = new FormData();
+            formData.append('employee_name', editableFields[0].value);
+            formData.append('paid_days', editableFields[1].value);
+            formData.append('employee_id', editableFields[2].value);
+            formData.append('loss_of_pay_days', editableFields[3].value);
+            formData.append('pay_period', editableFields[4].value);
+            formData.append('payment_date', editableFields[5].value);
+
+            // Get income/deduction values and ensure they're valid numbers
+            const incomeFields = document.querySelectorAll('.editable-income');
+            const basicSalary = parseFloat(incomeFields[0].value) || 0;
+            const incentive = parseFloat(incomeFields[1].value) || 0;
+            const grossEarnings = basicSalary + incentive;
+
+            const deductionFields = document.querySelectorAll('.editable-deduction');
+            const incomeTax = parseFloat(deductionFields[0].value) || 0;
+            const totalDeduction = incomeTax;
+            const netPayable = grossEarnings - totalDeduction;
+
+            formData.append('basic_salary', basicSalary.toString());
+            formData.append('incentive', incentive.toString());
+            formData.append('gross_earnings', grossEarnings.toString());
+            formData.append('income_tax', incomeTax.toString());
+            formData.append('total_deduction', totalDeduction.toString());
+            formData.append('net_payable', netPayable.toString());
+            formData.append('amount_in_words', document.getElementById('amountInWords').textContent);
+
+            // Get CSRF token
+            const csrftoken = document.querySelector('[name=csrfmiddlewaretoken]')?.value || 
+                             getCookie('csrftoken');
+
+            // Show loading state
+            generateButton.disabled = true;
+            generateButton.textContent = 'Generating...';
+
+            // Submit via AJAX
+            fetch(document.body.dataset.generateUrl, {
+                method: 'POST',
+                body: formData,
+                headers: {
+                    'X-CSRFToken': csrftoken
+                }
+            })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    // Redirect to preview page
+                    window.location.href = data.redirect_url;
+                } else {
+                    // Show error message for duplicate payslip or other errors
+                    alert('Error: ' + data.message);
+                    // Re-enable the generate button
+                    generateButton.disabled = false;
+                    generateButton.textContent = 'Generate Payslip';
+                }
+            })
+            .catch(error => {
+                alert('Error generating payslip. Please try again.');
+                console.error('Error:', error);
+            })
+            .finally(() => {
+                generateButton.disabled = false;
+                generateButton.textContent = 'Generate Payslip';
+            });
+        } else {
+            alert('Please fill in all required fields correctly.');
+        }
+    }
+
+    // Helper function to get CSRF token from cookies
+    function getCookie(name) {
+        let cookieValue = null;
+        if (document.cookie && document.cookie !== '') {
+            const cookies = document.cookie.split(';');
+            for (let i = 0; i < cookies.length; i++) {
+                const cookie = cookies[i].trim();
+                if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                    cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                    break;
+                }
+            }
+        }
+        return cookieValue;
+    }
+});
@@ -0,0 +1,15 @@
+function togglePasswordVisibility() {
+    const passwordInput = document.getElementById('password');
+    const toggleButton = document.querySelector('.password-toggle');
+    const toggleIcon = document.querySelector('.password-toggle-icon');
+
+    if (passwordInput.type === 'password') {
+        passwordInput.type = 'text';
+        // Change icon to eye-slash (hidden)
+        toggleIcon.innerHTML = '<path d="M12 7c2.76 0 5 2.24 5 5 0 .65-.13 1.26-.36 1.83l3.26 3.26c.51-.8.8-1.69.8-2.59C20.5 9.91 16.09 5.5 12 5.5c-1.09 0-2.16.24-3.11.65l2.43 2.43C11.74 8.26 12 8.5 12 7zm-6.38-.96l2.12 2.12C6.22 9.07 5.5 10.1 5.5 12c0 4.41 4.41 8.5 8.5 8.5 1.39 0 2.73-.33 3.92-.85l2.12 2.12 1.41-1.41L3.51 2.22l-1.41 1.41L6.38 8.04zm2.21 2.21l1.12 1.12c-.22.53-.34 1.1-.34 1.63 0 2.21 1.79 4 4 4 .53 0 1.1-.12 1.63-.34l1.12 1.12c-.64.28-1.32.43-2.02.43-2.76 0-5-2.24-5-5 0-.7.15-1.38.43-2.02z" fill="currentColor"/>';
+    } else {
+        passwordInput.type = 'password';
+        // Change icon to eye (visible)
+        toggleIcon.innerHTML = '<path d="M12 4.5C7 4.5 2.73 7.61 1 12c1.73 4.39 6 7.5 11 7.5s9.27-3.11 11-7.5c-1.73-4.39-6-7.5-11-7.5zM12 17c-2.76 0-5-2.24-5-5s2.24-5 5-5 5 2.24 5 5-2.24 5-5 5zm0-8c-1.66 0-3 1.34-3 3s1.34 3 3 3 3-1.34 3-3-1.34-3-3-3z" fill="currentColor"/>';
+    }
+}
@@ -0,0 +1,101 @@
+function printPayslip() {
+    const elementsToHide = [
+        'header', '.header', 'nav', '.navbar',
+        '.action-buttons', '.page-title'
+    ];
+
+    const originalStyles = new Map();
+
+    elementsToHide.forEach(selector => {
+        const elements = document.querySelectorAll(selector);
+        elements.forEach(el => {
+            originalStyles.set(el, {
+                display: el.style.display,
+                visibility: el.style.visibility,
+                height: el.style.height,
+                margin: el.style.margin,
+                padding: el.style.padding,
+                overflow: el.style.overflow
+            });
+
+            el.style.display = 'none';
+            el.style.visibility = 'hidden';
+            el.style.height = '0';
+            el.style.margin = '0';
+            el.style.padding = '0';
+            el.style.overflow = 'hidden';
+        });
+    });
+
+    const bodyOriginalBg = document.body.style.backgroundColor;
+    const bodyOriginalMargin = document.body.style.margin;
+    const bodyOriginalPadding = document.body.style.padding;
+
+    document.body.style.backgroundColor = 'white';
+    document.body.style.margin = '0';
+    document.body.style.padding = '0';
+
+    window.print();
+
+    setTimeout(() => {
+        elementsToHide.forEach(selector => {
+            const elements = document.querySelectorAll(selector);
+            elements.forEach(el => {
+                const original = originalStyles.get(el);
+                if (original) {
+                    el.style.display = original.display;
+                    el.style.visibility = original.visibility;
+                    el.style.height = original.height;
+                    el.style.margin = original.margin;
+                    el.style.padding = original.padding;
+                    el.style.overflow = original.overflow;
+                }
+            });
+        });
+
+        document.body.style.backgroundColor = bodyOriginalBg;
+        document.body.style.margin = bodyOriginalMargin;
+        document.body.style.padding = bodyOriginalPadding;
+
+        originalStyles.clear();
+    }, 50);
+}
+
+function downloadPDF() {
+    // Only set when the stored PDF exists
+    const pdfUrl = document.body.dataset.pdfUrl;
+    const filename = document.body.dataset.pdfFilename;
+    if (!pdfUrl) {
+        alert('PDF file not available. Please regenerate the payslip.');
+        return;
+    }
+
+    // Download the existing PDF file using fetch and blob
+    fetch(pdfUrl)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+            return response.blob();
+        })
+        .then(blob => {
+            // Create blob URL and download
+            const url = window.URL.createObjectURL(blob);
+            const a = document.createElement('a');
+            a.style.display = 'none';
+            a.href = url;
+            a.download = filename;
+            document.body.appendChild(a);
+            a.click();
+            window.URL.revokeObjectURL(url);
+            document.body.removeChild(a);
+        })
+        .catch(error => {
+            console.error('Download failed:', error);
+            // Fallback to direct link
+            const link = document.createElement('a');
+            link.href = pdfUrl;
+            link.download = filename;
+            link.click();
+        });
+}
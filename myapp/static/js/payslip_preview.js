@@ -0,0 +1,200 @@
+function printPayslip() {
+    // Store original styles before hiding
+    const elementsToHide = [
+        'header', '.header', 'nav', '.navbar',
+        '.action-buttons', '.page-title'
+    ];
+
+    const originalStyles = new Map();
+
+    // Hide elements and store original styles
+    elementsToHide.forEach(selector => {
+        const elements = document.querySelectorAll(selector);
+        elements.forEach(el => {
+            originalStyles.set(el, {
+                display: el.style.display,
+                visibility: el.style.visibility,
+                height: el.style.height,
+                margin: el.style.margin,
+                padding: el.style.padding,
+                overflow: el.style.overflow
+            });
+
+            el.style.display = 'none';
+            el.style.visibility = 'hidden';
+            el.style.height = '0';
+            el.style.margin = '0';
+            el.style.padding = '0';
+            el.style.overflow = 'hidden';
+        });
+    });
+
+    // Temporarily modify body background
+    const bodyOriginalBg = document.body.style.backgroundColor;
+    const bodyOriginalMargin = document.body.style.margin;
+    const bodyOriginalPadding = document.body.style.padding;
+
+    document.body.style.backgroundColor = 'white';
+    document.body.style.margin = '0';
+    document.body.style.padding = '0';
+
+    // Print only the payslip content
+    window.print();
+
+    // Restore all styles immediately after print dialog opens
+    // Use a shorter timeout to ensure restoration happens quickly
+    setTimeout(() => {
+        // Restore all hidden elements
+        elementsToHide.forEach(selector => {
+            const elements = document.querySelectorAll(selector);
+            elements.forEach(el => {
+                const original = originalStyles.get(el);
+                if (original) {
+                    el.style.display = original.display;
+                    el.style.visibility = original.visibility;
+                    el.style.height = original.height;
+                    el.style.margin = original.margin;
+                    el.style.padding = original.padding;
+                    el.style.overflow = original.overflow;
+                }
+            });
+        });
+
+        // Restore body styles
+        document.body.style.backgroundColor = bodyOriginalBg;
+        document.body.style.margin = bodyOriginalMargin;
+        document.body.style.padding = bodyOriginalPadding;
+
+        // Clear the map to free memory
+        originalStyles.clear();
+    }, 50);
+}
+
+// One idempotency key per action for this page: a retry after a
+// timeout reuses it, so the server returns the first result instead
+// of rendering (or saving) again
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+const saveIdempotencyKey = newIdempotencyKey();
+const downloadIdempotencyKey = newIdempotencyKey();
+
+// The previewed payslip and page URLs, rendered into the page by the template
+const payslipData = JSON.parse(document.getElementById('payslip-data').textContent);
+const pageUrls = document.body.dataset;
+
+function payslipPayload() {
+    return {
+        ...payslipData,
+        paid_days: Number(payslipData.paid_days),
+        loss_of_pay_days: Number(payslipData.loss_of_pay_days)
+    };
+}
+
+function saveToRecords() {
+    // Get CSRF token
+    const csrftoken = getCookie('csrftoken');
+
+    // Show loading state
+    const saveBtn = document.querySelector('.btn-save');
+    const originalText = saveBtn.innerHTML;
+    saveBtn.innerHTML = 'Saving...';
+    saveBtn.disabled = true;
+
+    // Make request to save payslip to database
+    fetch(pageUrls.saveUrl, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': csrftoken,
+            'Content-Type': 'application/json',
+            'Idempotency-Key': saveIdempotencyKey
+        },
+        body: JSON.stringify(payslipPayload())
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            alert('Payslip saved to records successfully!');
+            // Redirect to view payslips page
+            window.location.href = pageUrls.viewPayslipsUrl;
+        } else {
+            alert('Error: ' + data.message);
+        }
+    })
+    .catch(error => {
+        alert('Error saving payslip. Please try again.');
+        console.error('Error:', error);
+    })
+    .finally(() => {
+        saveBtn.innerHTML = originalText;
+        saveBtn.disabled = false;
+    });
+}
+
+function downloadPDF() {
+    // Get CSRF token
+    const csrftoken = getCookie('csrftoken');
+
+    // Show loading state
+    const downloadBtn = document.querySelector('.btn-download');
+    const originalText = downloadBtn.innerHTML;
+    downloadBtn.innerHTML = 'Generating PDF...';
+    downloadBtn.disabled = true;
+
+    // Make request to generate and download PDF
+    fetch(pageUrls.downloadUrl, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': csrftoken,
+            'Content-Type': 'application/json',
+            'Idempotency-Key': downloadIdempotencyKey
+        },
+        body: JSON.stringify(payslipPayload())
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('Network response was not ok');
+        }
+        return response.blob();
+    })
+    .then(blob => {
+        // Create blob URL and trigger download
+        const url = window.URL.createObjectURL(blob);
+        const link = document.createElement('a');
+        link.href = url;
+        link.download = pageUrls.pdfFilename;
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
+        window.URL.revokeObjectURL(url);
+
+        alert('Payslip downloaded successfully!');
+    })
+    .catch(error => {
+        alert('Error downloading payslip. Please try again.');
+        console.error('Error:', error);
+    })
+    .finally(() => {
+        downloadBtn.innerHTML = originalText;
+        downloadBtn.disabled = false;
+    });
+}
+
+// Helper function to get CSRF token from cookies
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
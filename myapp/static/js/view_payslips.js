@@ -0,0 +1,90 @@
+// CSRF token and endpoint URLs, rendered into the page by the template
+const pageData = document.body.dataset;
+
+function deletePayslip(payslipId, employeeName, payPeriod) {
+    if (confirm(`Are you sure you want to delete the payslip for ${employeeName} (${payPeriod})?\n\nThis action cannot be undone.`)) {
+        // Create a form to submit the delete request
+        const form = document.createElement('form');
+        form.method = 'POST';
+        form.action = `/delete-payslip/${payslipId}/`;
+
+        // Add CSRF token
+        const csrfInput = document.createElement('input');
+        csrfInput.type = 'hidden';
+        csrfInput.name = 'csrfmiddlewaretoken';
+        csrfInput.value = pageData.csrfToken;
+        form.appendChild(csrfInput);
+
+        document.body.appendChild(form);
+        form.submit();
+    }
+}
+
+function bulkDeletePeriod(filterMonth, filterYear, action) {
+    const payload = {filter_month: filterMonth, filter_year: filterYear, action: action};
+    const post = (body) => fetch(pageData.bulkDeleteUrl, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': pageData.csrfToken
+        },
+        body: JSON.stringify(body)
+    }).then(response => response.json());
+
+    // Dry run first so the confirmation shows exactly what will go
+    post({...payload, dry_run: true}).then(data => {
+        if (!data.success) {
+            alert(data.message);
+            return;
+        }
+        const count = data.report.rows;
+        const verb = action === 'archive' ? 'archive' : 'permanently delete';
+        if (!confirm(`This will ${verb} ${count} payslip(s) for ${filterMonth}/${filterYear}.\n\nContinue?`)) {
+            return;
+        }
+        post(payload).then(result => {
+            if (!result.success) {
+                alert(result.message);
+                return;
+            }
+            const report = result.report;
+            alert(`${report.rows} payslip(s) processed. Files removed: ${report.files_removed}, moved: ${report.files_moved}, missing: ${report.files_missing}.`);
+            window.location.href = pageData.viewPayslipsUrl;
+        });
+    });
+}
+
+function emailPeriod(filterMonth, filterYear) {
+    const payload = {filter_month: filterMonth, filter_year: filterYear};
+    const post = (body) => fetch(pageData.emailUrl, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': pageData.csrfToken
+        },
+        body: JSON.stringify(body)
+    }).then(response => response.json());
+
+    // Dry run first so the confirmation shows who will be emailed
+    post({...payload, dry_run: true}).then(data => {
+        if (!data.success) {
+            alert(data.message);
+            return;
+        }
+        const report = data.report;
+        if (!report.sent) {
+            alert(`Nothing to send for ${filterMonth}/${filterYear} (${report.skipped} without an email address).`);
+            return;
+        }
+        if (!confirm(`This will email ${report.sent} payslip(s) for ${filterMonth}/${filterYear}. ${report.skipped} have no email address.\n\nContinue?`)) {
+            return;
+        }
+        post(payload).then(result => {
+            if (!result.success) {
+                alert(result.message);
+                return;
+            }
+            alert(`Emailing ${result.report.sent} payslip(s) in the background. Delivery status is recorded per payslip (Payslip deliveries in the admin).`);
+        });
+    });
+}
@@ -0,0 +1,110 @@
+"""
+Storage for payslip PDFs.
+
+All PDF I/O goes through the ``payslips`` entry of ``settings.STORAGES``
+instead of touching ``MEDIA_ROOT`` directly, so several app nodes can share
+one object store. New files are placed in a hashed, sharded layout
+(``payslips/3f/a2/payslip_...pdf``) to keep directories / key prefixes small;
+names stored before sharding keep working unchanged.
+
+``ShardedS3Storage`` needs the optional ``django-storages[s3]`` package (see
+requirements.txt) and works against any S3-compatible endpoint, including a
+local MinIO stand-in; without the package it raises ImproperlyConfigured.
+"""
+import hashlib
+import posixpath
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage, storages
+
+
+PAYSLIP_UPLOAD_DIR = 'payslips'
+PDF_EXISTS_CACHE_TIMEOUT = 60 * 10
+
+
+class ShardedStorageMixin:
+    """Insert two levels of hash-derived directories in front of the file name"""
+
+    def generate_filename(self, filename):
+        filename = super().generate_filename(filename)
+        dirname, basename = posixpath.split(filename)
+        digest = hashlib.sha1(basename.encode('utf-8')).hexdigest()
+        return posixpath.join(dirname, digest[:2], digest[2:4], basename)
+
+
+class ShardedFileSystemStorage(ShardedStorageMixin, FileSystemStorage):
+    pass
+
+
+try:
+    from storages.backends.s3 import S3Storage
+except ImportError:
+    S3Storage = None
+
+if S3Storage is not None:
+    class ShardedS3Storage(ShardedStorageMixin, S3Storage):
+        pass
+else:
+    class ShardedS3Storage:
+        def __init__(self, *args, **kwargs):
+            raise ImproperlyConfigured('PAYSLIP_S3_BUCKET needs the django-storages[s3] package installed')
+
+
+def get_payslip_storage():
+    """Storage used by ``Payslip.pdf_file`` (callable so settings can be swapped in tests)"""
+    return storages['payslips']
+
+
+def is_local_storage(storage=None):
+    """True when files have a local filesystem path (needed to build packs in place)"""
+    storage = storage or get_payslip_storage()
+    try:
+        storage.path('')
+    except NotImplementedError:
+        return False
+    return True
+
+
+def _exists_key(name):
+    return f'payslip_pdf_exists:{name}'
+
+
+def mark_pdf_exists(name, exists=True):
+    cache.set(_exists_key(name), exists, PDF_EXISTS_CACHE_TIMEOUT)
+
+
+def pdf_exists(name):
+    """
+    Cached existence check.
+
+    Against an object store ``exists()`` is a network round trip, so page
+    renders use this instead; writes through this module keep it current.
+    """
+    if not name:
+        return False
+    exists = cache.get(_exists_key(name))
+    if exists is None:
+        exists = get_payslip_storage().exists(name)
+        mark_pdf_exists(name, exists)
+    return exists
+
+
+def save_pdf(filename, content):
+    """
+    Stream ``content`` (a File) to storage as ``filename`` in the sharded
+    payslip directory; returns the stored name to put in ``pdf_file``.
+    """
+    storage = get_payslip_storage()
+    saved_name = storage.save(storage.generate_filename(posixpath.join(PAYSLIP_UPLOAD_DIR, filename)), content)
+    mark_pdf_exists(saved_name)
+    return saved_name
+
+
+def delete_pdf(name):
+    get_payslip_storage().delete(name)
+    mark_pdf_exists(name, False)
+
+
+def open_pdf(name):
+    return get_payslip_storage().open(name, 'rb')
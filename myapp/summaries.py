@@ -0,0 +1,108 @@
+"""
+Incremental maintenance of ``PeriodSummary``.
+
+Every code path that creates or deletes payslips calls into here inside the
+same transaction, so the per-period totals never need a scan of the Payslip
+table to read. ``rebuild_period_summaries`` recomputes everything from
+scratch and is exposed as the ``rebuild_period_summaries`` command.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction, IntegrityError
+from django.db.models import Count, Sum, Max, F, Q
+
+from .cache import bump_data_version_on_commit
+from .models import Payslip, PeriodSummary
+from .reports import AMOUNT_FIELDS
+
+
+def _apply_delta(pay_period, headcount, amounts, payment_date=None):
+    """Add ``headcount`` and ``amounts`` (possibly negative) to one period row"""
+    updates = {'headcount': F('headcount') + headcount}
+    for field in AMOUNT_FIELDS:
+        updates[field] = F(field) + amounts[field]
+
+    with transaction.atomic():
+        updated = PeriodSummary.objects.filter(pay_period=pay_period).update(**updates)
+        if not updated and headcount > 0:
+            try:
+                with transaction.atomic():
+                    PeriodSummary.objects.create(
+                        pay_period=pay_period,
+                        headcount=headcount,
+                        payment_date=payment_date,
+                        **{field: amounts[field] for field in AMOUNT_FIELDS}
+                    )
+            except IntegrityError:
+                # Another request created the row first - add onto it instead
+                PeriodSummary.objects.filter(pay_period=pay_period).update(**updates)
+
+        if payment_date:
+            PeriodSummary.objects.filter(
+                Q(payment_date__isnull=True) | Q(payment_date__lt=payment_date),
+                pay_period=pay_period,
+            ).update(payment_date=payment_date)
+
+        # A period with no payslips left has nothing to summarise
+        PeriodSummary.objects.filter(pay_period=pay_period, headcount__lte=0).delete()
+
+
+def _group(payslips, sign):
+    """Collapse payslips into one delta per pay period"""
+    groups = defaultdict(lambda: {
+        'headcount': 0,
+        'payment_date': None,
+        'amounts': {field: Decimal('0') for field in AMOUNT_FIELDS},
+    })
+    for payslip in payslips:
+        group = groups[payslip.pay_period]
+        group['headcount'] += sign
+        for field in AMOUNT_FIELDS:
+            group['amounts'][field] += sign * Decimal(str(getattr(payslip, field)))
+        # Dates may still be ISO strings when called straight from a view
+        payment_date = payslip.payment_date
+        if sign > 0 and payment_date and str(payment_date) > str(group['payment_date'] or ''):
+            group['payment_date'] = payment_date
+    return groups
+
+
+def add_payslips(payslips):
+    """Record newly created payslips (one UPDATE per pay period, not per row)"""
+    for pay_period, group in _group(payslips, 1).items():
+        _apply_delta(pay_period, group['headcount'], group['amounts'], group['payment_date'])
+
+
+def remove_payslips(payslips):
+    """Record deleted payslips; call before or after the delete in the same transaction"""
+    for pay_period, group in _group(payslips, -1).items():
+        _apply_delta(pay_period, group['headcount'], group['amounts'])
+
+
+def add_payslip(payslip):
+    add_payslips([payslip])
+
+
+def remove_payslip(payslip):
+    remove_payslips([payslip])
+
+
+def rebuild_period_summaries():
+    """Recompute every PeriodSummary row from the Payslip table; returns the number of periods"""
+    rows = (
+        Payslip.objects.order_by()
+        .values('pay_period')
+        .annotate(
+            headcount=Count('id'),
+            payment_date=Max('payment_date'),
+            **{field: Sum(field) for field in AMOUNT_FIELDS}
+        )
+    )
+    summaries = [PeriodSummary(**row) for row in rows]
+
+    with transaction.atomic():
+        PeriodSummary.objects.all().delete()
+        PeriodSummary.objects.bulk_create(summaries, batch_size=500)
+        bump_data_version_on_commit()
+
+    return len(summaries)
@@ -1,3 +1,1589 @@
-from django.test import TestCase
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import views
+from .anomalies import check_payroll_run, np
+from .backends import is_login_throttled
+from .backup import (
+    BackupError, backup_root, create_backup, list_snapshots, object_path, prune_backups, restore_snapshot,
+    verify_snapshot,
+)
+from .distribution import EMAIL_JOB_LOCK, EmailJobRunning, distribute_payslips, start_email_job
+from .employees import employee_prefill, matching_employees, remember_employee
+from .fragments import cached_payslip_fragment, render_payslip_fragment
+from .integrity import audit_payslips, pdf_digest
+from .layout import CURRENCY_SYMBOL, PAYSLIP_LAYOUT
+from .loadtest import ENDPOINTS, LoadStats, percentile, run_load_test
+from .lookups import LOOKUP_MAX_BODY_BYTES, lookup_payslips
+from .models import Employee, EmployeeYearTotal, Payslip, PayslipDelivery, PeriodSummary
+from .packs import pack_period, read_packed_pdf
+from .profiling import PROFILE_KINDS, profile_path, recent_profiles
+from .pdf import LAYOUT_VERSION, context_from_payslip, render_payslip_bytes, render_payslip_into
+from .purge import find_orphans, purge_payslips, remove_orphans, select_payslips
+from .querybudget import QueryBudgetExceeded, QueryBudgetTestMixin
+from .reports import AMOUNT_FIELDS
+from .rerender import load_checkpoint, save_checkpoint, stale_payslips
+from .storage import (
+    S3Storage, ShardedS3Storage, ShardedStorageMixin, delete_pdf, get_payslip_storage, open_pdf, pdf_exists,
+    save_pdf,
+)
+from .summaries import rebuild_period_summaries
+from .ytd import add_payslip_ytd, rebuild_ytd
+
+
+EMPLOYEES = 12
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr']
+
+# The manifest only exists after collectstatic
+TEST_STORAGES = {
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class TempStorageMixin:
+    """Payslip PDFs (and anything else under ``self.root``) in a temporary directory per test"""
+
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        storages = {
+            **TEST_STORAGES,
+            'payslips': {
+                'BACKEND': 'myapp.storage.ShardedFileSystemStorage',
+                'OPTIONS': {'location': os.path.join(self.root, 'media')},
+            },
+        }
+        override = self.settings(STORAGES=storages)
+        override.enable()
+        self.addCleanup(override.disable)
+        caches['default'].clear()
+
+    def store_pdfs(self, payslips):
+        """Give each payslip a small stored PDF of its own"""
+        for payslip in payslips:
+            payslip.pdf_file.name = save_pdf(f'payslip_{payslip.id}.pdf', ContentFile(f'%PDF-{payslip.id}'.encode()))
+            payslip.save(update_fields=['pdf_file'])
+
+
+def create_payslips(user, employees=EMPLOYEES, months=MONTHS):
+    """Employees with one payslip per month of 2025, bypassing the save view (no PDFs)"""
+    records = Employee.objects.bulk_create([
+        Employee(employee_id=f'E{e:03d}', name=f'Employee {e}', email=f'e{e}@example.com',
+                 basic_salary=Decimal(20000 + e * 1000), default_incentive=Decimal(500))
+        for e in range(employees)
+    ])
+    payslips = []
+    for month, name in enumerate(months, 1):
+        for employee in records:
+            gross = employee.basic_salary + employee.default_incentive
+            payslips.append(Payslip(
+                employee_name=employee.name, employee_id=employee.employee_id,
+                employee_record=employee,
+                pay_period=f'1-{name}-2025 to 28-{name}-2025', paid_days=28, loss_of_pay_days=0,
+                payment_date=datetime.date(2025, month, 28),
+                basic_salary=employee.basic_salary, incentive=employee.default_incentive,
+                gross_earnings=gross, income_tax=Decimal(300), total_deduction=Decimal(300),
+                net_payable=gross - 300, amount_in_words='Rupees',
+                pdf_file=f'payslips/{employee.employee_id}_{month}.pdf', created_by=user,
+            ))
+    Payslip.objects.bulk_create(payslips)
+    rebuild_period_summaries()
+    rebuild_ytd()
+
+
+def payslip_form(employee_id='E001', basic_salary=21000, **changes):
+    """JSON body of the save/download endpoints for a May 2025 payslip"""
+    form = {
+        'employee_name': 'Employee', 'employee_id': employee_id, 'pay_period': '1-May-2025 to 31-May-2025',
+        'paid_days': '31', 'loss_of_pay_days': '0', 'payment_date': '2025-05-31',
+        'basic_salary': str(basic_salary), 'incentive': '500', 'gross_earnings': str(basic_salary + 500),
+        'income_tax': '300', 'total_deduction': '300', 'net_payable': str(basic_salary + 200),
+        'amount_in_words': 'Rupees',
+    }
+    form.update(changes)
+    return form
+
+
+@override_settings(PAYSLIP_QUERY_BUDGET_ENFORCE=True, STORAGES=TEST_STORAGES)
+class QueryBudgetTests(QueryBudgetTestMixin, TempStorageMixin, TestCase):
+    """
+    Every budgeted view, run against enough payslips that a per-row query
+    would break its budget. Enforcement is on, so going over the budget
+    raises ``QueryBudgetExceeded`` even where a test forgets to assert.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user)
+        cls.payslip = Payslip.objects.first()
+
+    def setUp(self):
+        super().setUp()
+        # Cached pages, fragments and reports would hide the queries of a cold request
+        for cache in caches.all():
+            cache.clear()
+        self.client.force_login(self.user)
+
+    def test_view_payslips(self):
+        response = self.client.get(reverse('view_payslips'))
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+    def test_view_payslips_filtered(self):
+        response = self.client.get(reverse('view_payslips'), {
+            'search_name': 'Employee', 'filter_month': '02', 'filter_year': '2025',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+    def test_payslip_detail(self):
+        response = self.client.get(reverse('payslip_detail', args=[self.payslip.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['payslip'], self.payslip)
+        self.assertWithinQueryBudget(response)
+
+    def test_payroll_report(self):
+        response = self.client.get(reverse('payroll_report'))
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+    def test_payroll_report_api(self):
+        response = self.client.get(reverse('payroll_report_api'), {'employee_id': 'E001'})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+    def test_lookup_payslips(self):
+        pairs = [{'employee_id': f'E{e:03d}', 'pay_period': f'1-{name}-2025 to 28-{name}-2025'}
+                 for name in MONTHS for e in range(EMPLOYEES)]
+        response = self.client.post(reverse('lookup_payslips'), json.dumps({'pairs': pairs}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(result['exists'] for result in response.json()['results']))
+        self.assertWithinQueryBudget(response)
+
+    def test_dashboard(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget(response)
+
+    def test_employee_prefill(self):
+        response = self.client.get(reverse('employee_prefill'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['employees']), EMPLOYEES)
+        self.assertWithinQueryBudget(response)
+
+    def post_json(self, name, data, **extra):
+        return self.client.post(reverse(name), json.dumps(data), content_type='application/json', **extra)
+
+    def save_payslip(self, employee_id, basic_salary):
+        response = self.post_json('save_payslip_to_database', payslip_form(employee_id, basic_salary),
+                                  HTTP_IDEMPOTENCY_KEY=f'budget-test-{employee_id}')
+        self.assertTrue(response.json()['success'], response.json())
+        return response
+
+    def test_save_payslip(self):
+        response = self.save_payslip('E001', 21000)
+        self.assertWithinQueryBudget(response)
+
+    def test_save_first_payslip_of_new_employee(self):
+        # New master row, new year total and new period summary
+        response = self.save_payslip('E999', 30000)
+        self.assertWithinQueryBudget(response)
+
+    def test_delete_payslip(self):
+        response = self.client.post(reverse('delete_payslip', args=[self.payslip.id]))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Payslip.objects.filter(id=self.payslip.id).exists())
+        self.assertWithinQueryBudget(response)
+
+    def test_bulk_delete_period(self):
+        response = self.post_json('bulk_delete_payslips', {'filter_month': '02', 'filter_year': '2025'})
+        self.assertEqual(response.json()['report']['rows'], EMPLOYEES)
+        self.assertWithinQueryBudget(response)
+
+    def test_bulk_archive_period(self):
+        with self.settings(PAYSLIP_ARCHIVE_ROOT=os.path.join(self.root, 'archive')):
+            response = self.post_json('bulk_delete_payslips', {
+                'filter_month': '02', 'filter_year': '2025', 'action': 'archive',
+            })
+        self.assertEqual(response.json()['report']['rows'], EMPLOYEES)
+        self.assertWithinQueryBudget(response)
+
+    def test_bulk_delete_dry_run(self):
+        response = self.post_json('bulk_delete_payslips', {'filter_month': '02', 'filter_year': '2025', 'dry_run': True})
+        self.assertEqual(response.json()['report']['rows'], EMPLOYEES)
+        self.assertWithinQueryBudget(response)
+
+    def test_email_period(self):
+        with mock.patch('myapp.views.start_email_job', return_value='job.log'):
+            response = self.post_json('email_payslips', {'filter_month': '02', 'filter_year': '2025'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['report']['sent'], EMPLOYEES)
+        self.assertWithinQueryBudget(response)
+
+    def test_enforcement_raises_over_budget(self):
+        with mock.patch.object(views.view_payslips, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('view_payslips'))
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class PayrollReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=3, months=MONTHS[:2])
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_login(self.user)
+
+    def test_api_totals(self):
+        response = self.client.get(reverse('payroll_report_api'), {'filter_year': '2025'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['totals']['payslip_count'], 6)
+        self.assertEqual(len(data['periods']), 2)
+
+    def test_api_rejects_non_numeric_year(self):
+        response = self.client.get(reverse('payroll_report_api'), {'filter_year': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+    def test_page_ignores_non_numeric_year(self):
+        response = self.client.get(reverse('payroll_report'), {'filter_year': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['filter_year'], '')
+        self.assertEqual(response.context['summary']['totals']['payslip_count'], 6)
+
+
+@override_settings(LOGIN_THROTTLE_LIMIT=3, LOGIN_THROTTLE_WINDOW=60, LOGIN_TRUSTED_PROXY_COUNT=0,
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginThrottleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.clerk = User.objects.create_user('clerk', 'clerk@example.com', 'secret')
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def request(self, ip='10.0.0.1', forwarded=None):
+        extra = {'REMOTE_ADDR': ip}
+        if forwarded:
+            extra['HTTP_X_FORWARDED_FOR'] = forwarded
+        return RequestFactory().post(reverse('login'), **extra)
+
+    def fail_login(self, username, **client):
+        self.assertIsNone(authenticate(self.request(**client), username=username, password='wrong'))
+
+    def test_login_by_email(self):
+        user = authenticate(self.request(), username='admin@example.com', password='password')
+        self.assertEqual(user, self.admin)
+
+    def test_lockout_is_per_client_and_account(self):
+        for _ in range(3):
+            self.fail_login('admin')
+        request = self.request()
+        self.assertTrue(is_login_throttled(request, 'admin'))
+        # Even the right password is refused while locked out
+        self.assertIsNone(authenticate(request, username='admin', password='password'))
+        # Other clients and other accounts are unaffected
+        self.assertEqual(authenticate(self.request(ip='10.0.0.2'), username='admin', password='password'), self.admin)
+        self.assertFalse(is_login_throttled(request, 'clerk'))
+
+    def test_window_expires(self):
+        for _ in range(3):
+            self.fail_login('admin')
+        later = time.time() + 61
+        with mock.patch('time.time', return_value=later):
+            self.assertFalse(is_login_throttled(self.request(), 'admin'))
+
+    def test_success_resets_only_its_own_counter(self):
+        for _ in range(2):
+            self.fail_login('admin')
+            self.fail_login('clerk')
+        self.assertIsNotNone(authenticate(self.request(), username='clerk', password='secret'))
+        # Logging in to one account doesn't buy more guesses at another
+        self.fail_login('admin')
+        self.assertTrue(is_login_throttled(self.request(), 'admin'))
+        self.fail_login('clerk')
+        self.assertFalse(is_login_throttled(self.request(), 'clerk'))
+
+    def test_shared_proxy_address(self):
+        with self.settings(LOGIN_TRUSTED_PROXY_COUNT=1):
+            for _ in range(3):
+                self.fail_login('admin', ip='10.9.9.9', forwarded='203.0.113.5')
+            self.assertTrue(is_login_throttled(self.request(ip='10.9.9.9', forwarded='203.0.113.5'), 'admin'))
+            self.assertFalse(is_login_throttled(self.request(ip='10.9.9.9', forwarded='203.0.113.6'), 'admin'))
+            # A client can't pick its own address by sending X-Forwarded-For itself
+            spoofed = self.request(ip='10.9.9.9', forwarded='198.51.100.1, 203.0.113.5')
+            self.assertTrue(is_login_throttled(spoofed, 'admin'))
+
+
+PERIOD = '1-Jan-2025 to 28-Jan-2025'
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', PAYSLIP_EMAIL_RATE_LIMIT=0)
+class DistributionTests(TempStorageMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=3, months=MONTHS[:1])
+        Employee.objects.filter(employee_id='E002').update(email='')
+
+    def setUp(self):
+        super().setUp()
+        self.store_pdfs(Payslip.objects.all())
+
+    def test_dry_run_report(self):
+        report = distribute_payslips(select_payslips(pay_period=PERIOD), dry_run=True)
+        self.assertEqual((report['sent'], report['skipped'], report['failed']), (2, 1, 0))
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(PayslipDelivery.objects.exists())
+
+    def test_send_records_deliveries(self):
+        report = distribute_payslips(select_payslips(pay_period=PERIOD), batch_size=2, workers=2)
+        self.assertEqual((report['sent'], report['skipped'], report['failed']), (2, 1, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['e0@example.com', 'e1@example.com'])
+        payslip = Payslip.objects.get(employee_id='E000')
+        self.assertEqual(mail.outbox[0].attachments[0][2], 'application/pdf')
+        self.assertEqual(payslip.delivery.status, PayslipDelivery.STATUS_SENT)
+        self.assertIsNotNone(payslip.delivery.sent_at)
+        skipped = PayslipDelivery.objects.get(payslip__employee_id='E002')
+        self.assertEqual(skipped.status, PayslipDelivery.STATUS_SKIPPED)
+
+        # Already-sent payslips are left alone unless resending
+        again = distribute_payslips(select_payslips(pay_period=PERIOD))
+        self.assertEqual((again['sent'], again['skipped']), (0, 1))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_missing_pdf_fails_that_payslip_only(self):
+        Payslip.objects.filter(employee_id='E001').update(pdf_file='payslips/missing.pdf')
+        report = distribute_payslips(select_payslips(pay_period=PERIOD))
+        self.assertEqual((report['sent'], report['failed']), (1, 1))
+        self.assertEqual(PayslipDelivery.objects.get(payslip__employee_id='E001').status,
+                         PayslipDelivery.STATUS_FAILED)
+
+
+class EmailJobTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        override = self.settings(PAYSLIP_EMAIL_JOB_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.lock = os.path.join(self.root, EMAIL_JOB_LOCK)
+
+    def popen(self, pid=None):
+        # The test process stands in for a running job
+        return mock.patch('myapp.distribution.subprocess.Popen',
+                          return_value=mock.Mock(pid=pid or os.getpid()))
+
+    def test_second_job_is_refused_while_first_runs(self):
+        with self.popen() as popen:
+            start_email_job(pay_period=PERIOD)
+            with self.assertRaises(EmailJobRunning):
+                start_email_job(period_contains='Jan-2025')
+        self.assertEqual(popen.call_count, 1)
+        command = popen.call_args.args[0]
+        self.assertEqual(command[command.index('--lock-file') + 1], self.lock)
+
+    def test_concurrent_starts_spawn_one_job(self):
+        barrier = threading.Barrier(8)
+        outcomes = []
+
+        def start():
+            barrier.wait()
+            try:
+                start_email_job(pay_period=PERIOD)
+                outcomes.append('started')
+            except EmailJobRunning:
+                outcomes.append('refused')
+
+        with self.popen() as popen:
+            threads = [threading.Thread(target=start) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(outcomes.count('started'), 1)
+        self.assertEqual(popen.call_count, 1)
+
+    def test_lock_of_dead_job_is_replaced(self):
+        with open(self.lock, 'w') as lock:
+            lock.write(f'{2 ** 31 - 1}\n{PERIOD}')
+        with self.popen():
+            start_email_job(pay_period=PERIOD)
+        with open(self.lock) as lock:
+            self.assertEqual(lock.read(), f'{os.getpid()}\n{PERIOD}')
+
+    def test_failed_spawn_releases_lock(self):
+        with mock.patch('myapp.distribution.subprocess.Popen', side_effect=OSError('no python')):
+            with self.assertRaises(OSError):
+                start_email_job(pay_period=PERIOD)
+        self.assertFalse(os.path.exists(self.lock))
+
+    def test_command_removes_lock_on_exit(self):
+        with open(self.lock, 'w') as lock:
+            lock.write(f'{os.getpid()}\n{PERIOD}')
+        call_command('email_payslips', '--pay-period', PERIOD, '--lock-file', self.lock, stdout=io.StringIO())
+        self.assertFalse(os.path.exists(self.lock))
+
+
+def post_admin_change(client, payslip, **changes):
+    """Submit the admin change form for ``payslip`` with ``changes`` applied"""
+    data = model_to_dict(payslip, exclude=['id', 'pdf_file'])
+    data.update(changes)
+    data = {field: '' if value is None else value for field, value in data.items()}
+    return client.post(reverse('admin:myapp_payslip_change', args=[payslip.id]), data)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class PayslipAdminTests(TestCase):
+    """Admin edits and deletes keep the derived tables as a full rebuild would leave them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=3, months=MONTHS[:3])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def period_summaries(self):
+        return list(PeriodSummary.objects.order_by('pay_period').values('pay_period', 'headcount', 'payment_date', *AMOUNT_FIELDS))
+
+    def assertSummariesRebuilt(self):
+        maintained = self.period_summaries()
+        rebuild_period_summaries()
+        self.assertEqual(maintained, self.period_summaries())
+
+    def edit(self, payslip, **changes):
+        response = post_admin_change(self.client, payslip, **changes)
+        self.assertEqual(response.status_code, 302)
+
+    def test_edit_amounts(self):
+        payslip = Payslip.objects.get(employee_id='E001', pay_period__startswith='1-Feb')
+        self.edit(payslip, basic_salary='30000.00', gross_earnings='30500.00', net_payable='30200.00')
+        summary = PeriodSummary.objects.get(pay_period=payslip.pay_period)
+        self.assertEqual(summary.gross_earnings, Decimal('20500') + Decimal('30500') + Decimal('22500'))
+        self.assertSummariesRebuilt()
+
+    def test_move_to_another_period(self):
+        payslip = Payslip.objects.get(employee_id='E002', pay_period__startswith='1-Mar')
+        self.edit(payslip, pay_period='1-Jan-2025 to 28-Jan-2025', payment_date='2025-01-28')
+        self.assertEqual(PeriodSummary.objects.get(pay_period__startswith='1-Jan').headcount, 4)
+        self.assertEqual(PeriodSummary.objects.get(pay_period__startswith='1-Mar').headcount, 2)
+        self.assertSummariesRebuilt()
+
+    def test_delete(self):
+        payslip = Payslip.objects.get(employee_id='E000', pay_period__startswith='1-Jan')
+        response = self.client.post(reverse('admin:myapp_payslip_delete', args=[payslip.id]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Payslip.objects.filter(id=payslip.id).exists())
+        self.assertSummariesRebuilt()
+
+    def test_delete_selected(self):
+        ids = list(Payslip.objects.filter(pay_period__startswith='1-Feb').values_list('id', flat=True))
+        ids.append(Payslip.objects.get(employee_id='E001', pay_period__startswith='1-Mar').id)
+        response = self.client.post(reverse('admin:myapp_payslip_changelist'), {
+            'action': 'delete_selected', '_selected_action': ids, 'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Payslip.objects.count(), 5)
+        self.assertFalse(PeriodSummary.objects.filter(pay_period__startswith='1-Feb').exists())
+        self.assertSummariesRebuilt()
+
+
+class YearToDateTests(TempStorageMixin, TestCase):
+    """Incremental YTD maintenance agrees with the window-function rebuild"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        # Saved out of order: June before May
+        self.april = self.save_payslip(4, 1000)
+        self.june = self.save_payslip(6, 3000)
+        self.may = self.save_payslip(5, 2000)
+
+    def save_payslip(self, month, gross):
+        name = datetime.date(2025, month, 1).strftime('%b')
+        with transaction.atomic():
+            payslip = Payslip.objects.create(
+                employee_name='Employee 0', employee_id='E000', pay_period=f'1-{name}-2025 to 28-{name}-2025',
+                paid_days=28, loss_of_pay_days=0, payment_date=datetime.date(2025, month, 28),
+                basic_salary=gross, incentive=0, gross_earnings=gross, income_tax=100, total_deduction=100,
+                net_payable=gross - 100, amount_in_words='Rupees', pdf_file=f'payslips/E000_{month}.pdf',
+                created_by=self.user,
+            )
+            add_payslip_ytd(payslip)
+        return payslip
+
+    def ytd_gross(self, payslip):
+        return Payslip.objects.get(id=payslip.id).ytd_gross_earnings
+
+    def year_total(self):
+        return EmployeeYearTotal.objects.values('payslip_count', 'gross_earnings', 'income_tax').get(
+            employee_id='E000', fiscal_year=2025)
+
+    def test_insert_out_of_order(self):
+        self.assertEqual(self.ytd_gross(self.april), 1000)
+        self.assertEqual(self.ytd_gross(self.may), 3000)
+        self.assertEqual(self.ytd_gross(self.june), 6000)
+        # June's stored PDF was rendered before May existed
+        self.assertEqual(Payslip.objects.get(id=self.june.id).layout_version, 0)
+        self.assertEqual(self.year_total(), {'payslip_count': 3, 'gross_earnings': 6000, 'income_tax': 300})
+        self.assertEqual(rebuild_ytd(), 0)
+
+    def test_delete_middle_month(self):
+        response = self.client.post(reverse('delete_payslip', args=[self.may.id]))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.ytd_gross(self.april), 1000)
+        self.assertEqual(self.ytd_gross(self.june), 4000)
+        self.assertEqual(self.year_total(), {'payslip_count': 2, 'gross_earnings': 4000, 'income_tax': 200})
+        self.assertEqual(rebuild_ytd(), 0)
+
+    def test_admin_edit_and_delete(self):
+        Payslip.objects.update(layout_version=1)
+        response = post_admin_change(self.client, Payslip.objects.get(id=self.april.id), gross_earnings='1500.00')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.ytd_gross(self.june), 6500)
+        self.assertEqual(Payslip.objects.get(id=self.april.id).layout_version, 0)
+        self.assertEqual(Payslip.objects.get(id=self.june.id).layout_version, 0)
+
+        response = self.client.post(reverse('admin:myapp_payslip_delete', args=[self.may.id]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.ytd_gross(self.june), 4500)
+        self.assertEqual(self.year_total(), {'payslip_count': 2, 'gross_earnings': 4500, 'income_tax': 200})
+        self.assertEqual(rebuild_ytd(), 0)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=3, months=MONTHS[:2])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        return self.client.get(reverse('export_payslips'), params)
+
+    def csv_lines(self, response):
+        return b''.join(response.streaming_content).decode('utf-8').splitlines()
+
+    def test_csv_stream(self):
+        response = self.export(format='csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = self.csv_lines(response)
+        self.assertTrue(lines[0].startswith('\ufeffPayslip ID,Employee ID,Employee Name,Pay Period'))
+        self.assertEqual(len(lines), 1 + 6)
+
+    def test_csv_filters(self):
+        lines = self.csv_lines(self.export(format='csv', search_name='E001', filter_month='02', filter_year='2025'))
+        self.assertEqual(len(lines), 2)
+        self.assertIn(',E001,Employee 1,1-Feb-2025 to 28-Feb-2025,', lines[1])
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.export(format='xlsx', filter_month='01', filter_year='2025')
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook['Payslips'].values)
+        self.assertEqual(rows[0][:3], ('Payslip ID', 'Employee ID', 'Employee Name'))
+        self.assertEqual(sorted(row[1] for row in rows[1:]), ['E000', 'E001', 'E002'])
+
+    def test_xlsx_without_openpyxl(self):
+        with mock.patch.dict(sys.modules, {'openpyxl': None}):
+            response = self.export(format='xlsx')
+        self.assertEqual(response.status_code, 400)
+
+    def test_unsupported_format(self):
+        self.assertEqual(self.export(format='pdf').status_code, 400)
+
+
+class PayrollRunCheckTests(TestCase):
+    """Rule and trend checks give the same flags with either engine"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=5, months=MONTHS)
+        # E003's pay moves a little from month to month
+        for offset, payslip in zip([0, 100, -100, 50], Payslip.objects.filter(employee_id='E003').order_by('payment_date')):
+            basic = payslip.basic_salary + offset
+            Payslip.objects.filter(id=payslip.id).update(
+                basic_salary=basic, gross_earnings=basic + 500, net_payable=basic + 200)
+
+    def run_row(self, employee, basic=None, paid_days=31, **changes):
+        basic = Decimal(20000 + employee * 1000) if basic is None else Decimal(basic)
+        row = {
+            'employee_id': f'E{employee:03d}', 'pay_period': '1-May-2025 to 31-May-2025',
+            'paid_days': paid_days, 'loss_of_pay_days': 0, 'payment_date': '2025-05-31',
+            'basic_salary': str(basic), 'incentive': '500', 'gross_earnings': str(basic + 500),
+            'income_tax': '300', 'total_deduction': '300', 'net_payable': str(basic + 200),
+        }
+        row.update(changes)
+        return row
+
+    def payroll_run(self):
+        return [
+            self.run_row(0),
+            self.run_row(1, basic=210000),                  # an extra zero
+            self.run_row(2, paid_days=30),                  # a day short
+            self.run_row(3, basic=30000),                   # far outside the usual spread
+            self.run_row(4, gross_earnings='24000'),        # gross is not basic + incentive
+            self.run_row(7),                                # new joiner, no history
+        ]
+
+    def flags(self, use_numpy):
+        report = check_payroll_run(self.payroll_run(), use_numpy=use_numpy)
+        self.assertEqual(report['engine'], 'numpy' if use_numpy else 'python')
+        return {(row['employee_id'], issue['check'], issue.get('field')) for row in report['flagged'] for issue in row['issues']}
+
+    def assertExpectedFlags(self, flags):
+        self.assertEqual(flags, {
+            ('E001', 'change', 'basic_salary'),
+            ('E001', 'change', 'gross_earnings'),
+            ('E001', 'change', 'net_payable'),
+            ('E002', 'days_mismatch', None),
+            ('E003', 'zscore', 'basic_salary'),
+            ('E003', 'zscore', 'gross_earnings'),
+            ('E003', 'zscore', 'net_payable'),
+            ('E004', 'gross_mismatch', None),
+            ('E004', 'net_mismatch', None),
+            ('E004', 'net_exceeds_gross', None),
+        })
+
+    def test_python_engine(self):
+        self.assertExpectedFlags(self.flags(use_numpy=False))
+
+    @skipUnless(np is not None, 'numpy is not installed')
+    def test_numpy_engine_agrees(self):
+        self.assertExpectedFlags(self.flags(use_numpy=True))
+        python = check_payroll_run(self.payroll_run(), use_numpy=False)['flagged']
+        vectorised = check_payroll_run(self.payroll_run(), use_numpy=True)['flagged']
+        self.assertEqual(python, vectorised)
+
+    def test_run_periods_are_not_their_own_history(self):
+        rows = [self.run_row(1, basic=210000, pay_period='1-Apr-2025 to 28-Apr-2025', paid_days=28,
+                             payment_date='2025-04-28')]
+        report = check_payroll_run(rows, use_numpy=False)
+        issues = report['flagged'][0]['issues']
+        # Compared with March, not with the April payslip already saved
+        self.assertEqual(issues[0]['previous'], 21000.0)
+
+    def test_api(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('check_payroll_run'), json.dumps({'payslips': self.payroll_run()}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row['employee_id'] for row in response.json()['flagged']}, {'E001', 'E002', 'E003', 'E004'})
+
+
+class ShardedInMemoryStorage(ShardedStorageMixin, InMemoryStorage):
+    """Object-store stand-in: nothing touches the disk, names as the sharding mixin makes them"""
+
+
+@override_settings(STORAGES={**TEST_STORAGES, 'payslips': {'BACKEND': 'myapp.tests.ShardedInMemoryStorage'}})
+class PayslipStorageTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_sharded_name(self):
+        name = save_pdf('payslip_E001_oct.pdf', ContentFile(b'%PDF-1'))
+        digest = hashlib.sha1(b'payslip_E001_oct.pdf').hexdigest()
+        self.assertEqual(name, f'payslips/{digest[:2]}/{digest[2:4]}/payslip_E001_oct.pdf')
+        with open_pdf(name) as handle:
+            self.assertEqual(handle.read(), b'%PDF-1')
+
+    def test_same_name_twice_keeps_both(self):
+        first = save_pdf('payslip.pdf', ContentFile(b'first'))
+        second = save_pdf('payslip.pdf', ContentFile(b'second'))
+        self.assertNotEqual(first, second)
+        self.assertEqual(first.rsplit('/', 1)[0], second.rsplit('/', 1)[0])
+        with open_pdf(first) as handle:
+            self.assertEqual(handle.read(), b'first')
+
+    def test_unsharded_names_still_open(self):
+        name = get_payslip_storage().save('payslips/legacy.pdf', ContentFile(b'old'))
+        self.assertEqual(name, 'payslips/legacy.pdf')
+        with open_pdf(name) as handle:
+            self.assertEqual(handle.read(), b'old')
+
+    def test_exists_cache_follows_writes(self):
+        name = save_pdf('payslip.pdf', ContentFile(b'x'))
+        with mock.patch.object(ShardedInMemoryStorage, 'exists', side_effect=AssertionError('not cached')):
+            self.assertTrue(pdf_exists(name))
+        delete_pdf(name)
+        self.assertFalse(pdf_exists(name))
+        self.assertFalse(pdf_exists(''))
+
+    @skipUnless(S3Storage is None, 'django-storages is installed')
+    def test_s3_without_django_storages(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ShardedS3Storage(bucket_name='payslips')
+
+    @skipUnless(S3Storage is not None, 'django-storages is not installed')
+    def test_s3_names_are_sharded(self):
+        storage = ShardedS3Storage(bucket_name='payslips', location='prefix')
+        digest = hashlib.sha1(b'payslip.pdf').hexdigest()
+        self.assertEqual(storage.generate_filename('payslips/payslip.pdf'),
+                         f'payslips/{digest[:2]}/{digest[2:4]}/payslip.pdf')
+
+
+def page_count(pdf_bytes):
+    return len(re.findall(rb'/Type /Page\b(?!s)', pdf_bytes))
+
+
+class PdfRenderTests(SimpleTestCase):
+    """myapp.pdf renders outside the request cycle, from a plain context"""
+
+    def context(self, employee_id='E001'):
+        payslip = Payslip(
+            employee_name='Employee 1', employee_id=employee_id, pay_period='1-Jan-2025 to 31-Jan-2025',
+            paid_days=31, loss_of_pay_days=0, payment_date=datetime.date(2025, 1, 31),
+            basic_salary=Decimal('21000.00'), incentive=Decimal('500.00'), gross_earnings=Decimal('21500.00'),
+            income_tax=Decimal('300.00'), total_deduction=Decimal('300.00'), net_payable=Decimal('21200.00'),
+            amount_in_words='Twenty One Thousand Two Hundred Rupees Only', fiscal_year=2024,
+            ytd_gross_earnings=Decimal('215000.00'), ytd_income_tax=Decimal('3000.00'),
+            ytd_net_payable=Decimal('212000.00'),
+        )
+        return context_from_payslip(payslip)
+
+    def test_single_payslip(self):
+        pdf = render_payslip_bytes(self.context())
+        self.assertTrue(pdf.startswith(b'%PDF-'))
+        self.assertEqual(page_count(pdf), 1)
+
+    def test_one_page_per_context(self):
+        pdf = render_payslip_bytes([self.context(f'E00{n}') for n in range(3)])
+        self.assertEqual(page_count(pdf), 3)
+
+    def test_reused_buffer(self):
+        buffer = io.BytesIO()
+        first = render_payslip_into(buffer, [self.context(), self.context()])
+        second = render_payslip_into(buffer, self.context())
+        self.assertLess(second, first)
+        self.assertEqual(len(buffer.getvalue()), second)
+        self.assertEqual(page_count(buffer.getvalue()), 1)
+
+
+class PurgeTests(TempStorageMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=3, months=MONTHS[:2])
+
+    def setUp(self):
+        super().setUp()
+        self.store_pdfs(Payslip.objects.all())
+        self.january = select_payslips(period_contains='Jan-2025')
+        self.names = sorted(self.january.values_list('pdf_file', flat=True))
+
+    def stored(self, name):
+        return get_payslip_storage().exists(name)
+
+    def test_dry_run_changes_nothing(self):
+        report = purge_payslips(self.january, dry_run=True)
+        self.assertEqual((report['rows'], report['files_missing']), (3, 0))
+        self.assertEqual(Payslip.objects.count(), 6)
+        self.assertTrue(all(self.stored(name) for name in self.names))
+
+    def test_delete_in_batches(self):
+        report = purge_payslips(self.january, batch_size=2, workers=2)
+        self.assertEqual((report['rows'], report['files_removed'], report['errors']), (3, 3, []))
+        self.assertEqual(Payslip.objects.count(), 3)
+        self.assertFalse(any(self.stored(name) for name in self.names))
+        self.assertFalse(PeriodSummary.objects.filter(pay_period__contains='Jan-2025').exists())
+        self.assertEqual(PeriodSummary.objects.get().headcount, 3)
+
+    def test_archive(self):
+        with self.settings(PAYSLIP_ARCHIVE_ROOT=os.path.join(self.root, 'archive')):
+            report = purge_payslips(self.january, archive=True)
+        self.assertEqual((report['rows'], report['files_moved']), (3, 3))
+        self.assertFalse(any(self.stored(name) for name in self.names))
+        for name in self.names:
+            self.assertTrue(os.path.exists(os.path.join(report['archive_path'], name)))
+        with open(os.path.join(report['archive_path'], 'ledger.csv'), encoding='utf-8') as ledger:
+            lines = ledger.read().splitlines()
+        self.assertTrue(lines[0].startswith('Payslip ID,Employee ID'))
+        self.assertEqual(len(lines), 1 + 3)
+
+    def test_orphans(self):
+        orphan = save_pdf('left_behind.pdf', ContentFile(b'%PDF-orphan'))
+        missing = Payslip.objects.filter(pay_period__contains='Feb-2025').first()
+        get_payslip_storage().delete(missing.pdf_file.name)
+
+        orphan_files, missing_rows = find_orphans()
+        self.assertEqual(orphan_files, [orphan])
+        self.assertEqual(missing_rows, [missing.id])
+
+        report = remove_orphans(orphan_files)
+        self.assertEqual(report['files_removed'], 1)
+        self.assertFalse(self.stored(orphan))
+
+
+class PackTests(TempStorageMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=3, months=MONTHS[:1])
+
+    def setUp(self):
+        super().setUp()
+        self.store_pdfs(Payslip.objects.all())
+
+    def test_offsets_point_at_each_pdf(self):
+        loose = {payslip.id: payslip.pdf_file.name for payslip in Payslip.objects.all()}
+        self.assertEqual(pack_period(PERIOD), (3, 0))
+        for payslip in Payslip.objects.all():
+            self.assertTrue(payslip.is_packed)
+            self.assertEqual(read_packed_pdf(payslip), f'%PDF-{payslip.id}'.encode())
+            self.assertFalse(get_payslip_storage().exists(loose[payslip.id]))
+        # Still an ordinary ZIP
+        with zipfile.ZipFile(get_payslip_storage().path(payslip.pack_file)) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+
+    def test_appending_keeps_earlier_offsets(self):
+        pack_period(PERIOD)
+        packed = {payslip.id: (payslip.pack_offset, payslip.pack_length) for payslip in Payslip.objects.all()}
+        late = Payslip.objects.get(employee_id='E000')
+        late.pk = None
+        late.employee_id = 'E100'
+        late.pack_file, late.pack_offset, late.pack_length = '', None, None
+        late.save()
+        self.store_pdfs([late])
+
+        self.assertEqual(pack_period(PERIOD), (1, 0))
+        for payslip in Payslip.objects.exclude(id=late.id):
+            self.assertEqual((payslip.pack_offset, payslip.pack_length), packed[payslip.id])
+            self.assertEqual(read_packed_pdf(payslip), f'%PDF-{payslip.id}'.encode())
+        self.assertEqual(read_packed_pdf(Payslip.objects.get(id=late.id)), f'%PDF-{late.id}'.encode())
+
+    def test_download_packed_pdf(self):
+        pack_period(PERIOD)
+        payslip = Payslip.objects.first()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('download_payslip', args=[payslip.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, f'%PDF-{payslip.id}'.encode())
+
+    def test_command_needs_local_storage(self):
+        with mock.patch('myapp.packs.is_local_storage', return_value=False):
+            with self.assertRaises(CommandError):
+                call_command('pack_payslips', '--pay-period', PERIOD, stdout=io.StringIO())
+        self.assertFalse(Payslip.objects.exclude(pack_file='').exists())
+
+
+class RerenderTests(TempStorageMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=3, months=MONTHS[:1])
+
+    def setUp(self):
+        super().setUp()
+        self.store_pdfs(Payslip.objects.all())
+        self.checkpoint = os.path.join(self.root, 'checkpoint.json')
+
+    def rerender(self, *args):
+        out = io.StringIO()
+        call_command('rerender_payslips', '--workers', '1', '--checkpoint', self.checkpoint, *args, stdout=out)
+        return out.getvalue()
+
+    def assertRerendered(self, payslip):
+        payslip.refresh_from_db()
+        self.assertEqual(payslip.layout_version, LAYOUT_VERSION)
+        with open_pdf(payslip.pdf_file.name) as handle:
+            pdf_bytes = handle.read()
+        self.assertEqual(page_count(pdf_bytes), 1)
+        self.assertEqual(pdf_digest(pdf_bytes), (payslip.pdf_sha256, payslip.pdf_size))
+
+    def test_dry_run_only_counts(self):
+        self.assertIn('3 payslip(s) older than layout', self.rerender('--dry-run'))
+        self.assertEqual(stale_payslips().count(), 3)
+
+    def test_rerender_replaces_old_pdfs(self):
+        old_names = list(Payslip.objects.values_list('pdf_file', flat=True))
+        self.assertIn('Re-rendered 3 payslip(s)', self.rerender('--batch-size', '2'))
+        self.assertFalse(stale_payslips().exists())
+        for payslip in Payslip.objects.all():
+            self.assertRerendered(payslip)
+        self.assertFalse(any(get_payslip_storage().exists(name) for name in old_names))
+        # A finished run starts over next time
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resumes_after_checkpoint(self):
+        first, *rest = Payslip.objects.order_by('id')
+        save_checkpoint(self.checkpoint, first.id, 1)
+        self.assertIn('(resuming after id', self.rerender())
+        self.assertEqual(list(stale_payslips()), [first])
+        for payslip in rest:
+            self.assertRerendered(payslip)
+
+    def test_checkpoint_of_older_layout_is_ignored(self):
+        with open(self.checkpoint, 'w') as handle:
+            json.dump({'layout_version': LAYOUT_VERSION - 1, 'last_id': 10 ** 6}, handle)
+        self.assertEqual(load_checkpoint(self.checkpoint), 0)
+
+    def test_admin_edit_queues_a_rerender(self):
+        self.rerender()
+        payslip = Payslip.objects.first()
+        self.client.force_login(self.user)
+        post_admin_change(self.client, payslip, employee_name='Renamed Employee')
+        self.assertEqual(list(stale_payslips()), [payslip])
+        self.rerender()
+        self.assertRerendered(payslip)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class EmployeeTests(TempStorageMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=2, months=MONTHS[:1])
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_remember_employee(self):
+        created = remember_employee('E100', 'New Starter', 25000, '750.50')
+        self.assertEqual((created.basic_salary, created.default_incentive), (Decimal(25000), Decimal('750.50')))
+
+        Employee.objects.filter(id=created.id).update(is_active=False)
+        updated = remember_employee('E100', 'New Starter', 26000, 750)
+        self.assertEqual(updated.id, created.id)
+        self.assertTrue(updated.is_active)
+        self.assertEqual(Employee.objects.get(id=created.id).basic_salary, Decimal(26000))
+
+    def test_save_view_links_and_updates_the_master_row(self):
+        form = payslip_form('E001', 40000, employee_name='Employee One', incentive='900')
+        response = self.client.post(reverse('save_payslip_to_database'), json.dumps(form),
+                                    content_type='application/json')
+        self.assertTrue(response.json()['success'], response.json())
+        employee = Employee.objects.get(employee_id='E001')
+        self.assertEqual((employee.name, employee.basic_salary, employee.default_incentive),
+                         ('Employee One', Decimal(40000), Decimal(900)))
+        self.assertEqual(Payslip.objects.get(id=response.json()['payslip_id']).employee_record, employee)
+
+    def test_prefill_is_cached_until_an_employee_changes(self):
+        employees = self.client.get(reverse('employee_prefill')).json()['employees']
+        self.assertEqual([row['employee_id'] for row in employees], ['E000', 'E001'])
+        with self.assertNumQueries(0):
+            self.assertEqual(employee_prefill(), employees)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Employee.objects.get(employee_id='E001').delete()
+        self.assertEqual([row['employee_id'] for row in employee_prefill()], ['E000'])
+
+    def test_search_follows_the_master_row(self):
+        # The payslip keeps the name it was printed with
+        Employee.objects.filter(employee_id='E001').update(name='Renamed Person')
+        payslip = Payslip.objects.get(employee_id='E001')
+        self.assertEqual(list(matching_employees('renamed')), [payslip.employee_record])
+        response = self.client.get(reverse('view_payslips'), {'search_name': 'Renamed'})
+        self.assertEqual([p.id for p in response.context['payslips']], [payslip.id])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class IdempotencyTests(TempStorageMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def post(self, name, form, key='retry-1'):
+        return self.client.post(reverse(name), json.dumps(form), content_type='application/json',
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_save_is_replayed(self):
+        first = self.post('save_payslip_to_database', payslip_form())
+        self.assertTrue(first.json()['success'], first.json())
+        with mock.patch('myapp.views.render_payslip_bytes') as render:
+            retry = self.post('save_payslip_to_database', payslip_form())
+        render.assert_not_called()
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['payslip_id'], first.json()['payslip_id'])
+        self.assertEqual(Payslip.objects.count(), 1)
+
+    def test_download_is_replayed(self):
+        first = self.post('generate_pdf_download', payslip_form())
+        self.assertEqual(first['Content-Type'], 'application/pdf')
+        retry = self.post('generate_pdf_download', payslip_form())
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Content-Disposition'], first['Content-Disposition'])
+
+    def test_key_reused_for_another_body(self):
+        self.post('save_payslip_to_database', payslip_form())
+        response = self.post('save_payslip_to_database', payslip_form(basic_salary=30000))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Payslip.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        self.post('save_payslip_to_database', payslip_form())
+        self.client.force_login(User.objects.create_superuser('other', 'other@example.com', 'password'))
+        response = self.post('save_payslip_to_database', payslip_form('E002'))
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Payslip.objects.count(), 2)
+
+    def test_failed_request_is_not_stored(self):
+        invalid = payslip_form(income_tax='abc')
+        failed = self.post('save_payslip_to_database', invalid)
+        self.assertFalse(failed.json()['success'])
+        response = self.post('save_payslip_to_database', invalid)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_request_in_flight(self):
+        key = f'idempotency:save_payslip_to_database:{self.user.pk}:retry-1:lock'
+        caches['default'].add(key, 'fingerprint')
+        with mock.patch('myapp.idempotency.IDEMPOTENCY_WAIT', 0):
+            response = self.post('save_payslip_to_database', payslip_form())
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Payslip.objects.exists())
+
+    def test_invalid_key(self):
+        response = self.post('save_payslip_to_database', payslip_form(), key='not a key!')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class FragmentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=1, months=MONTHS[:1])
+        cls.payslip = Payslip.objects.get()
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_every_layout_label_is_rendered(self):
+        html = render_payslip_fragment(context_from_payslip(self.payslip))
+        labels = [label for label, key in PAYSLIP_LAYOUT['statement']['fields']]
+        for table in PAYSLIP_LAYOUT['amount_tables']:
+            labels += [table['title'], table['total'][0]] + [label for label, key in table['rows']]
+        for label in labels + [PAYSLIP_LAYOUT['net_payable']['title'], PAYSLIP_LAYOUT['year_to_date']['title']]:
+            self.assertIn(label, html)
+        self.assertIn(self.payslip.pay_period, html)
+        self.assertIn(f'{CURRENCY_SYMBOL} {self.payslip.net_payable}', html)
+
+    def test_year_to_date_only_when_known(self):
+        context = context_from_payslip(self.payslip)
+        context['ytd_gross_earnings'] = None
+        self.assertNotIn('ytd-section', render_payslip_fragment(context))
+
+    def test_values_are_escaped(self):
+        context = context_from_payslip(self.payslip)
+        context['employee_name'] = '<script>alert(1)</script>'
+        html = render_payslip_fragment(context)
+        self.assertNotIn('<script>', html)
+        self.assertIn('&lt;script&gt;', html)
+
+    def test_cached_until_the_row_changes(self):
+        html = cached_payslip_fragment(self.payslip)
+        with mock.patch('myapp.fragments.render_payslip_fragment') as render:
+            self.assertEqual(cached_payslip_fragment(self.payslip), html)
+        render.assert_not_called()
+
+        self.payslip.employee_name = 'Renamed Employee'
+        self.payslip.save()
+        self.assertIn('Renamed Employee', cached_payslip_fragment(self.payslip))
+
+    def test_detail_page_embeds_the_fragment(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('payslip_detail', args=[self.payslip.id]))
+        self.assertContains(response, cached_payslip_fragment(self.payslip), html=True)
+
+
+class AuditTests(TempStorageMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=4, months=MONTHS[:1])
+
+    def setUp(self):
+        super().setUp()
+        self.store_pdfs(Payslip.objects.all())
+        audit_payslips(workers=2, record=True, orphans=False)
+        self.first, self.second, *_ = Payslip.objects.order_by('id')
+
+    def overwrite(self, payslip, data):
+        with open(get_payslip_storage().path(payslip.pdf_file.name), 'wb') as handle:
+            handle.write(data)
+
+    def test_record_then_all_ok(self):
+        self.assertTrue(all(payslip.pdf_sha256 for payslip in Payslip.objects.all()))
+        report = audit_payslips(workers=2, record=True)
+        self.assertEqual((report['checked'], report['ok'], report['unrecorded'], report['recorded']), (4, 4, 0, 0))
+        self.assertEqual((report['mismatched'], report['missing'], report['orphaned']), ([], [], []))
+
+    def test_tampered_and_missing_files(self):
+        # Same size, different bytes: only the digest can tell
+        data = f'%PDF-{self.first.id}'.encode()
+        self.overwrite(self.first, data[:-1] + b'X')
+        get_payslip_storage().delete(self.second.pdf_file.name)
+        for local in (True, False):
+            with mock.patch('myapp.integrity.is_local_storage', return_value=local):
+                report = audit_payslips(workers=2, orphans=False)
+            self.assertEqual((report['mismatched'], report['missing'], report['ok']), ([self.first.id], [self.second.id], 2))
+
+    def test_empty_file(self):
+        self.overwrite(self.first, b'')
+        self.assertEqual(audit_payslips(orphans=False)['mismatched'], [self.first.id])
+
+    def test_packed_slices(self):
+        pack_period(PERIOD)
+        report = audit_payslips(workers=2, batch_size=3, orphans=False)
+        self.assertEqual((report['checked'], report['ok']), (4, 4))
+
+        packed = Payslip.objects.get(id=self.first.id)
+        with open(get_payslip_storage().path(packed.pack_file), 'r+b') as handle:
+            handle.seek(packed.pack_offset)
+            handle.write(b'X')
+        self.assertEqual(audit_payslips(orphans=False)['mismatched'], [self.first.id])
+
+    def test_command_lists_bad_ids(self):
+        get_payslip_storage().delete(self.second.pdf_file.name)
+        out = io.StringIO()
+        call_command('audit_payslips', '--skip-orphans', stdout=out)
+        self.assertIn('Missing: 1', out.getvalue())
+        self.assertIn(f'ids: {self.second.id}', out.getvalue())
+
+
+class ProfilerTests(TempStorageMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        super().setUp()
+        override = self.settings(PAYSLIP_PROFILE_ROOT=os.path.join(self.root, 'profiles'))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client.force_login(self.user)
+
+    def profile(self, **extra):
+        return self.client.get(reverse('dashboard'), {'_profile': '1'}, **extra)
+
+    def test_superuser_request_is_profiled(self):
+        response = self.profile()
+        self.assertEqual(response.status_code, 200)
+        name = response['X-Profile']
+        meta = recent_profiles()[0]
+        self.assertEqual((meta['name'], meta['status'], meta['user']), (name, 200, 'admin'))
+        self.assertGreater(meta['peak_bytes'], 0)
+        for kind in PROFILE_KINDS:
+            self.assertIsNotNone(profile_path(name, kind))
+
+        download = self.client.get(reverse('download_profile', args=[name, 'speedscope']))
+        self.assertEqual(json.loads(b''.join(download.streaming_content))['exporter'], 'payslip-profiler')
+        self.assertContains(self.client.get(reverse('profiles')), name)
+
+    def test_header_also_asks_for_a_profile(self):
+        response = self.client.get(reverse('dashboard'), HTTP_X_PROFILE='1')
+        self.assertIn('X-Profile', response)
+
+    def test_only_on_request(self):
+        self.assertNotIn('X-Profile', self.client.get(reverse('dashboard')))
+        self.assertEqual(recent_profiles(), [])
+
+    def test_other_users_are_not_profiled(self):
+        staff = User.objects.create_user('clerk', 'clerk@example.com', 'password', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('employee_prefill'), {'_profile': '1'})
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(recent_profiles(), [])
+
+    def test_old_profiles_are_pruned(self):
+        with self.settings(PAYSLIP_PROFILE_KEEP=1):
+            first = self.profile()['X-Profile']
+            second = self.profile()['X-Profile']
+        self.assertEqual([meta['name'] for meta in recent_profiles()], [second])
+        self.assertIsNone(profile_path(first, 'collapsed'))
+
+    def test_unknown_profile(self):
+        for name, kind in [('missing', 'collapsed'), ('..', 'meta'), (self.profile()['X-Profile'], 'flamegraph')]:
+            response = self.client.get(reverse('download_profile', args=[name, kind]))
+            self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadTestTests(TempStorageMixin, TransactionTestCase):
+    """The simulated users run on their own threads, so their writes must really commit"""
+
+    def setUp(self):
+        super().setUp()
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def test_percentile(self):
+        ordered = list(range(1, 101))
+        self.assertEqual([percentile(ordered, f) for f in (0.5, 0.95, 0.99, 1.0)], [50, 95, 99, 100])
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_stats_error_rate(self):
+        stats = LoadStats()
+        stats.record('login', 0.1)
+        stats.record('login', 0.3, error='login failed (HTTP 200)')
+        row = stats.summary()['endpoints'][0]
+        self.assertEqual((row['requests'], row['errors'], row['error_rate']), (2, 1, 0.5))
+        self.assertEqual(stats.summary()['error_samples'], {'login': ['login failed (HTTP 200)']})
+
+    def test_in_process_run(self):
+        # One user: the in-memory SQLite test database locks whole tables,
+        # so concurrent writers here would only measure that
+        result = run_load_test('admin', 'password', users=1, iterations=2)
+        self.assertEqual(result['total']['errors'], 0, result['error_samples'])
+        self.assertEqual([row['endpoint'] for row in result['endpoints']], ENDPOINTS)
+        requests = {row['endpoint']: row['requests'] for row in result['endpoints']}
+        self.assertEqual(requests, {'login': 1, **{endpoint: 2 for endpoint in ENDPOINTS[1:]}})
+        # The run cleans up after itself
+        self.assertEqual(result['cleanup'], {'payslips': 2, 'employees': 2})
+        self.assertFalse(Payslip.objects.exists())
+        self.assertFalse(Employee.objects.exists())
+
+    def test_wrong_password(self):
+        result = run_load_test('admin', 'wrong', users=1, iterations=1, cleanup=False)
+        self.assertEqual([row['endpoint'] for row in result['endpoints']], ['login'])
+        self.assertEqual(result['total']['error_rate'], 1.0)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('load_test', '--username', 'admin', '--password', 'password', '--users', '1',
+                     '--iterations', '1', '--keep', stdout=out)
+        self.assertIn('save_payslip_to_database', out.getvalue())
+        self.assertEqual(Payslip.objects.count(), 1)
+        with self.assertRaises(CommandError):
+            call_command('load_test', '--username', 'admin', '--password', 'password', '--users', '0')
+
+
+class StaticAssetTests(TestCase):
+    """Pages against a real collectstatic run: hashed names, precompressed copies, far-future caching"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        override = override_settings(STATIC_ROOT=static_root)
+        override.enable()
+        cls.addClassCleanup(override.disable)
+        # Compressing the admin's assets and the PDF fonts (which no page
+        # links) would take most of the run
+        call_command('collectstatic', interactive=False, verbosity=0, ignore_patterns=['admin', 'fonts'])
+        cls.static_root = static_root
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=1, months=MONTHS[:1])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def page_assets(self, content):
+        return re.findall(r'(?:href|src)="(/static/[^"]+)"', content.decode())
+
+    def test_pages_link_hashed_files(self):
+        payslip = Payslip.objects.get()
+        for url in [reverse('dashboard'), reverse('view_payslips'), reverse('payslip_detail', args=[payslip.id])]:
+            content = self.client.get(url).content
+            # Page CSS and JS live in static files now
+            self.assertNotIn(b'<style', content)
+            self.assertIsNone(re.search(rb'<script(?![^>]*(?:\bsrc=|application/json))[^>]*>', content))
+            assets = self.page_assets(content)
+            self.assertTrue(assets)
+            for asset in assets:
+                self.assertRegex(asset, r'\.[0-9a-f]{12}\.(css|js|png)$')
+
+    def test_precompressed_copies(self):
+        asset = self.page_assets(self.client.get(reverse('dashboard')).content)[0]
+        path = os.path.join(self.static_root, asset[len('/static/'):])
+        with open(path, 'rb') as original, open(f'{path}.gz', 'rb') as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()), original.read())
+        if brotli is not None:
+            self.assertTrue(os.path.exists(f'{path}.br'))
+
+    def test_served_with_immutable_caching(self):
+        asset = self.page_assets(self.client.get(reverse('dashboard')).content)[0]
+        response = self.client.get(asset, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=2, months=MONTHS[:1])
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_login(self.user)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 32
+
+    def x_cache(self, name='view_payslips', *args, **params):
+        return self.client.get(reverse(name, args=args), params).get('X-Cache')
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self.x_cache(), 'MISS')
+        with self.assertNumQueries(2):
+            # Only the session and user lookups
+            self.assertEqual(self.x_cache(), 'HIT')
+        self.assertEqual(self.x_cache(search_name='E001'), 'MISS')
+        payslip = Payslip.objects.first()
+        self.assertEqual(self.x_cache('payslip_detail', payslip.id), 'MISS')
+        self.assertEqual(self.x_cache('payslip_detail', payslip.id), 'HIT')
+
+        stats = self.client.get(reverse('page_cache_stats')).json()['pages']
+        self.assertEqual(stats['view_payslips'], {'hits': 1, 'misses': 2, 'hit_ratio': 1 / 3})
+
+    def test_write_bumps_the_data_version(self):
+        self.x_cache()
+        payslip = Payslip.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            payslip.employee_name = 'Renamed Employee'
+            payslip.save()
+        response = self.client.get(reverse('view_payslips'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Renamed Employee')
+
+    def test_pages_are_per_user_and_csrf_cookie(self):
+        self.x_cache()
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'b' * 32
+        self.assertEqual(self.x_cache(), 'MISS')
+        self.client.force_login(User.objects.create_superuser('other', 'other@example.com', 'password'))
+        self.assertEqual(self.x_cache(), 'MISS')
+
+    def test_not_cached_without_csrf_cookie(self):
+        del self.client.cookies[settings.CSRF_COOKIE_NAME]
+        self.assertIsNone(self.x_cache())
+        # That response set the cookie, so from here on the page is cached
+        self.assertIn(settings.CSRF_COOKIE_NAME, self.client.cookies)
+        self.assertEqual(self.x_cache(), 'MISS')
+
+
+class LookupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        create_payslips(cls.user, employees=3, months=MONTHS[:2])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def pairs(self):
+        """Every stored pair, Feb before Jan, plus one that has no payslip"""
+        pairs = [(f'E{e:03d}', f'1-{name}-2025 to 28-{name}-2025') for name in reversed(MONTHS[:2]) for e in range(3)]
+        return pairs + [('E999', PERIOD)]
+
+    def post(self, body, **headers):
+        return self.client.post(reverse('lookup_payslips'), body, content_type='application/json', **headers)
+
+    def test_chunks_keep_request_order(self):
+        pairs = self.pairs()
+        # Six stored pairs and a missing one, two per query; the repeat costs nothing
+        with self.assertNumQueries(4):
+            results = lookup_payslips(pairs + pairs[:1], chunk_size=2)
+        self.assertEqual([(r['employee_id'], r['pay_period']) for r in results], pairs + pairs[:1])
+        self.assertEqual([r['exists'] for r in results], [True] * 6 + [False, True])
+        for result in results[:6]:
+            payslip = Payslip.objects.get(employee_id=result['employee_id'], pay_period=result['pay_period'])
+            self.assertEqual((result['payslip_id'], result['net_payable']), (payslip.id, payslip.net_payable))
+
+    def test_lowest_id_wins(self):
+        original = Payslip.objects.get(employee_id='E000', pay_period=PERIOD)
+        duplicate = Payslip.objects.get(id=original.id)
+        duplicate.pk = None
+        duplicate.save()
+        self.assertEqual(lookup_payslips([('E000', PERIOD)])[0]['payslip_id'], original.id)
+
+    def test_gzipped_request(self):
+        data = {'pairs': [{'employee_id': e, 'pay_period': p} for e, p in self.pairs()]}
+        response = self.post(gzip.compress(json.dumps(data).encode()), HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual([r['exists'] for r in response.json()['results']], [True] * 6 + [False])
+
+    def test_too_many_pairs(self):
+        data = {'pairs': [{'employee_id': e, 'pay_period': p} for e, p in self.pairs()]}
+        with mock.patch('myapp.lookups.LOOKUP_MAX_PAIRS', 6):
+            response = self.post(json.dumps(data))
+        self.assertEqual(response.status_code, 413)
+
+    def test_decompressed_size_is_bounded(self):
+        bomb = gzip.compress(b' ' * (LOOKUP_MAX_BODY_BYTES + 1))
+        response = self.post(bomb, HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 413)
+
+    def test_bad_requests(self):
+        for body, headers, status in [
+            ('{"pairs": [{"employee_id": "E000"}]}', {}, 400),
+            ('{"pairs": ', {}, 400),
+            (b'not gzip', {'HTTP_CONTENT_ENCODING': 'gzip'}, 400),
+            ('{"pairs": []}', {'HTTP_CONTENT_ENCODING': 'br'}, 415),
+        ]:
+            self.assertEqual(self.post(body, **headers).status_code, status, body)
+
+
+class BackupTests(TempStorageMixin, TransactionTestCase):
+    """The SQLite copy needs committed data, so no per-test transaction here"""
+
+    def setUp(self):
+        super().setUp()
+        create_payslips(User.objects.create_superuser('admin', 'admin@example.com', 'password'),
+                        employees=3, months=MONTHS[:1])
+        override = self.settings(PAYSLIP_BACKUP_ROOT=os.path.join(self.root, 'backups'))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.store_pdfs(Payslip.objects.all())
+        self.names = sorted(Payslip.objects.values_list('pdf_file', flat=True))
+
+    def backup(self, hour):
+        # Snapshots are named by the second they were taken
+        created = timezone.make_aware(datetime.datetime(2025, 10, 31, hour))
+        with mock.patch('myapp.backup.timezone.localtime', return_value=created):
+            return create_backup(workers=2)
+
+    def stored_path(self, name):
+        return get_payslip_storage().path(name)
+
+    def test_incremental_and_content_addressed(self):
+        # A second file with the same content shares its object
+        save_pdf('copy.pdf', ContentFile(open(self.stored_path(self.names[0]), 'rb').read()))
+        first = self.backup(1)
+        self.assertEqual(first['database']['vendor'], 'sqlite')
+        self.assertEqual(first['stats']['files'], 4)
+        self.assertEqual((first['stats']['hashed'], first['stats']['copied']), (4, 3))
+        payslip = Payslip.objects.get(pdf_file=self.names[0])
+        self.assertEqual(first['files'][self.names[0]]['sha256'], hashlib.sha256(f'%PDF-{payslip.id}'.encode()).hexdigest())
+
+        second = self.backup(2)
+        self.assertEqual((second['stats']['hashed'], second['stats']['copied_bytes']), (0, 0))
+
+        with open(self.stored_path(self.names[1]), 'ab') as handle:
+            handle.write(b' changed')
+        third = self.backup(3)
+        self.assertEqual((third['stats']['hashed'], third['stats']['copied']), (1, 1))
+        self.assertEqual([manifest['name'] for manifest in list_snapshots()],
+                         ['20251031-030000', '20251031-020000', '20251031-010000'])
+
+        report = prune_backups(1)
+        self.assertEqual(report, {'snapshots_removed': ['20251031-020000', '20251031-010000'], 'objects_removed': 1})
+        self.assertEqual(verify_snapshot()['problems'], [])
+
+    def test_verify_only(self):
+        manifest = self.backup(1)
+        out = io.StringIO()
+        call_command('restore_payslips', '--verify-only', stdout=out)
+        self.assertIn('Snapshot verified', out.getvalue())
+
+        entry = manifest['files'][self.names[0]]
+        with open(object_path(backup_root(), entry['sha256']), 'ab') as handle:
+            handle.write(b'bitrot')
+        os.remove(object_path(backup_root(), manifest['files'][self.names[1]]['sha256']))
+        err = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '2 problem(s) found'):
+            call_command('restore_payslips', manifest['name'], '--verify-only', stdout=io.StringIO(), stderr=err)
+        self.assertIn(f'{self.names[0]}: object', err.getvalue())
+        self.assertIn('is missing', err.getvalue())
+        # Nothing is restored from a bad snapshot
+        with self.assertRaises(BackupError):
+            restore_snapshot(target=os.path.join(self.root, 'restore'))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'restore')))
+
+    def test_restore_to_directory(self):
+        self.backup(1)
+        target = os.path.join(self.root, 'restore')
+        out = io.StringIO()
+        call_command('restore_payslips', '--target', target, stdout=out)
+        self.assertIn('Restore verified', out.getvalue())
+        for name in self.names:
+            with open(os.path.join(target, 'media', name), 'rb') as restored, open(self.stored_path(name), 'rb') as live:
+                self.assertEqual(restored.read(), live.read())
+        copy = sqlite3.connect(os.path.join(target, 'db.sqlite3'))
+        try:
+            self.assertEqual(copy.execute(f'SELECT COUNT(*) FROM "{Payslip._meta.db_table}"').fetchone()[0], 3)
+        finally:
+            copy.close()
+
+    def test_not_inside_a_transaction(self):
+        with transaction.atomic():
+            with self.assertRaises(BackupError):
+                self.backup(1)
+        self.assertEqual(list_snapshots(), [])
+
+    def test_unknown_snapshot(self):
+        with self.assertRaisesMessage(CommandError, 'No backups'):
+            call_command('restore_payslips', '--verify-only', stdout=io.StringIO())
+        self.backup(1)
+        with self.assertRaisesMessage(CommandError, 'No complete snapshot'):
+            call_command('restore_payslips', '../snapshots', '--verify-only', stdout=io.StringIO())
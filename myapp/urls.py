@@ -5,13 +5,25 @@ urlpatterns = [
     path('', views.login_view, name='login'),
     path('login/', views.login_view, name='login'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('api/employees/prefill/', views.employee_prefill_api, name='employee_prefill'),
     path('logout/', views.logout_view, name='logout'),
     path('generate-payslip/', views.generate_payslip, name='generate_payslip'),
+    path('api/payslips/lookup/', views.lookup_payslips_api, name='lookup_payslips'),
+    path('api/payslips/check-run/', views.check_payroll_run_api, name='check_payroll_run'),
     path('payslip-preview/', views.payslip_preview, name='payslip_preview'),
     path('generate-pdf-download/', views.generate_pdf_download, name='generate_pdf_download'),
     path('save-payslip-to-database/', views.save_payslip_to_database, name='save_payslip_to_database'),
     path('view-payslips/', views.view_payslips, name='view_payslips'),
     path('check-existing-payslip/', views.check_existing_payslip, name='check_existing_payslip'),
     path('payslip/<int:payslip_id>/', views.payslip_detail, name='payslip_detail'),
+    path('payslip/<int:payslip_id>/download/', views.download_payslip, name='download_payslip'),
     path('delete-payslip/<int:payslip_id>/', views.delete_payslip, name='delete_payslip'),
+    path('bulk-delete-payslips/', views.bulk_delete_payslips, name='bulk_delete_payslips'),
+    path('email-payslips/', views.email_payslips, name='email_payslips'),
+    path('export-payslips/', views.export_payslips, name='export_payslips'),
+    path('reports/payroll/', views.payroll_report, name='payroll_report'),
+    path('api/reports/payroll/', views.payroll_report_api, name='payroll_report_api'),
+    path('api/cache-stats/', views.page_cache_stats_api, name='page_cache_stats'),
+    path('profiles/', views.profiles_view, name='profiles'),
+    path('profiles/<str:name>/<str:kind>/', views.download_profile, name='download_profile'),
 ]
@@ -2,354 +2,85 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, FileResponse, StreamingHttpResponse, Http404
 from django.template.loader import render_to_string
 from django.conf import settings
-from django.db.models import Q
-from .models import Payslip
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from django.core.files import File
+from django.utils.text import slugify
+from django.db import transaction
+from django.db.models import Q, Sum
+from .models import Payslip, PeriodSummary
+from .anomalies import ANOMALY_CHUNK_SIZE, ANOMALY_MAX_BODY_BYTES, ANOMALY_MAX_ROWS, check_payroll_run
+from .backends import is_login_throttled
+from .cache import cached_page, page_cache_stats
+from .distribution import EmailJobRunning, distribute_payslips, start_email_job
+from .employees import employee_prefill, matching_employees, remember_employee
+from .exports import iter_csv, write_xlsx
+from .fragments import cached_payslip_fragment, render_payslip_fragment
+from .idempotency import idempotent
+from .integrity import pdf_digest
+from .lookups import (
+    LOOKUP_CHUNK_SIZE, LOOKUP_MAX_PAIRS, BatchLookupError, decode_body, lookup_payslips, parse_pairs,
+)
+from .packs import payslip_pdf_available, read_packed_pdf, remove_unreferenced_packs
+from .pdf import LAYOUT_VERSION, render_payslip, render_payslip_bytes
+from .profiling import PROFILE_KINDS, profile_path, recent_profiles
+from .purge import select_payslips, purge_payslips
+from .querybudget import query_budget
+from .reports import payroll_summary
+from .storage import save_pdf, delete_pdf, open_pdf, is_local_storage
+from .summaries import add_payslip, remove_payslip
+from .ytd import add_payslip_ytd, remove_payslip_ytd, ytd_snapshot, fiscal_year_label
+import io
 import os
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
 
+MONTH_ABBREVIATIONS = [
+    ('01', 'Jan'), ('02', 'Feb'), ('03', 'Mar'), ('04', 'Apr'),
+    ('05', 'May'), ('06', 'Jun'), ('07', 'Jul'), ('08', 'Aug'),
+    ('09', 'Sep'), ('10', 'Oct'), ('11', 'Nov'), ('12', 'Dec'),
+]
+
+def pay_period_month_year(pay_period):
+    """Extract ('10', '2025') from a pay period like "1-Oct-2025 to 30-Oct-2025" """
+    if ' to ' in pay_period:
+        date_part = pay_period.split(' to ')[0]  # Get "1-Oct-2025"
+        if '-' in date_part:
+            parts = date_part.split('-')
+            if len(parts) >= 2:
+                month_name = parts[1]
+                year = parts[2] if len(parts) > 2 else ''
+                for num, name in MONTH_ABBREVIATIONS:
+                    if name == month_name:
+                        return num, year
+    return None, ''
+
+def filter_payslips(search_name, filter_month, filter_year):
+    """Apply the View Payslips filters; returns (queryset, month abbreviation or '')"""
+    # Start with all payslips
+    payslips = Payslip.objects.all().order_by('-created_at')
 
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase import pdfmetrics
-
-# Register DejaVu Sans font for Unicode support including rupee symbol
-try:
-    font_path = os.path.join(settings.BASE_DIR, 'myapp', 'static', 'fonts', 'DejaVuSans.ttf')
-    bold_font_path = os.path.join(settings.BASE_DIR, 'myapp', 'static', 'fonts', 'DejaVuSans-Bold.ttf')
-    if os.path.exists(font_path):
-        pdfmetrics.registerFont(TTFont('DejaVuSans', font_path))
-        if os.path.exists(bold_font_path):
-            pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', bold_font_path))
-            FONT_NAME = 'DejaVuSans-Bold'
-        else:
-            FONT_NAME = 'DejaVuSans'
-    else:
-        # Fallback to Helvetica if DejaVu not available
-        FONT_NAME = 'Helvetica-Bold'
-except:
-    # Ultimate fallback
-    FONT_NAME = 'Helvetica-Bold'
-
-def generate_payslip_pdf(filepath, context):
-    """Generate PDF payslip using ReportLab - matching HTML preview design"""
-
-    doc = SimpleDocTemplate(
-        filepath,
-        pagesize=A4,
-        rightMargin=10,
-        leftMargin=40,
-        topMargin=40,
-        bottomMargin=40,
-        encoding='utf-8'
-    )
-    elements = []
-    styles = getSampleStyleSheet()
-
-    # Custom styles matching HTML preview
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=colors.HexColor('#5b4d9e'),
-        spaceAfter=10,
-        alignment=TA_LEFT
-    )
-
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=5
-    )
-
-    # Two-column header: Company info (left) + Employee Statement (right)
-    logo_path = os.path.join(settings.BASE_DIR, 'myapp', 'static', 'images', 'VIS LOGO.png')
-
-    # Left column - Logo + Company info
-    company_info = []
-    if os.path.exists(logo_path):
-        logo = Image(logo_path, width=70, height=70)
-        logo.hAlign = 'LEFT'
-        company_info.append(logo)
-        company_info.append(Spacer(1, 6))
-
-    company_info.append(Paragraph('<b>VETRI IT SYSTEMS PVT LTD.,</b>', title_style))
-    company_info.append(Paragraph('Shanthi complex, Second floor,', normal_style))
-    company_info.append(Paragraph('Surandai, Tenkasi - 627 859', normal_style))
-    company_info.append(Paragraph('India', normal_style))
-
-    # Right column - Employee Statement
-    employee_info = []
-    employee_info.append(Spacer(1, 15))
-    employee_info.append(Paragraph('<b>Employee Statement</b>', title_style))
-
-    employee_text = f"""
-    <b>Employee Name:</b> {context['employee_name']}<br/>
-    <b>Employee ID:</b> {context['employee_id']}<br/>
-    <b>Pay Period:</b> {context['pay_period']}<br/>
-    <b>Paid Days:</b> {context['paid_days']}<br/>
-    <b>Loss of Pay Days:</b> {context['loss_of_pay_days']}<br/>
-    <b>Payment Date:</b> {context['payment_date']}
-    """
-
-    employee_info.append(Paragraph(employee_text, ParagraphStyle(
-        'EmployeeDetails',
-        parent=styles['Normal'],
-        fontSize=10,
-        leading=20,
-        spaceAfter=5,
-    )))
-
-    # Combine into two-column table
-    header_table = Table(
-        [[company_info, employee_info]],
-        colWidths=[250, 250]
-    )
-    header_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
-
-    elements.append(header_table)
-    elements.append(Spacer(1, 25))
-
-    # Earnings and Deductions tables (side-by-side with improved design)
-    # Use rupee symbol with proper encoding
-    rupee = '\u20B9'
-    earnings_data = [
-        ['Earnings', 'Amount'],
-        ['Basic', f'{rupee} {context["basic_salary"]}'],
-        ['Incentive', f'{rupee} {context["incentive"]}'],
-        ['Gross Earnings', f'{rupee} {context["gross_earnings"]}']
-    ]
-
-    deductions_data = [
-        ['Deduction', 'Amount'],
-        ['Income Tax', f'{rupee} {context["income_tax"]}'],
-        ['', ''],
-        ['Total Deduction', f'{rupee} {context["total_deduction"]}']
-    ]
-
-    earnings_table = Table(earnings_data, colWidths=[140, 100])
-    earnings_table.setStyle(TableStyle([
-        # Header row styling
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8f5e9')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('FONTNAME', (0, 0), (-1, 0), FONT_NAME),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        
-        # Body rows styling - use FONT_NAME for rupee symbol support
-        ('BACKGROUND', (0, 1), (-1, 2), colors.white),
-        ('TEXTCOLOR', (0, 1), (-1, 2), colors.black),
-        ('FONTNAME', (0, 1), (-1, 2), FONT_NAME),
-        ('FONTSIZE', (0, 1), (-1, 2), 9),
-        ('ALIGN', (0, 1), (0, 2), 'LEFT'),
-        ('ALIGN', (1, 1), (1, 2), 'RIGHT'),
-        
-        # Footer row styling (Gross Earnings)
-        ('BACKGROUND', (0, 3), (-1, 3), colors.HexColor('#5b4d9e')),
-        ('TEXTCOLOR', (0, 3), (-1, 3), colors.whitesmoke),
-        ('FONTNAME', (0, 3), (-1, 3), FONT_NAME),
-        ('FONTSIZE', (0, 3), (-1, 3), 10),
-        ('ALIGN', (0, 3), (0, 3), 'LEFT'),
-        ('ALIGN', (1, 3), (1, 3), 'RIGHT'),
-        
-        # Padding
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('LEFTPADDING', (0, 0), (-1, -1), 12),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
-        
-        # Borders
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#d0d0d0')),
-        ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor('#d0d0d0')),
-        ('LINEABOVE', (0, 3), (-1, 3), 1, colors.HexColor('#d0d0d0')),
-        ('ROUNDEDCORNERS', [8, 8, 8, 8])
-    ]))
-
-    deductions_table = Table(deductions_data, colWidths=[140, 100])
-    deductions_table.setStyle(TableStyle([
-        # Header row styling
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8f5e9')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('FONTNAME', (0, 0), (-1, 0), FONT_NAME),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        
-        # Body rows styling - use FONT_NAME for rupee symbol support
-        ('BACKGROUND', (0, 1), (-1, 2), colors.white),
-        ('TEXTCOLOR', (0, 1), (-1, 2), colors.black),
-        ('FONTNAME', (0, 1), (-1, 2), FONT_NAME),
-        ('FONTSIZE', (0, 1), (-1, 2), 9),
-        ('ALIGN', (0, 1), (0, 2), 'LEFT'),
-        ('ALIGN', (1, 1), (1, 2), 'RIGHT'),
-        
-        # Footer row styling (Total Deduction)
-        ('BACKGROUND', (0, 3), (-1, 3), colors.HexColor('#5b4d9e')),
-        ('TEXTCOLOR', (0, 3), (-1, 3), colors.whitesmoke),
-        ('FONTNAME', (0, 3), (-1, 3), FONT_NAME),
-        ('FONTSIZE', (0, 3), (-1, 3), 10),
-        ('ALIGN', (0, 3), (0, 3), 'LEFT'),
-        ('ALIGN', (1, 3), (1, 3), 'RIGHT'),
-        
-        # Padding
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('LEFTPADDING', (0, 0), (-1, -1), 12),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
-        
-        # Borders
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#d0d0d0')),
-        ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor('#d0d0d0')),
-        ('LINEABOVE', (0, 3), (-1, 3), 1, colors.HexColor('#d0d0d0')),
-        ('ROUNDEDCORNERS', [8, 8, 8, 8])
-    ]))
-
-    # Place tables side by side with proper spacing
-    combined_table = Table([[earnings_table, Spacer(1, 20), deductions_table]], colWidths=[240, 20, 240])
-    combined_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    elements.append(combined_table)
-    elements.append(Spacer(1, 30))
-
-    # Net Payable section with new design
-    # Create two separate paragraphs for title and subtitle
-    title_style = ParagraphStyle(
-        'NetPayableTitle',
-        parent=styles['Normal'],
-        fontSize=13,
-        fontName=FONT_NAME,
-        textColor=colors.black,
-        leading=16,
-        fontWeight='BOLD'
-    )
-    subtitle_style = ParagraphStyle(
-        'NetPayableSubtitle',
-        parent=styles['Normal'],
-        fontSize=9,
-        fontName='Helvetica',
-        textColor=colors.HexColor('#666666'),
-        leading=12
-    )
-    
-    title_para = Paragraph('TOTAL NET PAYABLE', title_style)
-    subtitle_para = Paragraph('Gross Earnings - Total Deduction', subtitle_style)
-    
-    # Combine them in a table-like structure
-    left_cell_data = [[title_para], [subtitle_para]]
-    left_cell = Table(left_cell_data, colWidths=[200])
-    left_cell.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    
-    net_payable_data = [
-        [left_cell, f'{rupee} {context["net_payable"]}']
-    ]
-    net_payable_table = Table(net_payable_data, colWidths=[370, 130])  # Adjusted proportions to match design
-    net_payable_table.setStyle(TableStyle([
-        # Light background for entire section
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f9fdf7')),  # Very light green background
-        # Purple background only for amount cell
-        ('BACKGROUND', (1, 0), (1, 0), colors.HexColor('#5b4d9e')),
-        ('TEXTCOLOR', (0, 0), (0, 0), colors.black),  # Black text for left cell
-        ('TEXTCOLOR', (1, 0), (1, 0), colors.whitesmoke),  # White text for amount
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('FONTNAME', (1, 0), (1, 0), FONT_NAME),
-        ('FONTSIZE', (1, 0), (1, 0), 16),  # Larger font for prominence
-        ('TOPPADDING', (0, 0), (-1, -1), 15),   # More padding for height
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 15), # More padding for height
-        ('LEFTPADDING', (0, 0), (0, 0), 15),    # More left padding
-        ('RIGHTPADDING', (1, 0), (1, 0), 20),   # More right padding for blue box
-        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#e0e0d0')),  # Subtle outer border
-        ('ROUNDEDCORNERS', [8, 8, 8, 8])  # More rounded corners
-    ]))
-    elements.append(net_payable_table)
-    elements.append(Spacer(1, 10))
-
-    # Amount in words (matching HTML)
-    amount_words_style = ParagraphStyle(
-        'AmountWords',
-        parent=styles['Normal'],
-        fontSize=9,
-        alignment=TA_CENTER,
-        spaceAfter=15
-    )
-    elements.append(Paragraph(f'<b>Amount in words:</b> {context["amount_in_words"]}', amount_words_style))
-    elements.append(Spacer(1, 20))
-
-    # Signatures section (matching HTML layout)
-    elements.append(Paragraph('<b>ACKNOWLEDGED BY,</b>', ParagraphStyle('SignatureTitle', parent=styles['Normal'], fontSize=10, alignment=TA_CENTER, textColor=colors.HexColor('#5b4d9e'), spaceAfter=25)))
-
-    signature_data = [
-        ['_' * 25, '_' * 25],
-        [context['employee_name'], 'AUTHORISED NAME'],
-        [f'Employee, VETRI IT SYSTEMS PVT LTD.', 'Managing Director, VETRI IT SYSTEMS PVT LTD.']
-    ]
-
-    signature_table = Table(signature_data, colWidths=[240, 240])
-    signature_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 1), (-1, 1), FONT_NAME),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('FONTSIZE', (0, 1), (-1, 1), 9),
-        ('FONTSIZE', (0, 2), (-1, 2), 8),
-        ('TEXTCOLOR', (0, 2), (-1, 2), colors.HexColor('#5b4d9e')),
-        ('TOPPADDING', (0, 0), (-1, -1), 5),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-    ]))
-    elements.append(signature_table)
-
-    # Add a visible page border using PageTemplate
-    from reportlab.platypus import PageTemplate, Frame
-
-    # Create a frame with visible boundary (border)
-    main_frame = Frame(
-        20, 20,  # x, y position (matching the margins)
-        555, 782,  # width, height (A4 minus margins)
-        leftPadding=30,
-        bottomPadding=30,
-        rightPadding=30,
-        topPadding=30,
-        showBoundary=1,  # This will show the frame boundary as a border!
-        id='main_frame'
-    )
-
-    # Create page template with the bordered frame
-    template = PageTemplate(id='payslip_template', frames=[main_frame])
+    # Apply filters if provided
+    if search_name:
+        # Match the employee master table through the indexed foreign key, and
+        # the name/ID as printed on the payslip for renamed or unlinked rows
+        payslips = payslips.filter(
+            Q(employee_record__in=matching_employees(search_name))
+            | Q(employee_name__icontains=search_name)
+            | Q(employee_id__icontains=search_name)
+        )
 
-    # Set the template on the document
-    doc.addPageTemplates([template])
+    month_name = ''
+    if filter_month and filter_year:
+        # Filter by specific month and year from pay_period
+        month_name = dict(MONTH_ABBREVIATIONS).get(filter_month, '')
+        if month_name:
+            payslips = payslips.filter(pay_period__icontains=f'{month_name}-{filter_year}')
 
-    # Build PDF with proper encoding - the frame will provide the border
-    doc.build(elements)
+    return payslips, month_name
 
+@query_budget(8)
 def login_view(request):
     if request.user.is_authenticated:
         return redirect('dashboard')
@@ -373,20 +104,12 @@ def login_view(request):
         username_or_email = request.POST.get('username')
         password = request.POST.get('password')
 
-        # First, try to authenticate with the provided value as username
-        user = authenticate(request, username=username_or_email, password=password)
+        if is_login_throttled(request, username_or_email):
+            messages.error(request, 'Too many failed login attempts. Please try again in a few minutes.')
+            return render(request, 'login.html')
 
-        # If username authentication fails, try to find user by email
-        if user is None:
-            from django.contrib.auth.models import User
-            try:
-                # Try to find user by email
-                user_obj = User.objects.get(email=username_or_email)
-                # Authenticate with the found user's username
-                user = authenticate(request, username=user_obj.username, password=password)
-            except User.DoesNotExist:
-                # No user found with that email
-                pass
+        # EmailOrUsernameBackend accepts either, in one lookup and one password hash
+        user = authenticate(request, username=username_or_email, password=password)
 
         if user is not None:
             if user.is_superuser:
@@ -401,6 +124,7 @@ def login_view(request):
     return render(request, 'login.html')
 
 @login_required(login_url='login')
+@query_budget(3)
 def dashboard_view(request):
     if not request.user.is_superuser:
         logout(request)
@@ -409,12 +133,26 @@ def dashboard_view(request):
 
     return render(request, 'dashboard.html')
 
+@login_required(login_url='login')
+@query_budget(4)
+def employee_prefill_api(request):
+    """Standing data of every active employee, for prefilling the dashboard form in one request"""
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
+
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
+
+    return JsonResponse({'success': True, 'employees': employee_prefill()})
+
+@query_budget(5)
 def logout_view(request):
     logout(request)
     # Don't add logout message to prevent it from showing on login page
     return redirect('login')
 
 @login_required(login_url='login')
+@query_budget(6)
 def generate_payslip(request):
     """Show payslip preview page"""
     if request.method == 'POST':
@@ -480,6 +218,7 @@ def generate_payslip(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
 
 @login_required(login_url='login')
+@query_budget(3)
 def check_existing_payslip(request):
     """Check if payslip already exists for employee and period"""
     if request.method == 'POST':
@@ -521,6 +260,81 @@ def check_existing_payslip(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
 
 @login_required(login_url='login')
+# Session and user, plus one query per chunk of pairs
+@query_budget(2 + LOOKUP_MAX_PAIRS // LOOKUP_CHUNK_SIZE)
+def lookup_payslips_api(request):
+    """
+    Check many (employee_id, pay_period) pairs at once.
+
+    POST ``{"pairs": [{"employee_id": "E1", "pay_period": "1-Oct-2025 to
+    31-Oct-2025"}, ...]}``, optionally with ``Content-Encoding: gzip``. At
+    most 5,000 pairs and 1 MB of (decompressed) JSON per request; larger
+    requests get a 413. The response lists, in request order, whether each
+    pair has a payslip, its id and its net payable.
+    """
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
+
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
+
+    try:
+        import json
+        body = decode_body(request.body, request.headers.get('Content-Encoding', ''))
+        pairs = parse_pairs(json.loads(body))
+    except BatchLookupError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=e.status)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Request body is not valid JSON'}, status=400)
+
+    return JsonResponse({'success': True, 'results': lookup_payslips(pairs)})
+
+@login_required(login_url='login')
+# Session and user, plus one history query per chunk of employees
+@query_budget(2 + ANOMALY_MAX_ROWS // ANOMALY_CHUNK_SIZE)
+def check_payroll_run_api(request):
+    """
+    Anomaly check for a payroll run before it is saved.
+
+    POST ``{"payslips": [{...payslip form fields...}, ...]}``, optionally
+    gzipped. Returns the rows that break a rule or move unusually far from
+    the employee's recent payslips (see anomalies.py).
+    """
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
+
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
+
+    try:
+        import json
+        # Read the stream directly: request.body stops at DATA_UPLOAD_MAX_MEMORY_SIZE,
+        # below this endpoint's own limit
+        raw = request.read(ANOMALY_MAX_BODY_BYTES + 1)
+        if len(raw) > ANOMALY_MAX_BODY_BYTES:
+            raise BatchLookupError(f'Request body is larger than {ANOMALY_MAX_BODY_BYTES} bytes', status=413)
+        body = decode_body(raw, request.headers.get('Content-Encoding', ''), ANOMALY_MAX_BODY_BYTES)
+        data = json.loads(body)
+    except BatchLookupError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=e.status)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Request body is not valid JSON'}, status=400)
+
+    rows = data.get('payslips') if isinstance(data, dict) else None
+    if not isinstance(rows, list):
+        return JsonResponse({'success': False, 'message': 'Expected a JSON object with a "payslips" list'}, status=400)
+    if len(rows) > ANOMALY_MAX_ROWS:
+        return JsonResponse({'success': False, 'message': f'At most {ANOMALY_MAX_ROWS} payslips per check'}, status=413)
+
+    try:
+        report = check_payroll_run(rows)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    return JsonResponse({'success': True, **report})
+
+@login_required(login_url='login')
+@query_budget(3)
 def payslip_preview(request):
     """Display payslip preview page"""
     payslip_data = request.session.get('payslip_data')
@@ -529,9 +343,14 @@ def payslip_preview(request):
         messages.error(request, 'No payslip data found. Please generate a payslip first.')
         return redirect('dashboard')
 
-    return render(request, 'payslip_preview.html', {'payslip_data': payslip_data})
+    return render(request, 'payslip_preview.html', {
+        'payslip_data': payslip_data,
+        'payslip_body': render_payslip_fragment(payslip_data),
+    })
 
 @login_required(login_url='login')
+@idempotent('generate_pdf_download')
+@query_budget(4)
 def generate_pdf_download(request):
     """Generate and download PDF from preview page (without saving to database)"""
     if request.method == 'POST':
@@ -582,28 +401,10 @@ def generate_pdf_download(request):
                 'amount_in_words': amount_in_words,
             }
 
-            # Create temporary PDF file
-            payslips_dir = os.path.join(settings.MEDIA_ROOT, 'payslips')
-            os.makedirs(payslips_dir, exist_ok=True)
-
-            # Generate PDF with unique filename
-            temp_filename = f"payslip_{employee_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            filepath = os.path.join(payslips_dir, temp_filename)
-            generate_payslip_pdf(filepath, context)
-
-            # Return file for download instead of URL
-            from django.http import FileResponse
-            response = FileResponse(open(filepath, 'rb'), as_attachment=True)
-            response['Content-Disposition'] = f'attachment; filename="{temp_filename}"'
-
-            # Clean up temp file after sending (optional, but good practice)
-            import threading
-            def cleanup():
-                try:
-                    os.remove(filepath)
-                except:
-                    pass
-            threading.Timer(5.0, cleanup).start()
+            # Render in memory - nothing is written under MEDIA_ROOT for a download
+            filename = f"payslip_{employee_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+            response = HttpResponse(render_payslip_bytes(context), content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
             return response
 
@@ -616,6 +417,8 @@ def generate_pdf_download(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
 
 @login_required(login_url='login')
+@idempotent('save_payslip_to_database')
+@query_budget(30)
 def save_payslip_to_database(request):
     """Save payslip data to database from preview page"""
     if request.method == 'POST':
@@ -678,32 +481,55 @@ def save_payslip_to_database(request):
                 'amount_in_words': amount_in_words,
             }
 
-            # Create media directory and generate PDF
-            payslips_dir = os.path.join(settings.MEDIA_ROOT, 'payslips')
-            os.makedirs(payslips_dir, exist_ok=True)
+            # Year-to-date figures come from the running totals, not the employee's history
+            ytd = ytd_snapshot(employee_id, payment_date, {
+                'gross_earnings': gross_earnings,
+                'income_tax': income_tax,
+                'net_payable': net_payable,
+            })
+            context.update(ytd)
+            context['fiscal_year_label'] = fiscal_year_label(ytd['fiscal_year'])
 
+            # Generate the PDF in memory and stream it to the payslip storage
             filename = f"payslip_{employee_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            filepath = os.path.join(payslips_dir, filename)
-            generate_payslip_pdf(filepath, context)
+            buffer = io.BytesIO()
+            render_payslip(context, buffer)
+            pdf_sha256, pdf_size = pdf_digest(buffer.getbuffer())
+            buffer.seek(0)
+            pdf_name = save_pdf(filename, File(buffer, name=filename))
 
-            # Save to database
-            payslip = Payslip.objects.create(
-                employee_name=employee_name,
-                employee_id=employee_id,
-                pay_period=pay_period,
-                paid_days=paid_days,
-                loss_of_pay_days=loss_of_pay_days,
-                payment_date=payment_date,
-                basic_salary=basic_salary,
-                incentive=incentive,
-                gross_earnings=gross_earnings,
-                income_tax=income_tax,
-                total_deduction=total_deduction,
-                net_payable=net_payable,
-                amount_in_words=amount_in_words,
-                pdf_file=f'payslips/{filename}',
-                created_by=request.user
-            )
+            # Save to database, keeping the period totals in the same transaction
+            try:
+                with transaction.atomic():
+                    employee = remember_employee(employee_id, employee_name, basic_salary, incentive)
+                    payslip = Payslip.objects.create(
+                        employee_name=employee_name,
+                        employee_id=employee_id,
+                        pay_period=pay_period,
+                        paid_days=paid_days,
+                        loss_of_pay_days=loss_of_pay_days,
+                        payment_date=payment_date,
+                        basic_salary=basic_salary,
+                        incentive=incentive,
+                        gross_earnings=gross_earnings,
+                        income_tax=income_tax,
+                        total_deduction=total_deduction,
+                        net_payable=net_payable,
+                        amount_in_words=amount_in_words,
+                        employee_record=employee,
+                        pdf_file=pdf_name,
+                        pdf_sha256=pdf_sha256,
+                        pdf_size=pdf_size,
+                        layout_version=LAYOUT_VERSION,
+                        created_by=request.user,
+                        **ytd
+                    )
+                    add_payslip(payslip)
+                    add_payslip_ytd(payslip)
+            except Exception:
+                # Nothing references the PDF if the row was never saved
+                delete_pdf(pdf_name)
+                raise
 
             return JsonResponse({
                 'success': True,
@@ -722,6 +548,8 @@ def save_payslip_to_database(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
 
 @login_required(login_url='login')
+@cached_page('view_payslips')
+@query_budget(8)
 def view_payslips(request):
     if not request.user.is_superuser:
         logout(request)
@@ -733,63 +561,37 @@ def view_payslips(request):
     filter_month = request.GET.get('filter_month', '')
     filter_year = request.GET.get('filter_year', '')
 
-    # Start with all payslips
-    payslips = Payslip.objects.all().order_by('-created_at')
+    payslips, month_name = filter_payslips(search_name, filter_month, filter_year)
 
-    # Apply filters if provided
-    if search_name:
-        # Search in both employee name and employee ID
-        payslips = payslips.filter(
-            Q(employee_name__icontains=search_name) |
-            Q(employee_id__icontains=search_name)
-        )
-
-    if filter_month and filter_year:
-        # Filter by specific month and year from pay_period
-        month_map = {
-            '01': 'Jan', '02': 'Feb', '03': 'Mar', '04': 'Apr',
-            '05': 'May', '06': 'Jun', '07': 'Jul', '08': 'Aug',
-            '09': 'Sep', '10': 'Oct', '11': 'Nov', '12': 'Dec'
-        }
-        month_name = month_map.get(filter_month, '')
-        if month_name:
-            payslips = payslips.filter(pay_period__icontains=f'{month_name}-{filter_year}')
-
-    # Get unique months and years for filter dropdowns
-    all_payslips = Payslip.objects.all()
+    # Get unique months and years for filter dropdowns from the period
+    # summaries - one row per pay period instead of one per payslip
     months = []
     years = []
 
-    for payslip in all_payslips:
-        # Extract month and year from pay_period (format: "1-Oct-2025 to 30-Oct-2025")
-        pay_period = payslip.pay_period
-        if ' to ' in pay_period:
-            date_part = pay_period.split(' to ')[0]  # Get "1-Oct-2025"
-            if '-' in date_part:
-                parts = date_part.split('-')
-                if len(parts) >= 2:
-                    month_name = parts[1]
-                    year = parts[2] if len(parts) > 2 else ''
-
-                    # Convert month name to number
-                    month_num = None
-                    for num, name in [('01', 'Jan'), ('02', 'Feb'), ('03', 'Mar'), ('04', 'Apr'),
-                                     ('05', 'May'), ('06', 'Jun'), ('07', 'Jul'), ('08', 'Aug'),
-                                     ('09', 'Sep'), ('10', 'Oct'), ('11', 'Nov'), ('12', 'Dec')]:
-                        if name == month_name:
-                            month_num = num
-                            break
-
-                    if month_num and year:
-                        if month_num not in months:
-                            months.append(month_num)
-                        if year not in years:
-                            years.append(year)
+    for pay_period in PeriodSummary.objects.values_list('pay_period', flat=True):
+        month_num, year = pay_period_month_year(pay_period)
+        if month_num and year:
+            if month_num not in months:
+                months.append(month_num)
+            if year not in years:
+                years.append(year)
 
     # Sort months and years
     months.sort()
     years.sort(reverse=True)  # Most recent years first
 
+    # Header totals for the selected month, read from the period summaries
+    period_totals = None
+    if filter_month and filter_year and month_name:
+        period_totals = PeriodSummary.objects.filter(
+            pay_period__icontains=f'{month_name}-{filter_year}'
+        ).aggregate(
+            headcount=Sum('headcount'),
+            gross_earnings=Sum('gross_earnings'),
+            total_deduction=Sum('total_deduction'),
+            net_payable=Sum('net_payable'),
+        )
+
     context = {
         'payslips': payslips,
         'search_name': search_name,
@@ -797,11 +599,14 @@ def view_payslips(request):
         'filter_year': filter_year,
         'available_months': months,
         'available_years': years,
+        'period_totals': period_totals,
     }
 
     return render(request, 'view_payslips.html', context)
 
 @login_required(login_url='login')
+@cached_page('payslip_detail')
+@query_budget(4)
 def payslip_detail(request, payslip_id):
     """Display detailed view of a specific payslip"""
     if not request.user.is_superuser:
@@ -812,30 +617,14 @@ def payslip_detail(request, payslip_id):
     try:
         payslip = Payslip.objects.get(id=payslip_id)
 
-        # Check if PDF file exists
-        pdf_file_exists = False
-        if payslip.pdf_file and os.path.exists(payslip.pdf_file.path):
-            pdf_file_exists = True
+        # Check if PDF file exists (loose or inside a period pack)
+        pdf_file_exists = payslip_pdf_available(payslip)
 
         # Prepare context data for the template
         context = {
             'payslip': payslip,
             'pdf_file_exists': pdf_file_exists,
-            'payslip_data': {
-                'employee_name': payslip.employee_name,
-                'employee_id': payslip.employee_id,
-                'pay_period': payslip.pay_period,
-                'paid_days': payslip.paid_days,
-                'loss_of_pay_days': payslip.loss_of_pay_days,
-                'payment_date': payslip.payment_date,
-                'basic_salary': payslip.basic_salary,
-                'incentive': payslip.incentive,
-                'gross_earnings': payslip.gross_earnings,
-                'income_tax': payslip.income_tax,
-                'total_deduction': payslip.total_deduction,
-                'net_payable': payslip.net_payable,
-                'amount_in_words': payslip.amount_in_words,
-            }
+            'payslip_body': cached_payslip_fragment(payslip),
         }
 
         return render(request, 'payslip_detail.html', context)
@@ -850,6 +639,35 @@ def payslip_detail(request, payslip_id):
         return redirect('view_payslips')
 
 @login_required(login_url='login')
+@query_budget(4)
+def download_payslip(request, payslip_id):
+    """Serve a stored payslip PDF, whether it is a loose file or inside a period pack"""
+    if not request.user.is_superuser:
+        logout(request)
+        # Don't add error message to prevent it from showing on login page
+        return redirect('login')
+
+    try:
+        payslip = Payslip.objects.get(id=payslip_id)
+    except Payslip.DoesNotExist:
+        raise Http404('Payslip not found')
+
+    filename = f"payslip_{payslip.employee_id}_{slugify(payslip.pay_period)}.pdf"
+
+    try:
+        if payslip.is_packed:
+            response = HttpResponse(read_packed_pdf(payslip), content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+        if not is_local_storage():
+            # Let the object store serve it (signed URL) instead of proxying through this node
+            return redirect(payslip.pdf_file.url)
+        return FileResponse(open_pdf(payslip.pdf_file.name), as_attachment=True, filename=filename)
+    except (OSError, ValueError):
+        raise Http404('PDF file not available')
+
+@login_required(login_url='login')
+@query_budget(17)
 def delete_payslip(request, payslip_id):
     """Delete a specific payslip"""
     if not request.user.is_superuser:
@@ -865,16 +683,21 @@ def delete_payslip(request, payslip_id):
         employee_id = payslip.employee_id
         pay_period = payslip.pay_period
 
-        # Delete the PDF file if it exists
-        if payslip.pdf_file and os.path.exists(payslip.pdf_file.path):
+        # Delete the payslip record and take it out of the period totals
+        with transaction.atomic():
+            remove_payslip(payslip)
+            remove_payslip_ytd(payslip)
+            payslip.delete()
+
+        # Then the PDF (packed PDFs go with their pack once it is unused)
+        if payslip.is_packed:
+            remove_unreferenced_packs([payslip.pack_file])
+        elif payslip.pdf_file:
             try:
-                os.remove(payslip.pdf_file.path)
+                delete_pdf(payslip.pdf_file.name)
             except OSError:
                 pass  # File might not exist or couldn't be deleted
 
-        # Delete the payslip record
-        payslip.delete()
-
         # Don't add success message to prevent it from persisting to login page
         # messages.success(request,
         #     f'Payslip for {employee_name} (ID: {employee_id}) for period {pay_period} has been deleted successfully.')
@@ -889,3 +712,250 @@ def delete_payslip(request, payslip_id):
         pass
 
     return redirect('view_payslips')
+
+def parse_report_year(value):
+    """Payment year filter of the payroll report, None when blank; ValueError when not a year"""
+    value = value.strip()
+    if not value:
+        return None
+    year = int(value)
+    if not 1 <= year <= 9999:
+        raise ValueError(f'{value} is not a year')
+    return year
+
+@login_required(login_url='login')
+@query_budget(8)
+def payroll_report(request):
+    """Payroll totals per pay period and per employee"""
+    if not request.user.is_superuser:
+        logout(request)
+        # Don't add error message to prevent it from showing on login page
+        return redirect('login')
+
+    filter_year = request.GET.get('filter_year', '').strip()
+    employee_id = request.GET.get('employee_id', '').strip()
+
+    try:
+        year = parse_report_year(filter_year)
+    except ValueError:
+        # Ignore a year that isn't a number rather than failing the page
+        filter_year, year = '', None
+
+    summary = payroll_summary(year=year, employee_id=employee_id or None)
+
+    context = {
+        'summary': summary,
+        'filter_year': filter_year,
+        'employee_id': employee_id,
+    }
+
+    return render(request, 'payroll_report.html', context)
+
+@login_required(login_url='login')
+@query_budget(6)
+def payroll_report_api(request):
+    """JSON version of the payroll report (aggregated in the database, cached until the next write)"""
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
+
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
+
+    try:
+        year = parse_report_year(request.GET.get('filter_year', ''))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'filter_year must be a year'}, status=400)
+
+    summary = payroll_summary(
+        year=year,
+        employee_id=request.GET.get('employee_id') or None,
+        pay_period=request.GET.get('pay_period') or None,
+    )
+
+    return JsonResponse({'success': True, **summary})
+
+@login_required(login_url='login')
+@query_budget(3)
+def page_cache_stats_api(request):
+    """Hit ratios of the cached View Payslips and payslip detail pages"""
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
+
+    return JsonResponse({'success': True, 'pages': page_cache_stats()})
+
+@login_required(login_url='login')
+@query_budget(4)
+def export_payslips(request):
+    """Export the filtered View Payslips records as a CSV (streamed) or XLSX ledger"""
+    if not request.user.is_superuser:
+        logout(request)
+        # Don't add error message to prevent it from showing on login page
+        return redirect('login')
+
+    payslips, _ = filter_payslips(
+        request.GET.get('search_name', '').strip(),
+        request.GET.get('filter_month', ''),
+        request.GET.get('filter_year', ''),
+    )
+
+    export_format = request.GET.get('format', 'csv').lower()
+    filename = f"payslips_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    if export_format == 'xlsx':
+        try:
+            output = write_xlsx(payslips)
+        except ImportError:
+            return JsonResponse({
+                'success': False,
+                'message': 'XLSX export requires the openpyxl package'
+            }, status=400)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f'{filename}.xlsx',
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+
+    if export_format != 'csv':
+        return JsonResponse({'success': False, 'message': 'Unsupported export format'}, status=400)
+
+    response = StreamingHttpResponse(iter_csv(payslips), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+@login_required(login_url='login')
+# One batch of one pay period (up to PURGE_BATCH_SIZE payslips); larger purges log the overrun
+@query_budget(24)
+def bulk_delete_payslips(request):
+    """Delete or archive every payslip of a period / payment date range (JSON report, supports dry run)"""
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
+
+    if request.method == 'POST':
+        try:
+            import json
+            data = json.loads(request.body)
+
+            period_contains = data.get('period_contains')
+            filter_month = data.get('filter_month')
+            filter_year = data.get('filter_year')
+            if filter_month and filter_year:
+                month_name = dict(MONTH_ABBREVIATIONS).get(filter_month, '')
+                if month_name:
+                    period_contains = f'{month_name}-{filter_year}'
+
+            filters = {
+                'pay_period': data.get('pay_period'),
+                'period_contains': period_contains,
+                'date_from': data.get('date_from'),
+                'date_to': data.get('date_to'),
+            }
+            if not any(filters.values()):
+                return JsonResponse({
+                    'success': False,
+                    'message': 'A pay period or payment date range is required'
+                }, status=400)
+
+            report = purge_payslips(
+                select_payslips(**filters),
+                archive=data.get('action') == 'archive',
+                dry_run=bool(data.get('dry_run')),
+            )
+
+            return JsonResponse({'success': True, 'report': report})
+
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'message': f'Error deleting payslips: {str(e)}'
+            }, status=400)
+
+    return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
+
+@login_required(login_url='login')
+@query_budget(4)
+def email_payslips(request):
+    """
+    Email every payslip of a period to its employee.
+
+    A dry run returns who would be emailed. Otherwise the send is started as
+    a background ``email_payslips`` job and the response (202) carries the
+    same counts; delivery status is recorded per payslip as it goes.
+    """
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
+
+    if request.method == 'POST':
+        try:
+            import json
+            data = json.loads(request.body)
+
+            period_contains = data.get('period_contains')
+            filter_month = data.get('filter_month')
+            filter_year = data.get('filter_year')
+            if filter_month and filter_year:
+                month_name = dict(MONTH_ABBREVIATIONS).get(filter_month, '')
+                if month_name:
+                    period_contains = f'{month_name}-{filter_year}'
+
+            filters = {
+                'pay_period': data.get('pay_period'),
+                'period_contains': period_contains,
+            }
+            if not any(filters.values()):
+                return JsonResponse({'success': False, 'message': 'A pay period is required'}, status=400)
+
+            # Always answered in the request: it only counts recipients
+            report = distribute_payslips(
+                select_payslips(**filters),
+                resend=bool(data.get('resend')),
+                dry_run=True,
+            )
+            if data.get('dry_run') or not report['sent']:
+                return JsonResponse({'success': True, 'report': report})
+
+            # Sending is rate limited and can take minutes; run it outside the request
+            try:
+                log_name = start_email_job(resend=bool(data.get('resend')), **filters)
+            except EmailJobRunning as e:
+                return JsonResponse({'success': False, 'message': str(e)}, status=409)
+
+            return JsonResponse({'success': True, 'queued': True, 'report': report, 'log': log_name}, status=202)
+
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'message': f'Error emailing payslips: {str(e)}'
+            }, status=400)
+
+    return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
+
+@login_required(login_url='login')
+@query_budget(3)
+def profiles_view(request):
+    """Recent request profiles recorded by ProfilerMiddleware"""
+    if not request.user.is_superuser:
+        logout(request)
+        # Don't add error message to prevent it from showing on login page
+        return redirect('login')
+
+    context = {
+        'profiles': recent_profiles(),
+        'profiling_enabled': settings.PAYSLIP_PROFILING,
+    }
+
+    return render(request, 'profiles.html', context)
+
+@login_required(login_url='login')
+@query_budget(3)
+def download_profile(request, name, kind):
+    """One file of a stored profile (collapsed stacks, speedscope JSON or metadata)"""
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
+
+    path = profile_path(name, kind)
+    if path is None:
+        raise Http404('Profile not found')
+
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name,
+                        content_type=PROFILE_KINDS[kind][1])
@@ -0,0 +1,209 @@
+"""
+Year-to-date totals per employee and fiscal year.
+
+``EmployeeYearTotal`` keeps running sums for each employee's fiscal year and
+every Payslip stores its own YTD snapshot, so rendering a payslip never sums
+the employee's earlier rows. Creating or deleting one payslip costs a few
+indexed queries: read the running total, adjust it, and shift the snapshot
+of any later-dated payslips in the same year (normally none). Bulk paths and
+the ``rebuild_ytd`` command recompute the affected employees with one
+window-function query instead.
+
+A later payslip whose snapshot changes gets ``layout_version = 0`` so the
+``rerender_payslips`` command refreshes its stored PDF.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import Count, DecimalField, F, Q, Sum, Window
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import bump_data_version_on_commit
+from .models import Payslip, EmployeeYearTotal
+
+
+# Payslip amounts carried as year-to-date figures
+YTD_FIELDS = ['gross_earnings', 'income_tax', 'net_payable']
+YTD_SNAPSHOT_FIELDS = ['fiscal_year'] + [f'ytd_{field}' for field in YTD_FIELDS]
+
+YTD_BATCH_SIZE = 500
+
+
+def fiscal_year_for(payment_date):
+    """Fiscal year (named by its starting calendar year) that ``payment_date`` falls in"""
+    # Dates may still be ISO strings when called straight from a view
+    if isinstance(payment_date, str):
+        payment_date = date.fromisoformat(payment_date)
+    if payment_date.month >= settings.FISCAL_YEAR_START_MONTH:
+        return payment_date.year
+    return payment_date.year - 1
+
+
+def fiscal_year_label(fiscal_year):
+    """``2025`` -> ``'2025-26'`` (or just ``'2025'`` for calendar fiscal years)"""
+    if fiscal_year is None:
+        return ''
+    if settings.FISCAL_YEAR_START_MONTH == 1:
+        return str(fiscal_year)
+    return f'{fiscal_year}-{str(fiscal_year + 1)[-2:]}'
+
+
+def _amounts(payslip, sign=1):
+    return {field: sign * Decimal(str(getattr(payslip, field))) for field in YTD_FIELDS}
+
+
+def _later(employee_id, fiscal_year, payment_date, payslip_id=None):
+    """Payslips of the same employee and year ordered after (payment_date, id)"""
+    later = Q(payment_date__gt=payment_date)
+    if payslip_id is not None:
+        later |= Q(payment_date=payment_date, id__gt=payslip_id)
+    return Payslip.objects.filter(later, employee_id=employee_id, fiscal_year=fiscal_year)
+
+
+def ytd_snapshot(employee_id, payment_date, amounts):
+    """
+    YTD figures for a new payslip with ``amounts`` paid on ``payment_date``.
+
+    That is the running total, minus whatever later-dated payslips already
+    added to it, plus the payslip's own amounts.
+    """
+    fiscal_year = fiscal_year_for(payment_date)
+    totals = {field: Decimal('0') for field in YTD_FIELDS}
+
+    running = (
+        EmployeeYearTotal.objects.filter(employee_id=employee_id, fiscal_year=fiscal_year)
+        .values(*YTD_FIELDS).first()
+    )
+    if running:
+        later = _later(employee_id, fiscal_year, payment_date).aggregate(
+            **{field: Coalesce(Sum(field), Decimal('0')) for field in YTD_FIELDS}
+        )
+        for field in YTD_FIELDS:
+            totals[field] = running[field] - later[field]
+
+    snapshot = {'fiscal_year': fiscal_year}
+    for field in YTD_FIELDS:
+        snapshot[f'ytd_{field}'] = totals[field] + Decimal(str(amounts[field]))
+    return snapshot
+
+
+def _apply_delta(employee_id, fiscal_year, count, amounts):
+    """Add ``count`` and ``amounts`` (possibly negative) to one running-total row"""
+    updates = {'payslip_count': F('payslip_count') + count}
+    for field in YTD_FIELDS:
+        updates[field] = F(field) + amounts[field]
+
+    rows = EmployeeYearTotal.objects.filter(employee_id=employee_id, fiscal_year=fiscal_year)
+    with transaction.atomic():
+        updated = rows.update(**updates)
+        if not updated and count > 0:
+            try:
+                with transaction.atomic():
+                    EmployeeYearTotal.objects.create(
+                        employee_id=employee_id, fiscal_year=fiscal_year, payslip_count=count, **amounts
+                    )
+            except IntegrityError:
+                # Another request created the row first - add onto it instead
+                rows.update(**updates)
+        rows.filter(payslip_count__lte=0).delete()
+
+
+def _shift_later(payslip, amounts):
+    """Move the snapshot of every later payslip in the year by ``amounts``"""
+    updates = {f'ytd_{field}': F(f'ytd_{field}') + amounts[field] for field in YTD_FIELDS}
+    _later(payslip.employee_id, payslip.fiscal_year, payslip.payment_date, payslip.id).update(
+        layout_version=0, updated_at=timezone.now(), **updates
+    )
+
+
+def add_payslip_ytd(payslip):
+    """
+    Store ``payslip``'s YTD snapshot and fold it into the running total.
+
+    Call inside the transaction that created the row. If the snapshot
+    differs from the one already on the instance (the PDF was rendered from
+    a stale read), the row is marked for re-rendering.
+    """
+    rendered = {field: getattr(payslip, field) for field in YTD_SNAPSHOT_FIELDS}
+    snapshot = ytd_snapshot(payslip.employee_id, payslip.payment_date, _amounts(payslip))
+    if rendered != snapshot:
+        snapshot['layout_version'] = 0
+    Payslip.objects.filter(id=payslip.id).update(updated_at=timezone.now(), **snapshot)
+    for field, value in snapshot.items():
+        setattr(payslip, field, value)
+
+    amounts = _amounts(payslip)
+    _apply_delta(payslip.employee_id, payslip.fiscal_year, 1, amounts)
+    _shift_later(payslip, amounts)
+
+
+def remove_payslip_ytd(payslip):
+    """Take ``payslip`` out of its year's totals; call in the delete transaction"""
+    if payslip.fiscal_year is None:
+        # Never counted (rows from before YTD tracking until rebuild_ytd runs)
+        return
+    amounts = _amounts(payslip, -1)
+    _apply_delta(payslip.employee_id, payslip.fiscal_year, -1, amounts)
+    _shift_later(payslip, amounts)
+
+
+def rebuild_ytd(employee_ids=None):
+    """
+    Recompute snapshots and running totals from the Payslip table.
+
+    ``employee_ids`` limits the work to those employees (bulk deletes pass
+    the employees of each batch). Returns the number of payslips whose
+    snapshot changed.
+    """
+    payslips = Payslip.objects.all()
+    totals = EmployeeYearTotal.objects.all()
+    if employee_ids is not None:
+        employee_ids = list(set(employee_ids))
+        payslips = payslips.filter(employee_id__in=employee_ids)
+        totals = totals.filter(employee_id__in=employee_ids)
+
+    with transaction.atomic():
+        # Rows saved before YTD tracking have no fiscal year to partition on yet
+        missing = list(payslips.filter(fiscal_year__isnull=True).only('id', 'payment_date'))
+        for payslip in missing:
+            payslip.fiscal_year = fiscal_year_for(payslip.payment_date)
+        Payslip.objects.bulk_update(missing, ['fiscal_year'], batch_size=YTD_BATCH_SIZE)
+
+        amount_field = DecimalField(max_digits=14, decimal_places=2)
+        window = {'partition_by': [F('employee_id'), F('fiscal_year')], 'order_by': [F('payment_date'), F('id')]}
+        rows = payslips.order_by().annotate(
+            **{f'running_{field}': Window(Sum(field), output_field=amount_field, **window) for field in YTD_FIELDS}
+        ).only('id', *YTD_SNAPSHOT_FIELDS, 'layout_version')
+
+        changed = []
+        now = timezone.now()
+        for payslip in rows.iterator(chunk_size=YTD_BATCH_SIZE):
+            dirty = False
+            for field in YTD_FIELDS:
+                running = getattr(payslip, f'running_{field}')
+                if getattr(payslip, f'ytd_{field}') != running:
+                    setattr(payslip, f'ytd_{field}', running)
+                    dirty = True
+            if dirty:
+                payslip.layout_version = 0
+                payslip.updated_at = now
+                changed.append(payslip)
+        Payslip.objects.bulk_update(
+            changed, [f'ytd_{field}' for field in YTD_FIELDS] + ['layout_version', 'updated_at'],
+            batch_size=YTD_BATCH_SIZE,
+        )
+
+        grouped = (
+            payslips.order_by().values('employee_id', 'fiscal_year')
+            .annotate(payslip_count=Count('id'), **{field: Sum(field) for field in YTD_FIELDS})
+        )
+        totals.delete()
+        EmployeeYearTotal.objects.bulk_create(
+            [EmployeeYearTotal(**row) for row in grouped], batch_size=YTD_BATCH_SIZE
+        )
+        bump_data_version_on_commit()
+
+    return len(changed)